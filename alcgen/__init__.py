@@ -1,3 +1,4 @@
+from .fingerprint import fingerprint
 from .generator import Generator, generate, do_minimize, do_close
 from .guide import Guide
 from .node import Node
@@ -4,18 +4,24 @@ from pathlib import Path
 
 import fire
 
+from alcgen import tracing
 from alcgen.configuration import DatasetConfiguration
 from alcgen.create_dataset import create_dataset
 
 
-def main(config_file: os.PathLike, target_dir: os.PathLike | None = None):
+def main(config_file: os.PathLike, target_dir: os.PathLike | None = None, workers: int | None = None,
+         metrics: os.PathLike | None = None, trace: os.PathLike | None = None, trace_levels: int = 3,
+         profile: os.PathLike | None = None, profile_instances: list[tuple[int, int]] | None = None):
     with open(config_file) as f:
         configuration = DatasetConfiguration(**json.load(f))
+    if workers is not None:
+        configuration.workers = workers
     print("Using configuration:")
     print(configuration)
     if target_dir is None:
         target_dir = Path(config_file).with_suffix('')
-    create_dataset(configuration, target_dir)
+    with tracing.session(trace, trace_levels, profile, profile_instances):
+        create_dataset(configuration, target_dir, metrics)
 
 
 if __name__ == "__main__":
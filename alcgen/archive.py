@@ -0,0 +1,245 @@
+import io
+import os
+import re
+import struct
+import zipfile
+from pathlib import Path
+from typing import Iterator, TextIO, IO
+
+from alcgen.compressed import Compression, SUFFIXES, zip_method, open_compressed
+from alcgen.syntax import SERIALIZERS, CE, from_binary, read_manchester
+
+VARIANTS = ("open", "open_minimized", "closed", "closed_minimized")
+
+_SHARD = re.compile(r"(\d+)\.zip")
+_ENTRY = re.compile(r"(\d+)/(\w+)(\.\w+)")
+_FILE = re.compile(r"(\w+)(\.\w+)(\.\w+)?")
+_FORMAT_SUFFIXES = {serializer.suffix for serializer in SERIALIZERS.values()}
+# The date of the entries of the archives, the earliest one zip can store
+_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def shard_path(target_dir: Path, depth: int) -> Path:
+    return target_dir / f"{depth}.zip"
+
+
+def entry_name(instance: int, variant: str, suffix: str = ".owl") -> str:
+    return f"{instance}/{variant}{suffix}"
+
+
+def repair_shard(path: os.PathLike | str) -> int:
+    """
+    Rebuilds the central directory of an archive left without a valid one by an interrupted run, which `zipfile` only
+    writes when the archive is closed. The directory is rebuilt from the local headers of the entries that were written
+    completely; the entry being written when the run was interrupted, and anything following it, is dropped.
+    Returns the number of the entries kept.
+    """
+    header_size = struct.calcsize(zipfile.structFileHeader)
+    entries = []
+    with open(path, "r+b") as f:
+        size = os.fstat(f.fileno()).st_size
+        offset = 0
+        while offset + header_size <= size:
+            f.seek(offset)
+            (signature, version, _, flags, method, time, date, crc, compressed, uncompressed, name_length,
+             extra_length) = struct.unpack(zipfile.structFileHeader, f.read(header_size))
+            # The sizes in the header are only final if they were not deferred to a data descriptor, which zipfile does
+            # not use for seekable files, and the extra field is only used by ZIP64
+            if signature != zipfile.stringFileHeader or flags & 0x08 or extra_length:
+                break
+            name = f.read(name_length)
+            end = offset + header_size + name_length + compressed
+            if end > size:
+                break
+            f.seek(end)
+            # The sizes are rewritten in the header when the entry is complete, so an incomplete one is followed by its
+            # data rather than by the next entry, the central directory or the end of the file
+            following = f.read(4)
+            if following not in (b"", zipfile.stringFileHeader, zipfile.stringCentralDir):
+                break
+            # An entry whose data was still buffered has zero sizes and nothing after it, just as an empty entry at
+            # the end, which is then dropped as well and written again
+            if following == b"" and compressed == 0:
+                break
+            entries.append((offset, version, flags, method, time, date, crc, compressed, uncompressed, name))
+            offset = end
+        while True:
+            _write_directory(f, offset, entries)
+            with zipfile.ZipFile(path) as shard:
+                bad = shard.testzip()
+            if bad is None:
+                return len(entries)
+            offset = next(e[0] for e in entries if e[-1].decode("utf-8") == bad)
+            entries = [e for e in entries if e[0] < offset]
+
+
+def _write_directory(f: IO[bytes], offset: int, entries: list[tuple]) -> None:
+    f.seek(offset)
+    f.truncate()
+    for header_offset, version, flags, method, time, date, crc, compressed, uncompressed, name in entries:
+        f.write(struct.pack(zipfile.structCentralDir, zipfile.stringCentralDir, version, 3, version, 0, flags, method,
+                            time, date, crc, compressed, uncompressed, len(name), 0, 0, 0, 0, 0o600 << 16,
+                            header_offset))
+        f.write(name)
+    directory_size = f.tell() - offset
+    f.write(struct.pack(zipfile.structEndArchive, zipfile.stringEndArchive, 0, 0, len(entries), len(entries),
+                        directory_size, offset, 0))
+    f.flush()
+
+
+class ArchiveWriter:
+    """
+    Appends the instances of a dataset to zip archives in `target_dir`, one per depth, holding `instance/variant.owl`,
+    or the suffix of another of the `SERIALIZERS`, named by `format`.
+    The entries are compressed with the zip method corresponding to `compression`, at `level` if given.
+    The archives are opened on demand and are complete only after `close`; an archive left incomplete by an interrupted
+    run is repaired with `repair_shard` when it is opened again, keeping the entries written completely.
+    """
+
+    def __init__(self, target_dir: os.PathLike | str, compression: Compression = None, level: int | None = None,
+                 format: str = "manchester"):
+        self.target_dir = Path(target_dir)
+        self.method = zip_method(compression)
+        self.level = level
+        self.serializer = SERIALIZERS[format]
+        self._shards: dict[int, zipfile.ZipFile] = {}
+
+    def _shard(self, depth: int) -> zipfile.ZipFile:
+        if depth not in self._shards:
+            path = shard_path(self.target_dir, depth)
+            if path.exists():
+                # ZipFile in the "a" mode would append a new archive after the one without a central directory
+                try:
+                    zipfile.ZipFile(path).close()
+                except zipfile.BadZipFile:
+                    repair_shard(path)
+            self._shards[depth] = zipfile.ZipFile(path, "a", compression=self.method, compresslevel=self.level)
+        return self._shards[depth]
+
+    def exists(self, depth: int, instance: int, variant: str) -> bool:
+        try:
+            self._shard(depth).getinfo(entry_name(instance, variant, self.serializer.suffix))
+        except KeyError:
+            return False
+        return True
+
+    def _info(self, instance: int, variant: str) -> zipfile.ZipInfo:
+        # A fixed date instead of the current one, so that the same formulas are archived to the same bytes in every run
+        info = zipfile.ZipInfo(entry_name(instance, variant, self.serializer.suffix), date_time=_DATE_TIME)
+        info.compress_type = self.method
+        info._compresslevel = self.level
+        info.external_attr = 0o600 << 16
+        return info
+
+    def open(self, depth: int, instance: int, variant: str) -> IO:
+        """Opens the entry for writing, in the binary mode if the format is binary and in the text mode otherwise."""
+        f = self._shard(depth).open(self._info(instance, variant), "w")
+        return f if self.serializer.binary else io.TextIOWrapper(f, encoding="utf-8")
+
+    def write(self, depth: int, instance: int, variant: str, data: bytes) -> None:
+        self._shard(depth).writestr(self._info(instance, variant), data)
+
+    def path(self, depth: int, instance: int, variant: str) -> str:
+        """The path of the entry, as the path of its archive followed by the name of the entry."""
+        return f"{shard_path(self.target_dir, depth)}/{entry_name(instance, variant, self.serializer.suffix)}"
+
+    def stored_size(self, depth: int, instance: int, variant: str) -> int:
+        """The size of the written entry in the archive, after the compression."""
+        return self._shard(depth).getinfo(entry_name(instance, variant, self.serializer.suffix)).compress_size
+
+    def close(self) -> None:
+        for shard in self._shards.values():
+            shard.close()
+        self._shards.clear()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class DatasetReader:
+    """
+    Random access to the instances of a dataset created by `create_dataset`, regardless of whether it was written to
+    the directories or to the archives, of their format and of their compression, without extracting them.
+    """
+
+    def __init__(self, target_dir: os.PathLike | str):
+        self.target_dir = Path(target_dir)
+        self._shards: dict[int, zipfile.ZipFile] = {}
+        for path in self.target_dir.iterdir():
+            if m := _SHARD.fullmatch(path.name):
+                self._shards[int(m[1])] = zipfile.ZipFile(path)
+
+    def __iter__(self) -> Iterator[tuple[int, int, str]]:
+        """Yields (depth, instance, variant) of all the variants in the dataset, ordered by depth and instance."""
+        entries = []
+        for depth, shard in self._shards.items():
+            for name in shard.namelist():
+                if (m := _ENTRY.fullmatch(name)) and m[3] in _FORMAT_SUFFIXES:
+                    entries.append((depth, int(m[1]), m[2]))
+        for depth_dir in self.target_dir.iterdir():
+            if depth_dir.is_dir() and depth_dir.name.isdigit():
+                for path in depth_dir.glob("*/*"):
+                    if path.parent.name.isdigit() and (m := _FILE.fullmatch(path.name)) \
+                            and m[2] in _FORMAT_SUFFIXES and (m[3] or "") in SUFFIXES.values():
+                        entries.append((int(depth_dir.name), int(path.parent.name), m[1]))
+        entries.sort(key=lambda e: (e[0], e[1], VARIANTS.index(e[2]) if e[2] in VARIANTS else len(VARIANTS), e[2]))
+        return iter(entries)
+
+    def _open(self, depth: int, instance: int, variant: str) -> tuple[str, IO[bytes]]:
+        for format, serializer in SERIALIZERS.items():
+            if depth in self._shards:
+                try:
+                    return format, self._shards[depth].open(entry_name(instance, variant, serializer.suffix))
+                except KeyError:
+                    continue
+            path = self.target_dir / str(depth) / entry_name(instance, variant, serializer.suffix)
+            for compression, suffix in SUFFIXES.items():
+                if os.path.exists(f"{path}{suffix}"):
+                    return format, open_compressed(f"{path}{suffix}", "rb", compression)
+        raise FileNotFoundError(self.target_dir / str(depth) / str(instance) / variant)
+
+    def open_binary(self, depth: int, instance: int, variant: str) -> IO[bytes]:
+        """Opens the variant, in whichever of the formats it was written, as a stream of the decompressed bytes."""
+        return self._open(depth, instance, variant)[1]
+
+    def open(self, depth: int, instance: int, variant: str) -> TextIO:
+        return io.TextIOWrapper(self.open_binary(depth, instance, variant), encoding="utf-8")
+
+    def read(self, depth: int, instance: int, variant: str) -> str:
+        with self.open(depth, instance, variant) as f:
+            return f.read()
+
+    def read_bytes(self, depth: int, instance: int, variant: str) -> bytes:
+        with self.open_binary(depth, instance, variant) as f:
+            return f.read()
+
+    def load(self, depth: int, instance: int, variant: str) -> CE:
+        """
+        Loads the class expression of the variant, written either in the Manchester syntax or in the binary format.
+        """
+        format, f = self._open(depth, instance, variant)
+        with f:
+            if format == "manchester":
+                return read_manchester(io.TextIOWrapper(f, encoding="utf-8"))
+            if format == "binary":
+                return from_binary(f.read())
+        raise ValueError(f"Cannot load the class expressions written in the {format} format")
+
+    def expressions(self) -> Iterator[tuple[tuple[int, int, str], CE]]:
+        """Yields the entries of the dataset along with their class expressions, loading one at a time."""
+        for entry in self:
+            yield entry, self.load(*entry)
+
+    def close(self) -> None:
+        for shard in self._shards.values():
+            shard.close()
+        self._shards.clear()
+
+    def __enter__(self) -> "DatasetReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,216 @@
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Iterator, TypeVar
+
+from alcgen.configuration import DatasetConfiguration
+from alcgen.node import Node
+from alcgen.trampoline import trampoline, Recursion
+
+T = TypeVar("T")
+
+# Part of every key, so it must be bumped whenever the encoding or the results of any stage change
+FORMAT_VERSION = 1
+
+
+def _pack(values: array) -> bytes:
+    return zlib.compress(values.tobytes())
+
+
+def _unpack(data: bytes) -> array:
+    values = array('q')
+    values.frombytes(zlib.decompress(data))
+    return values
+
+
+def encode_node(n: Node) -> bytes:
+    """
+    Encodes a formula as generated by `Generator`, in pre-order. Every node is described by the number of its conjuncts
+    followed by them in the ascending order, i.e., the order they were generated in, the roles of its existential and
+    of its universal restrictions, each preceded by their number, and the number of its disjuncts.
+    The links are not stored, as `decode_node` recreates them by adding the operands in the order of `Generator`.
+    """
+    values = array('q')
+    stack = [n]
+    while stack:
+        node = stack.pop()
+        values.append(len(node.conjuncts))
+        values.extend(sorted(node.conjuncts))
+        children = []
+        for roles in (node.existential, node.universal):
+            values.append(sum(len(nodes) for nodes in roles.values()))
+            for r, nodes in roles.items():
+                values.extend([r] * len(nodes))
+                children += nodes
+        values.append(len(node.disjuncts))
+        children += node.disjuncts
+        stack.extend(reversed(children))
+    return _pack(values)
+
+
+def _decode_node(values: Iterator[int]) -> Recursion[Node]:
+    node = Node()
+    for _ in range(next(values)):
+        node.add_conjunct(next(values))
+    existential = [next(values) for _ in range(next(values))]
+    universal = [next(values) for _ in range(next(values))]
+    n_disjuncts = next(values)
+    for r in existential:
+        node.add_existential(r, (yield _decode_node(values)))
+    for r in universal:
+        node.add_universal(r, (yield _decode_node(values)))
+    for _ in range(n_disjuncts):
+        node.add_disjunct((yield _decode_node(values)))
+    return node
+
+
+def decode_node(data: bytes) -> Node:
+    return trampoline(_decode_node(iter(_unpack(data))))
+
+
+def encode_mapping(mapping: dict[int, int]) -> bytes:
+    values = array('q')
+    for k, v in mapping.items():
+        values.append(k)
+        values.append(v)
+    return _pack(values)
+
+
+def decode_mapping(data: bytes) -> dict[int, int]:
+    values = _unpack(data)
+    return dict(zip(values[::2], values[1::2]))
+
+
+class GenerationCache:
+    """
+    A content-addressed store of the intermediate results of generating instances, kept as files in `directory`.
+    The sizes of the entries are tracked in the order of their last use, starting from a single scan of the directory on
+    the first access, so that `put` removes the least recently used entries as soon as their total size exceeds
+    `max_size` bytes without listing the directory again. The entries put by other processes are not tracked, so
+    `evict` scans the directory again to fit all of them in `max_size`.
+    """
+
+    def __init__(self, directory: os.PathLike | str, max_size: int):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        # The sizes of the entries, from the least to the most recently used, scanned on the first access
+        self._entries: OrderedDict[Path, int] | None = None
+        self._total = 0
+
+    @staticmethod
+    def key(configuration: DatasetConfiguration, depth: int, seed: int | list[int], stage: str) -> str:
+        description = {
+            "version": FORMAT_VERSION,
+            "guide": configuration.guide.model_dump() if configuration.guide is not None else None,
+            "universal_guide": configuration.universal_guide.model_dump()
+            if configuration.universal_guide is not None else None,
+            "buffered_rng": configuration.buffered_rng,
+            "depth": depth,
+            "seed": seed,
+            "stage": stage,
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key[2:]
+
+    def _scan(self) -> None:
+        entries = []
+        for path in self.directory.glob("??/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        entries.sort()
+        self._entries = OrderedDict((path, size) for _, size, path in entries)
+        self._total = sum(self._entries.values())
+
+    def _used(self, path: Path, size: int) -> None:
+        if self._entries is None:
+            self._scan()
+        self._total += size - self._entries.pop(path, 0)
+        self._entries[path] = size
+
+    def _shrink(self) -> int:
+        removed = 0
+        while self._total > self.max_size and self._entries:
+            path, size = self._entries.popitem(last=False)
+            path.unlink(missing_ok=True)
+            self._total -= size
+            removed += 1
+        return removed
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            # The modification time marks the last use for the scans of the later runs
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        self._used(path, len(data))
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file first, so that the concurrent workers never read a partial entry
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._used(path, len(data))
+        self._shrink()
+
+    def size(self) -> int:
+        return sum(path.stat().st_size for path in self.directory.glob("??/*"))
+
+    def evict(self) -> int:
+        """Removes the least recently used entries to fit in `max_size` and returns their number."""
+        self._scan()
+        return self._shrink()
+
+
+@functools.cache
+def shared_cache(directory: os.PathLike | str, max_size: int) -> GenerationCache:
+    """The cache of `directory` for the whole process, so that the entries of all the instances are tracked together."""
+    return GenerationCache(directory, max_size)
+
+
+class InstanceCache:
+    """
+    The stages of generating a single instance, taken from `cache` if present there and stored in it otherwise.
+    Without a cache or a seed, every stage is simply computed.
+    """
+
+    def __init__(self, cache: GenerationCache | None, configuration: DatasetConfiguration, depth: int,
+                 seed: int | list[int] | None):
+        self._cache = cache if seed is not None else None
+        self._configuration = configuration
+        self._depth = depth
+        self._seed = seed
+
+    def _cached(self, stage: str, compute: Callable[[], T], encode: Callable[[T], bytes],
+                decode: Callable[[bytes], T]) -> T:
+        if self._cache is None:
+            return compute()
+        key = GenerationCache.key(self._configuration, self._depth, self._seed, stage)
+        data = self._cache.get(key)
+        if data is not None:
+            return decode(data)
+        value = compute()
+        self._cache.put(key, encode(value))
+        return value
+
+    def node(self, compute: Callable[[], Node]) -> Node:
+        return self._cached("node", compute, encode_node, decode_node)
+
+    def mapping(self, stage: str, compute: Callable[[], dict[int, int]]) -> dict[int, int]:
+        return self._cached(stage, compute, encode_mapping, decode_mapping)
@@ -0,0 +1,72 @@
+import gzip
+import io
+import lzma
+import os
+import warnings
+import zipfile
+from typing import Literal, IO
+
+try:
+    # Python 3.14+
+    from compression import zstd as _zstd
+except ImportError:
+    try:
+        import zstandard as _zstd
+    except ImportError:
+        _zstd = None
+
+Compression = Literal['gzip', 'xz', 'zstd'] | None
+
+SUFFIXES = {None: "", "gzip": ".gz", "xz": ".xz", "zstd": ".zst"}
+
+_ZIP_METHODS = {None: zipfile.ZIP_STORED, "gzip": zipfile.ZIP_DEFLATED, "xz": zipfile.ZIP_LZMA,
+                "zstd": getattr(zipfile, "ZIP_ZSTANDARD", None)}
+
+
+def resolve(compression: Compression, archive: bool = False) -> Compression:
+    """Falls back from zstd to gzip, with a warning, if zstd is not available for the files or for the archives."""
+    if compression == "zstd" and (_ZIP_METHODS["zstd"] is None if archive else _zstd is None):
+        warnings.warn("zstd is not available, falling back to gzip")
+        return "gzip"
+    return compression
+
+
+def detect(path: os.PathLike | str) -> Compression:
+    """The compression of a file, determined from its suffix."""
+    for compression, suffix in SUFFIXES.items():
+        if compression is not None and str(path).endswith(suffix):
+            return compression
+    return None
+
+
+def open_compressed(path: os.PathLike | str, mode: str, compression: Compression, level: int | None = None) -> IO:
+    """
+    Opens a file in a text or a binary mode, streaming the written data straight into the compressor and the read data
+    out of the decompressor. `level` is the compression level of the codec, or its default if None.
+    """
+    if compression is None:
+        return open(path, mode)
+    if compression == "gzip":
+        # The header gets no timestamp, so that the same formulas are compressed to the same bytes in every run
+        f = gzip.GzipFile(path, mode.replace("t", "").replace("b", "") + "b", mtime=0,
+                          **({"compresslevel": level} if level is not None else {}))
+        return f if "b" in mode else io.TextIOWrapper(f)
+    if compression == "xz":
+        return lzma.open(path, mode, **({"preset": level} if level is not None and "w" in mode else {}))
+    if compression == "zstd":
+        if _zstd is None:
+            raise ValueError("zstd is not available")
+        if level is None or "w" not in mode:
+            return _zstd.open(path, mode)
+        if _zstd.__name__ == "compression.zstd":
+            return _zstd.open(path, mode, level=level)
+        return _zstd.open(path, mode, cctx=_zstd.ZstdCompressor(level=level))
+    raise ValueError(f"Unknown compression {compression}")
+
+
+def zip_method(compression: Compression) -> int:
+    """The compression method of the zip archive entries corresponding to the compression of the files."""
+    method = _ZIP_METHODS[compression]
+    if method is None:
+        raise ValueError(f"{compression} is not available for zip archives")
+    return method
@@ -35,8 +35,30 @@ class DatasetConfiguration(pydantic.BaseModel):
     seed_depth: int | None = 0xfeed
     seed_instance: int | None = 0xc00ffee
     seed_const: int | None = None
+    # Serve the random numbers from pre-drawn blocks; faster, but yields different formulas for the same seeds
+    buffered_rng: bool = False
 
     prefix: str = "http://example.com/foo"
+    # The syntax of the written ontologies (see alcgen.syntax.SERIALIZERS); binary is a compact encoding of the
+    # expression
+    format: Literal['manchester', 'functional', 'turtle', 'binary'] = 'manchester'
+
+    workers: int = 1
+    # Either a directory per instance, or a zip archive per depth (see alcgen.archive)
+    output: Literal['directory', 'zip'] = 'directory'
+    # The files, or the entries of the archives, are compressed while being written; zstd falls back to gzip if missing
+    compression: Literal['gzip', 'xz', 'zstd'] | None = None
+    # The level of the codec, or its default if None
+    compression_level: int | None = None
+
+    # Reseed the instances identical to earlier ones up to renaming, until a new shape is found or the limit is reached
+    deduplicate: bool = False
+    max_reseeds: int = 100
+
+    # Keep the generated formulas and the mappings in this directory, so that they are not recomputed by the later runs
+    cache_dir: str | None = None
+    # The least recently used entries are evicted at the end of a run to keep the cache within this many bytes
+    cache_size: int = 1 << 30
 
     guide: RandomGuideConfiguration | None = None
     universal_guide: RandomGuideConfiguration | None = None
@@ -1,5 +1,12 @@
+import itertools
+from array import array
 from collections import defaultdict
-from typing import Collection, Generator
+from typing import Collection, Generator, Iterable
+
+import numpy as np
+
+# The NumPy counterpart of array('l'), so that the arrays can be viewed without copying
+_LONG = np.dtype('l')
 
 
 class Cooccurrences:
@@ -42,6 +49,10 @@ class Cooccurrences:
             self._parent[y] = x
             y = x
 
+    def union_all(self, families: Iterable[Collection[int]]):
+        for items in families:
+            self.union_many(items)
+
     def items(self) -> Generator[tuple[int, int], None, None]:
         for x in self._parent.keys():
             yield x, self.find(x)
@@ -61,12 +72,9 @@ class Cooccurrences:
         return result
 
     def has_nonempty_intersection(self, xs: Collection[int], ys: Collection[int]) -> bool:
-        ys = {self._parent.get(y, None) for y in ys} - {None}
+        ys = {self.find(y) for y in ys if y in self._parent}
         for x in xs:
-            x = self._parent.get(x, None)
-            if x is None:
-                continue
-            if x in ys:
+            if x in self._parent and self.find(x) in ys:
                 return True
         return False
 
@@ -75,3 +83,146 @@ class Cooccurrences:
     @property
     def max_item(self):
         return max(self._parent.keys())
+
+
+class ArrayCooccurrences(Cooccurrences):
+    """
+    Union-find over dense, non-negative symbol ids, with the parents kept in a growable `array('l')` indexed by the
+    symbol, rather than in dicts. Single operations work on the array directly, while `union_all`, `items` and
+    `to_list` operate on NumPy views of it.
+    The roots are the smallest symbols of their families, instead of being chosen by rank, but the families and the
+    order of `items` and `to_list` (by the first occurrence of a symbol) are the same as for `Cooccurrences`.
+    """
+
+    # The number of the symbols from which `union_all` uses NumPy; below it, the fixed cost of the NumPy calls exceeds
+    # that of adding the families one by one
+    vectorize_from = 256
+
+    def __init__(self):
+        # -1 marks the symbols that were not added yet
+        self._parent = array('l')
+        self._order = array('l')
+
+    def _grow(self, x: int):
+        if x >= len(self._parent):
+            self._parent.extend(array('l', [-1]) * (max(x + 1, 2 * len(self._parent)) - len(self._parent)))
+
+    def _contains(self, x: int) -> bool:
+        return x < len(self._parent) and self._parent[x] >= 0
+
+    def find(self, x: int):
+        self._grow(x)
+        parent = self._parent
+        if parent[x] < 0:
+            parent[x] = x
+            self._order.append(x)
+            return x
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union_many(self, items: Collection[int]):
+        roots = [self.find(x) for x in items]
+        if len(roots) == 0:
+            return
+        root = min(roots)
+        for x in roots:
+            self._parent[x] = root
+
+    @staticmethod
+    def _compress(parent: np.ndarray) -> np.ndarray:
+        # Full path compression by pointer jumping
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                return parent
+            parent = grandparent
+
+    def _roots(self) -> np.ndarray:
+        """
+        Returns the root of every symbol, with the symbols that were not added yet mapped to themselves.
+        """
+        parent = np.frombuffer(self._parent, dtype=_LONG).copy()
+        absent = parent < 0
+        parent[absent] = np.flatnonzero(absent)
+        return self._compress(parent)
+
+    def union_all(self, families: Iterable[Collection[int]]):
+        # Flatten the families into one array, chunk by chunk to avoid holding all of them at once
+        symbols = []
+        sizes = []
+        families = iter(families)
+        chunk = list(itertools.islice(families, 1 << 16))
+        if len(chunk) < 1 << 16 and sum(map(len, chunk)) < self.vectorize_from:
+            for items in chunk:
+                self.union_many(items)
+            return
+        while chunk:
+            sizes.append(np.fromiter(map(len, chunk), dtype=_LONG, count=len(chunk)))
+            symbols.append(np.fromiter(itertools.chain.from_iterable(chunk), dtype=_LONG, count=sizes[-1].sum()))
+            chunk = list(itertools.islice(families, 1 << 16))
+        if sum(map(len, symbols)) == 0:
+            return
+        symbols = np.concatenate(symbols)
+        sizes = np.concatenate(sizes)
+        self._grow(int(symbols.max()))
+        # Add the new symbols in the order of their first occurrence, as `find` would
+        new = symbols[np.frombuffer(self._parent, dtype=_LONG)[symbols] < 0]
+        new, first = np.unique(new, return_index=True)
+        new = new[np.argsort(first)]
+        np.frombuffer(self._parent, dtype=_LONG)[new] = new
+        self._order.extend(new.tolist())
+        # Every symbol is connected with the first symbol of its family
+        sizes = sizes[sizes > 0]
+        heads = np.repeat(symbols[np.cumsum(sizes) - sizes], sizes)
+        tails = symbols
+        # Hook the larger root of every edge to the smaller one and compress, until all edges are within a family
+        parent = self._roots()
+        while True:
+            a = parent[heads]
+            b = parent[tails]
+            differ = a != b
+            if not differ.any():
+                break
+            heads = heads[differ]
+            tails = tails[differ]
+            np.minimum.at(parent, np.maximum(a[differ], b[differ]), np.minimum(a[differ], b[differ]))
+            parent = self._compress(parent)
+        # The absent symbols are their own roots and were not hooked, as they do not occur in any edge
+        target = np.frombuffer(self._parent, dtype=_LONG)
+        present = target >= 0
+        target[present] = parent[present]
+
+    def items(self) -> Generator[tuple[int, int], None, None]:
+        order = np.frombuffer(self._order, dtype=_LONG)
+        symbols, roots = order.tolist(), self._roots()[order].tolist()
+        # Release the view before yielding, as the array cannot grow while it is exported
+        del order
+        yield from zip(symbols, roots)
+
+    def to_list(self) -> list[set]:
+        order = np.frombuffer(self._order, dtype=_LONG)
+        if len(order) == 0:
+            return []
+        roots = self._roots()[order]
+        _, first, inverse, counts = np.unique(roots, return_index=True, return_inverse=True, return_counts=True)
+        # Number the families by their first occurrence and group the symbols by it, keeping their order
+        rank = np.empty_like(first)
+        rank[np.argsort(first)] = np.arange(len(first))
+        members = order[np.argsort(rank[inverse], kind='stable')]
+        sizes = counts[np.argsort(rank)]
+        return [set(part.tolist()) for part in np.split(members, np.cumsum(sizes)[:-1])]
+
+    def has_nonempty_intersection(self, xs: Collection[int], ys: Collection[int]) -> bool:
+        ys = {self.find(y) for y in ys if self._contains(y)}
+        for x in xs:
+            if self._contains(x) and self.find(x) in ys:
+                return True
+        return False
+
+    add = union_many
+
+    @property
+    def max_item(self):
+        return max(self._order)
@@ -1,15 +1,28 @@
-import copy
+import collections
+import contextlib
+import io
 import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable, Collection, Iterator, IO
 
 import numpy as np
-from tqdm import trange
+from tqdm import trange, tqdm
 
+from alcgen import tracing
+from alcgen.archive import ArchiveWriter, VARIANTS
+from alcgen.cache import InstanceCache, shared_cache
+from alcgen.compressed import Compression, SUFFIXES, open_compressed, resolve
 from alcgen.configuration import DatasetConfiguration
-from alcgen.generator import Generator, do_minimize, do_close, introduce_negations
-from alcgen.node import Node
-from alcgen.random_guide import RandomGuide
-from alcgen.syntax import to_manchester
+from alcgen.fingerprint import fingerprint
+from alcgen.generator import Generator, negations_mapping, minimizing_mapping, closing_mapping, \
+    constrained_cooccurrences
+from alcgen.metrics import InstanceMetrics, MetricsWriter, complete
+from alcgen.node import Node, Mappings
+from alcgen.random_guide import RandomGuide, BufferedRNG
+from alcgen.syntax import SERIALIZERS
 
 
 def compute_seed(configuration: DatasetConfiguration, depth: int, instance: int) -> int | None:
@@ -25,44 +38,346 @@ def compute_seed(configuration: DatasetConfiguration, depth: int, instance: int)
     return seed
 
 
-def save(path: Path, configuration: DatasetConfiguration, node: Node):
-    ce = node.to_ce()
-    with open(path, "wt") as f:
-        to_manchester(ce, configuration.prefix, f)
+def instance_seed(configuration: DatasetConfiguration, depth: int, instance: int, attempt: int = 0) \
+        -> int | list[int] | None:
+    seed = compute_seed(configuration, depth, instance)
+    if seed is not None and attempt > 0:
+        # The reseeding by deduplication is deterministic, too
+        seed = [seed, attempt]
+    return seed
+
+
+def create_guide(configuration: DatasetConfiguration, depth: int, instance: int, attempt: int = 0) -> RandomGuide:
+    rng = np.random.default_rng(instance_seed(configuration, depth, instance, attempt))
+    if configuration.buffered_rng:
+        rng = BufferedRNG(rng)
+    return RandomGuide(rng, configuration.guide, configuration.universal_guide)
+
+
+def save(path: Path, write: Callable[[IO], None], compression: Compression = None, level: int | None = None,
+         binary: bool = False):
+    with open_compressed(path, "wb" if binary else "wt", compression, level) as f:
+        write(f)
+
+
+def requested_variants(configuration: DatasetConfiguration) -> list[str]:
+    return [variant for variant in VARIANTS if getattr(configuration, f"save_{variant}")]
+
+
+def instance_metrics(configuration: DatasetConfiguration, depth: int, instance: int, attempt: int,
+                     count: bool = False) -> InstanceMetrics:
+    return InstanceMetrics(depth, instance, attempt, instance_seed(configuration, depth, instance, attempt), count)
+
+
+def instance_cache(configuration: DatasetConfiguration, depth: int, instance: int, attempt: int) -> InstanceCache:
+    return InstanceCache(shared_cache(configuration.cache_dir, configuration.cache_size)
+                         if configuration.cache_dir is not None else None,
+                         configuration, depth, instance_seed(configuration, depth, instance, attempt))
+
+
+def generate_instance(configuration: DatasetConfiguration, depth: int, instance: int, attempt: int,
+                      cache: InstanceCache) -> Node:
+    guide = create_guide(configuration, depth, instance, attempt)
+    return cache.node(lambda: Generator().generate(depth, guide))
+
+
+def instance_variants(configuration: DatasetConfiguration, depth: int, instance: int, attempt: int,
+                      variants: Collection[str], metrics: InstanceMetrics | None = None) \
+        -> Iterator[tuple[str, Callable[[IO], None]]]:
+    """
+    Generates the instance and yields the requested variants, along with the functions serializing them into a file.
+    The formula is modified in place, so each variant must be written before advancing to the next one.
+    The durations of the stages, and the sizes of the formulas if requested, are collected in `metrics`.
+    """
+    if len(variants) == 0:
+        return
+    if metrics is None:
+        metrics = instance_metrics(configuration, depth, instance, attempt)
+    cache = instance_cache(configuration, depth, instance, attempt)
+    with metrics.stage("generate"):
+        n = generate_instance(configuration, depth, instance, attempt, cache)
+
+    def writer(mappings: Mappings = ()) -> Callable[[IO], None]:
+        if configuration.format == "manchester":
+            # Streamed straight from the formula, without building the expression
+            return lambda f: n.to_manchester(configuration.prefix, f, mappings)
+        return lambda f: SERIALIZERS[configuration.format].write(n.to_ce(mappings), configuration.prefix, f)
+
+    if "open" in variants or "open_minimized" in variants:
+        # The open variants are serialized through their mappings instead of modifying a copy of the formula, as the
+        # generated node is still needed for closing
+        cooccurrences = None
+
+        def compute_negations() -> dict[int, int]:
+            nonlocal cooccurrences
+            mapping, cooccurrences = negations_mapping(n)
+            return mapping
+
+        def compute_open_minimizing() -> dict[int, int]:
+            if cooccurrences is None:
+                compute_negations()
+            return minimizing_mapping(cooccurrences)
+
+        with metrics.stage("negate"):
+            negations = cache.mapping("negations", compute_negations)
+        if "open" in variants:
+            metrics.formula("open", n, [negations])
+            yield "open", writer([negations])
+        if "open_minimized" in variants:
+            with metrics.stage("minimize_open"):
+                mappings = [negations, cache.mapping("open_minimizing", compute_open_minimizing)]
+            metrics.formula("open_minimized", n, mappings)
+            yield "open_minimized", writer(mappings)
+    if "closed" in variants or "closed_minimized" in variants:
+        with metrics.stage("close"):
+            n.apply_mapping(cache.mapping("closing", lambda: closing_mapping(n.leafs())))
+        if "closed" in variants:
+            metrics.formula("closed", n)
+            yield "closed", writer()
+        if "closed_minimized" in variants:
+            with metrics.stage("minimize_closed"):
+                n.apply_mapping(cache.mapping("closed_minimizing",
+                                              lambda: minimizing_mapping(constrained_cooccurrences(n))))
+            metrics.formula("closed_minimized", n)
+            yield "closed_minimized", writer()
+
 
+def create_instance(configuration: DatasetConfiguration, target_dir: Path, depth: int, instance: int,
+                    attempt: int = 0, metrics: bool = False) -> list[dict]:
+    """Writes the missing variants of the instance and returns their metrics records if `metrics` is set."""
+    instance_dir = target_dir / str(depth) / str(instance)
+    instance_dir.mkdir(parents=True, exist_ok=True)
+    serializer = SERIALIZERS[configuration.format]
+    suffix = serializer.suffix + SUFFIXES[configuration.compression]
+    variants = [variant for variant in requested_variants(configuration)
+                if not (instance_dir / f"{variant}{suffix}").exists()]
+    collected = instance_metrics(configuration, depth, instance, attempt, metrics)
+    records = []
+    with tracing.instance(depth, instance):
+        for variant, write in instance_variants(configuration, depth, instance, attempt, variants, collected):
+            path = instance_dir / f"{variant}{suffix}"
+            with collected.stage(f"serialize_{variant}"):
+                save(path, write, configuration.compression, configuration.compression_level, serializer.binary)
+            if metrics:
+                records.append(complete(collected.record(variant), path, path.stat().st_size))
+    return records
 
-def create_dataset(configuration: DatasetConfiguration, target_dir: os.PathLike | Path):
+
+def archive_instance(configuration: DatasetConfiguration, archive: ArchiveWriter, depth: int, instance: int,
+                     attempt: int = 0, metrics: bool = False) -> list[dict]:
+    variants = [variant for variant in requested_variants(configuration)
+                if not archive.exists(depth, instance, variant)]
+    collected = instance_metrics(configuration, depth, instance, attempt, metrics)
+    records = []
+    with tracing.instance(depth, instance):
+        for variant, write in instance_variants(configuration, depth, instance, attempt, variants, collected):
+            with collected.stage(f"serialize_{variant}"):
+                with archive.open(depth, instance, variant) as f:
+                    write(f)
+            if metrics:
+                records.append(complete(collected.record(variant), archive.path(depth, instance, variant),
+                                        archive.stored_size(depth, instance, variant)))
+    return records
+
+
+def render_instance(configuration: DatasetConfiguration, depth: int, instance: int, attempt: int,
+                    variants: Collection[str], metrics: bool = False) -> tuple[dict[str, bytes], dict[str, dict]]:
+    """
+    Serializes the variants in memory, for the worker processes, which cannot append to the archives themselves.
+    Returns them along with their metrics records if `metrics` is set, to be completed once they are appended.
+    """
+    binary = SERIALIZERS[configuration.format].binary
+    collected = instance_metrics(configuration, depth, instance, attempt, metrics)
+    result = {}
+    records = {}
+    with tracing.instance(depth, instance):
+        for variant, write in instance_variants(configuration, depth, instance, attempt, variants, collected):
+            with collected.stage(f"serialize_{variant}"):
+                f = io.BytesIO() if binary else io.StringIO()
+                write(f)
+                result[variant] = f.getvalue() if binary else f.getvalue().encode("utf-8")
+            if metrics:
+                records[variant] = collected.record(variant)
+    return result, records
+
+
+FINGERPRINTS_FILE = "fingerprints.tsv"
+
+
+@dataclass
+class DeduplicationStats:
+    fingerprinted: int = 0
+    reseeded: int = 0
+    reseeds: int = 0
+    duplicates: int = 0
+    unique: int = 0
+
+    def __str__(self) -> str:
+        return (f"Deduplication: {self.fingerprinted} instances fingerprinted, {self.reseeded} reseeded "
+                f"({self.reseeds} reseeds in total), {self.duplicates} duplicates kept, {self.unique} unique shapes")
+
+
+# The run-scoped generation cache in `target_dir`, used by the deduplication if no `cache_dir` is configured
+DEDUPLICATION_CACHE = ".deduplication-cache"
+
+
+def fingerprint_instance(configuration: DatasetConfiguration, depth: int, instance: int, attempt: int) -> str:
+    """
+    Fingerprints the generated formula, storing it in the generation cache, so that the chosen attempt is not generated
+    again when the instance is written.
+    """
+    cache = instance_cache(configuration, depth, instance, attempt)
+    return fingerprint(generate_instance(configuration, depth, instance, attempt, cache))
+
+
+def deduplicate(configuration: DatasetConfiguration, target_dir: Path, tasks: list[tuple[int, int]],
+                map_fn: Callable[..., Iterator[str]] = map, batch: int = 1) \
+        -> tuple[dict[tuple[int, int], int], DeduplicationStats]:
+    """
+    Chooses the attempt to generate each of the instances with, so that the generated formulas are not identical to the
+    earlier ones up to renaming, as determined by `fingerprint`. An instance colliding with an earlier one is reseeded
+    until a new shape is found; if none is found within `max_reseeds` attempts, the original one is kept. The reseeds
+    are fingerprinted with `map_fn`, `batch` attempts at a time.
+    The chosen attempts are recorded along with the fingerprints in `FINGERPRINTS_FILE` in `target_dir`, and taken
+    from there for the instances generated by the earlier runs.
+    """
+    if configuration.seed_depth is None and configuration.seed_instance is None:
+        raise ValueError("Deduplication requires the instances to be seeded")
+    index_fn = target_dir / FINGERPRINTS_FILE
+    attempts = {}
+    seen = set()
+    if index_fn.exists():
+        with open(index_fn) as f:
+            for line in f:
+                depth, instance, attempt, fp = line.split()
+                attempts[int(depth), int(instance)] = int(attempt)
+                seen.add(fp)
+    stats = DeduplicationStats()
+    pending = [task for task in tasks if task not in attempts]
+    # The first attempts are fingerprinted with map_fn, possibly in parallel, but the collisions are resolved in the
+    # order of the tasks, so the outcome does not depend on the number of workers
+    first = map_fn(fingerprint_instance, [configuration] * len(pending), [depth for depth, _ in pending],
+                   [instance for _, instance in pending], [0] * len(pending))
+    with open(index_fn, "at") as f:
+        for (depth, instance), original in zip(pending, first):
+            attempt, fp = 0, original
+            while fp in seen and attempt < configuration.max_reseeds:
+                # The first new shape in the batch is taken, so the outcome does not depend on its size
+                candidates = range(attempt + 1, min(attempt + batch, configuration.max_reseeds) + 1)
+                fingerprints = list(map_fn(fingerprint_instance, [configuration] * len(candidates),
+                                           [depth] * len(candidates), [instance] * len(candidates), candidates))
+                attempt, fp = next(((a, f) for a, f in zip(candidates, fingerprints) if f not in seen),
+                                   (candidates[-1], fingerprints[-1]))
+            stats.fingerprinted += 1
+            if attempt > 0:
+                stats.reseeded += 1
+                stats.reseeds += attempt
+            if fp in seen:
+                stats.duplicates += 1
+                attempt, fp = 0, original
+            seen.add(fp)
+            attempts[depth, instance] = attempt
+            f.write(f"{depth}\t{instance}\t{attempt}\t{fp}\n")
+    stats.unique = len(seen)
+    return attempts, stats
+
+
+def _archive_in_parallel(configuration: DatasetConfiguration, target_dir: Path, tasks: list[tuple[int, int]],
+                         attempts: dict[tuple[int, int], int], executor: ProcessPoolExecutor,
+                         metrics: MetricsWriter | None) -> None:
+    # The instances are appended in the order of the tasks, so that the archives do not depend on the number of workers,
+    # and only a bounded window of them is rendered ahead, so that they do not accumulate in the memory
+    window = collections.deque()
+    with ArchiveWriter(target_dir, configuration.compression, configuration.compression_level,
+                       configuration.format) as archive, \
+            tqdm(total=len(tasks)) as progress:
+        def append(depth: int, instance: int, future) -> None:
+            rendered, records = future.result()
+            for variant, data in rendered.items():
+                archive.write(depth, instance, variant, data)
+                if metrics is not None:
+                    metrics.write(complete(records[variant], archive.path(depth, instance, variant),
+                                           archive.stored_size(depth, instance, variant)))
+            progress.update()
+
+        for depth, instance in tasks:
+            variants = [variant for variant in requested_variants(configuration)
+                        if not archive.exists(depth, instance, variant)]
+            window.append((depth, instance, executor.submit(render_instance, configuration, depth, instance,
+                                                            attempts.get((depth, instance), 0), variants,
+                                                            metrics is not None)))
+            if len(window) >= 2 * configuration.workers:
+                append(*window.popleft())
+        while window:
+            append(*window.popleft())
+
+
+def create_dataset(configuration: DatasetConfiguration, target_dir: os.PathLike | Path,
+                   metrics: os.PathLike | None = None) -> DeduplicationStats | None:
+    """
+    Generates the dataset in `target_dir`. If `metrics` is given, a record per written file is appended to it in the
+    JSON Lines format, with the durations of the stages, the sizes of the formula and of the file and the peak memory;
+    its `path` is the path of the file as in the results of the benchmarker run on the same `target_dir`.
+    """
     target_dir = Path(target_dir)
     target_dir.mkdir(parents=True, exist_ok=True)
-    for depth in trange(configuration.min_depth, configuration.max_depth + 1):
-        for instance in trange(configuration.n_instances, position=1):
-            seed = compute_seed(configuration, depth, instance)
-            guide = RandomGuide(np.random.default_rng(seed), configuration.guide, configuration.universal_guide)
-            instance_dir = target_dir / str(depth) / str(instance)
-            instance_dir.mkdir(parents=True, exist_ok=True)
-            open_fn = instance_dir / "open.owl"
-            open_minimized_fn = instance_dir / "open_minimized.owl"
-            closed_fn = instance_dir / "closed.owl"
-            closed_minimized_fn = instance_dir / "closed_minimized.owl"
-            save_open = configuration.save_open and not open_fn.exists()
-            save_open_minimized = configuration.save_open_minimized and not open_minimized_fn.exists()
-            save_closed = configuration.save_closed and not closed_fn.exists()
-            save_closed_minimized = configuration.save_closed_minimized and not closed_minimized_fn.exists()
-            if not (save_open or save_open_minimized or save_closed or save_closed_minimized):
-                continue
-            n = Generator().generate(depth, guide)
-            if save_open or save_open_minimized:
-                m = copy.deepcopy(n)
-                cooccurrences = introduce_negations(m)
-                if save_open:
-                    save(open_fn, configuration, m)
-                if save_open_minimized:
-                    do_minimize(m, cooccurrences)
-                    save(open_minimized_fn, configuration, m)
-            if save_closed or save_closed_minimized:
-                do_close(n)
-                if save_closed:
-                    save(closed_fn, configuration, n)
-                if save_closed_minimized:
-                    do_minimize(n)
-                    save(closed_minimized_fn, configuration, n)
+    configuration = configuration.model_copy(
+        update={"compression": resolve(configuration.compression, configuration.output == "zip")})
+    scratch = None
+    if configuration.deduplicate and configuration.cache_dir is None:
+        # The formulas generated to be fingerprinted are kept for the run, so that they are not generated again to be
+        # written
+        scratch = target_dir / DEDUPLICATION_CACHE
+        configuration = configuration.model_copy(update={"cache_dir": str(scratch)})
+    tasks = [(depth, instance)
+             for depth in range(configuration.min_depth, configuration.max_depth + 1)
+             for instance in range(configuration.n_instances)]
+    attempts, stats = {}, None
+    with MetricsWriter(metrics) if metrics is not None else contextlib.nullcontext() as writer:
+        def record(records: list[dict]) -> None:
+            for r in records:
+                writer.write(r)
+
+        if configuration.workers <= 1:
+            if configuration.deduplicate:
+                attempts, stats = deduplicate(configuration, target_dir, tasks)
+            with ArchiveWriter(target_dir, configuration.compression, configuration.compression_level,
+                               configuration.format) \
+                    if configuration.output == "zip" else contextlib.nullcontext() as archive:
+                for depth in trange(configuration.min_depth, configuration.max_depth + 1):
+                    for instance in trange(configuration.n_instances, position=1):
+                        attempt = attempts.get((depth, instance), 0)
+                        if archive is None:
+                            record(create_instance(configuration, target_dir, depth, instance, attempt,
+                                                   writer is not None))
+                        else:
+                            record(archive_instance(configuration, archive, depth, instance, attempt,
+                                                    writer is not None))
+        else:
+            # Every instance is seeded independently by compute_seed, so the order of execution does not affect the
+            # output
+            initializer, initargs = tracing.initializer()
+            with ProcessPoolExecutor(max_workers=configuration.workers, initializer=initializer,
+                                     initargs=initargs) as executor:
+                if configuration.deduplicate:
+                    attempts, stats = deduplicate(configuration, target_dir, tasks, executor.map,
+                                                  configuration.workers)
+                if configuration.output == "zip":
+                    _archive_in_parallel(configuration, target_dir, tasks, attempts, executor, writer)
+                else:
+                    futures = [executor.submit(create_instance, configuration, target_dir, depth, instance,
+                                               attempts.get((depth, instance), 0), writer is not None)
+                               for depth, instance in tasks]
+                    with tqdm(total=len(futures)) as progress:
+                        for future in as_completed(futures):
+                            record(future.result())
+                            progress.update()
+    if scratch is not None:
+        shutil.rmtree(scratch, ignore_errors=True)
+        # Its tracked entries are gone along with it
+        shared_cache.cache_clear()
+    elif configuration.cache_dir is not None:
+        shared_cache(configuration.cache_dir, configuration.cache_size).evict()
+    if stats is not None:
+        print(stats)
+    return stats
@@ -0,0 +1,82 @@
+import hashlib
+
+from alcgen.node import Node
+from alcgen.syntax import CE, AND, OR, TOP, BOT, OP_QUANTIFIER, operands
+from alcgen.trampoline import trampoline, Recursion
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+_CONSTANT_SHAPES = {TOP: _digest(b"T"), BOT: _digest(b"B")}
+_CONCEPT_SHAPE = _digest(b"c")
+
+
+def _shape_of(ce: CE, shapes: dict[int, bytes]) -> bytes:
+    if isinstance(ce, tuple):
+        return shapes[id(ce)]
+    return _CONSTANT_SHAPES.get(ce, _CONCEPT_SHAPE)
+
+
+def _shape(ce: CE, shapes: dict[int, bytes]) -> Recursion[bytes]:
+    """The digest of the expression with the names of the concepts and roles disregarded."""
+    if not isinstance(ce, tuple):
+        return _shape_of(ce, shapes)
+    op = ce[0]
+    children = []
+    if op == AND or op == OR:
+        for c in operands(ce, op):
+            children.append((yield _shape(c, shapes)))
+        children.sort()
+    elif op in OP_QUANTIFIER:
+        children.append((yield _shape(ce[2], shapes)))
+    else:
+        for c in ce[1:]:
+            children.append((yield _shape(c, shapes)))
+    result = _digest(bytes([op]) + b"".join(children))
+    shapes[id(ce)] = result
+    return result
+
+
+def _canonical(ce: CE, shapes: dict[int, bytes], concepts: dict[int, int], roles: dict[int, int],
+               out: list[str]) -> Recursion[None]:
+    if not isinstance(ce, tuple):
+        if ce == TOP or ce == BOT:
+            out.append(f" {ce}")
+        else:
+            out.append(f" c{concepts.setdefault(ce, len(concepts))}")
+        return
+    op = ce[0]
+    out.append(f" ({op}")
+    if op == AND or op == OR:
+        # The sort is stable, so the operands of the same shape are kept in their order
+        for c in sorted(operands(ce, op), key=lambda c: _shape_of(c, shapes)):
+            yield _canonical(c, shapes, concepts, roles, out)
+    elif op in OP_QUANTIFIER:
+        out.append(f" r{roles.setdefault(ce[1], len(roles))}")
+        yield _canonical(ce[2], shapes, concepts, roles, out)
+    else:
+        for c in ce[1:]:
+            yield _canonical(c, shapes, concepts, roles, out)
+    out.append(")")
+
+
+def fingerprint(expr: CE | Node) -> str:
+    """
+    Computes a fingerprint of the expression that does not depend on the names of the concepts and the roles, nor on the
+    order and the nesting of the operands of conjunctions and disjunctions.
+
+    The operands are ordered by their shape, i.e., the expression with all the names disregarded, and the names are then
+    numbered in the order of their first occurrence. Ties between operands of the same shape are resolved by their
+    order, so if they differ in how they share names, equivalent expressions may get different fingerprints. This never
+    happens for the formulas as generated, as every concept occurs in them once, unless there are multiple roles.
+    Different expressions get different fingerprints (up to the collisions of SHA-256).
+    """
+    if isinstance(expr, Node):
+        expr = expr.to_ce()
+    shapes = {}
+    trampoline(_shape(expr, shapes))
+    out = []
+    trampoline(_canonical(expr, shapes, {}, {}, out))
+    return hashlib.sha256("".join(out).encode()).hexdigest()
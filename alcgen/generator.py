@@ -2,17 +2,21 @@ import itertools
 import typing
 from collections import defaultdict, Counter
 
+from alcgen import tracing
 from alcgen.cooccurrences import Cooccurrences
 from alcgen.guide import Guide
 from alcgen.leaf import Leafs, Leaf
 from alcgen.node import Node
 from alcgen.syntax import CE, AND, OR
+from alcgen.trampoline import trampoline, Recursion
 
 
 class Generator:
     def __init__(self):
         self._classes = 0
         self._roles = 0
+        # The calls of `_generate` for the depths above this one are traced as spans
+        self._traced_depth = None
 
     def _new_class(self) -> int:
         self._classes += 1
@@ -23,6 +27,14 @@ class Generator:
         return self._roles
 
     def generate(self, depth: int, guide: Guide, universal: bool = False, disjunct: bool = False) -> Node:
+        tracer = tracing.tracer()
+        self._traced_depth = depth - tracer.levels if tracer is not None else None
+        return trampoline(self._generate(depth, guide, universal, disjunct))
+
+    def _generate(self, depth: int, guide: Guide, universal: bool, disjunct: bool) -> Recursion[Node]:
+        traced = self._traced_depth is not None and depth > self._traced_depth
+        if traced:
+            start = tracing.now()
         node = Node()
         for _ in range(guide.n_conjuncts(depth, universal)):
             node.add_conjunct(self._new_class())
@@ -30,31 +42,36 @@ class Generator:
             for r, d in guide.existential_roles(depth, self._roles, universal):
                 while r > self._roles:
                     self._new_role()
-                child = self.generate(d, guide)
+                child = yield self._generate(d, guide, False, False)
                 node.add_existential(r, child)
             for r, d in guide.universal_roles(depth,
                                               {r: [n.depth() for n in nodes] for r, nodes in node.existential.items()},
                                               universal):
                 while r > self._roles:
                     self._new_role()
-                child = self.generate(d, guide, universal=True)
+                child = yield self._generate(d, guide, True, False)
                 node.add_universal(r, child)
         if not disjunct:
             for _ in range(guide.n_disjuncts(depth, universal)):
-                child = self.generate(depth, guide, disjunct=True)
+                child = yield self._generate(depth, guide, False, True)
                 node.add_disjunct(child)
+        if traced:
+            # The depths drawn by the guide may be NumPy integers, which are not serializable to JSON
+            tracing.tracer().complete("Generator.generate", start, depth=int(depth), universal=universal,
+                                      disjunct=disjunct)
         return node
 
 
+@tracing.traced
 def closing_mapping(leafs) -> dict[int, CE]:
     mapping = {}
     used = Counter()
 
-    def helper(leafs: Leafs):
+    def helper(leafs: Leafs) -> Recursion[bool]:
         if leafs.op == OR:
             # Close all - since the leafs are disjunctive, it suffices that any path is satisfiable for the formula to be satisfiable
             for leaf in leafs.leafs:
-                if not helper(leaf):
+                if not (yield helper(leaf)):
                     return False
             return True
         elif leafs.op == AND:
@@ -62,7 +79,7 @@ def closing_mapping(leafs) -> dict[int, CE]:
             # We prefer the deepest, but that is a heuristic with no guarantees
             max_depth = max([l.depth for l in leafs.leafs])
             for leaf in leafs.leafs:
-                if leaf.depth == max_depth and helper(leaf):
+                if leaf.depth == max_depth and (yield helper(leaf)):
                     return True
             else:
                 return False
@@ -94,39 +111,53 @@ def closing_mapping(leafs) -> dict[int, CE]:
             else:
                 return False
 
-    status = helper(leafs)
+    status = trampoline(helper(leafs))
     if not status:
         raise Exception("Cannot fully close the formula")
     return mapping
 
 
+@tracing.traced
 def nonclosing_mapping(cooccurrences: Cooccurrences) -> dict[int, int]:
+    """
+    Repeatedly pairs the first unused symbols of the first two families (in the order of `Cooccurrences.to_list`)
+    having any, negates one with the other and merges the two families.
+    The merged family keeps the position of the first one and all the other families preceding it have no unused
+    symbols left, so the families are processed in a single sweep instead of being rebuilt after every merge.
+    """
     n_symbols = cooccurrences.max_item + 1
     mapping = [None] * n_symbols
     used = [False] * n_symbols
-    while True:
-        families = cooccurrences.to_list()
-        if len(families) <= 1:
-            break
-        pair = []
-        for f in families:
-            for s in f:
-                if used[s]:
-                    continue
-                pair.append(s)
-                break
-            if len(pair) == 2:
-                break
-        if len(pair) < 2:
-            break
-        assert len(pair) == 2
-        mapping[pair[0]] = -pair[1]
-        used[pair[0]] = True
-        used[pair[1]] = True
-        cooccurrences.union_many(pair)
+    # The families in the order of `to_list`, each as the positions of its symbols in the order of `items`
+    symbols = []
+    families = defaultdict(list)
+    for x, p in cooccurrences.items():
+        families[p].append(len(symbols))
+        symbols.append(x)
+    families = list(families.values())
+
+    def first_unused(positions: list[int]) -> int | None:
+        # The set is built exactly as in `to_list`, so that the choice follows the same iteration order
+        family = set(map(symbols.__getitem__, positions))
+        return next(itertools.filterfalse(used.__getitem__, family), None)
+
+    current = families[0] if len(families) > 0 else []
+    for i in range(1, len(families)):
+        first = first_unused(current)
+        if first is None:
+            current = families[i]
+            continue
+        second = first_unused(families[i])
+        mapping[first] = -second
+        used[first] = True
+        used[second] = True
+        cooccurrences.union_many([first, second])
+        # Both lists are sorted, so this is a linear merge
+        current = sorted(current + families[i])
     return {k: v for k, v in enumerate(mapping) if v is not None}
 
 
+@tracing.traced
 def minimizing_mapping(cooccurrences: Cooccurrences) -> dict[int, int]:
     max_symbol = cooccurrences.max_item
     mapping = [None] * (max_symbol + 1)
@@ -137,17 +168,18 @@ def minimizing_mapping(cooccurrences: Cooccurrences) -> dict[int, int]:
     return {i: v for i, v in enumerate(mapping) if v is not None}
 
 
-def nonequivalence_constraints(a: Node, b: Node, lazy: bool) -> list[tuple[set[int], set[int]]]:
-    def count_signs(items: set[int]) -> tuple[int, int]:
-        p, n = 0, 0
-        for i in items:
-            if i > 0:
-                p += 1
-            else:
-                assert i < 0
-                n += 1
-        return p, n
+def count_signs(items: set[int]) -> tuple[int, int]:
+    p, n = 0, 0
+    for i in items:
+        if i > 0:
+            p += 1
+        else:
+            assert i < 0
+            n += 1
+    return p, n
 
+
+def nonequivalence_constraints(a: Node, b: Node, lazy: bool) -> list[tuple[set[int], set[int]]]:
     if len(a.conjuncts) != len(b.conjuncts):
         return []
     if count_signs(a.conjuncts) != count_signs(b.conjuncts):
@@ -166,7 +198,7 @@ def nonequivalence_constraints(a: Node, b: Node, lazy: bool) -> list[tuple[set[i
         for acoll, bcoll in [(a.universal, b.universal), (a.existential, b.existential)]:
             result = []
             for r, anodes in acoll.items():
-                bnodes = bcoll[r]
+                bnodes = bcoll.get(r, [])
                 if len(anodes) != len(bnodes):
                     return []
                 hits = [False] * len(bnodes)
@@ -190,12 +222,48 @@ def nonequivalence_constraints(a: Node, b: Node, lazy: bool) -> list[tuple[set[i
     return [(a.conjuncts, b.conjuncts)]
 
 
-def compute_constraints(n: Node, lazy: bool = True) -> typing.Generator[tuple[set[int], set[int]], None, None]:
+def _candidates(nodes: list[Node]) -> list[list[Node]]:
+    """
+    For each of the nodes, the following siblings it may need a nonequivalence constraint with, i.e., these with the
+    same signs of the conjuncts and the same descriptor, in their original order.
+    The nodes are bucketed by these keys, so only the pairs within a bucket are compared by
+    `nonequivalence_constraints`.
+    """
+    result = [[] for _ in nodes]
+    if len(nodes) < 2:
+        return result
+    # The signs are cheap to count, so the descriptors are computed only if they may matter
+    by_signs = defaultdict(list)
+    for i, x in enumerate(nodes):
+        by_signs[count_signs(x.conjuncts)].append(i)
+    for indices in by_signs.values():
+        if len(indices) < 2:
+            continue
+        by_descriptor = defaultdict(list)
+        for i in indices:
+            by_descriptor[nodes[i].descriptor].append(i)
+        for bucket in by_descriptor.values():
+            for k, i in enumerate(bucket):
+                result[i] = [nodes[j] for j in bucket[k + 1:]]
+    return result
+
+
+def _siblings(n: Node) -> typing.Generator[tuple[Node, list[Node]], None, None]:
     for nodes in itertools.chain(n.existential.values(), n.universal.values()):
-        for i, x in enumerate(nodes):
-            for y in nodes[i + 1:]:
+        yield from zip(nodes, _candidates(nodes))
+
+
+def compute_constraints(n: Node, lazy: bool = True) -> typing.Generator[tuple[set[int], set[int]], None, None]:
+    # Depth-first with an explicit stack, so that the depth of the formula is not limited by the recursion limit
+    stack = [_siblings(n)]
+    while stack:
+        for x, others in stack[-1]:
+            for y in others:
                 yield from nonequivalence_constraints(x, y, lazy)
-            yield from compute_constraints(x, lazy)
+            stack.append(_siblings(x))
+            break
+        else:
+            stack.pop()
 
 
 def union(*sets: set[int]) -> set[int]:
@@ -231,19 +299,31 @@ def do_close(n: Node):
     n.apply_mapping(closing_mapping(n.leafs()))
 
 
-def do_minimize(n: Node, cooccurrences: Cooccurrences | None = None):
-    if cooccurrences is None:
+def constrained_cooccurrences(n: Node) -> Cooccurrences:
+    with tracing.span("Node.cooccurrences"):
         cooccurrences = n.cooccurrences()
+    # compute_constraints is a generator, so it is traced along with the merging of the constraints it yields
+    with tracing.span("compute_constraints"):
         for constraint in compute_constraints(n):
             merge_constraint_into_symbols(cooccurrences, constraint)
+    return cooccurrences
+
+
+def do_minimize(n: Node, cooccurrences: Cooccurrences | None = None):
+    if cooccurrences is None:
+        cooccurrences = constrained_cooccurrences(n)
     n.apply_mapping(minimizing_mapping(cooccurrences))
 
 
+def negations_mapping(n: Node) -> tuple[dict[int, int], Cooccurrences]:
+    """Computes the mapping applied by `introduce_negations`, without modifying `n`."""
+    cooccurrences = constrained_cooccurrences(n)
+    return nonclosing_mapping(cooccurrences), cooccurrences
+
+
 def introduce_negations(n: Node):
-    cooccurrences = n.cooccurrences()
-    for constraint in compute_constraints(n):
-        merge_constraint_into_symbols(cooccurrences, constraint)
-    n.apply_mapping(nonclosing_mapping(cooccurrences))
+    mapping, cooccurrences = negations_mapping(n)
+    n.apply_mapping(mapping)
     return cooccurrences
 
 
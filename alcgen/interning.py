@@ -0,0 +1,171 @@
+from typing import Mapping
+
+from alcgen.syntax import CE, NOT, AND, OR, ALL, ANY, TOP, BOT, OP_QUANTIFIER, CanonicalForms
+from alcgen.trampoline import trampoline, Recursion
+
+
+class CEFactory:
+    """
+    Interns class expressions, so that identical subterms are stored once: each distinct subterm is a single tuple,
+    built of the interned tuples of its operands, so the expressions remain usable with all the functions of
+    `alcgen.syntax`. Every subterm gets an identifier, in the order of interning, and a hash computed once from the
+    hashes of its operands, which does not depend on the factory.
+
+    `nnf`, `eq` and `rename` follow their counterparts in `alcgen.syntax`, but are memoized per subterm, so they take
+    time in the number of the distinct subterms rather than in the size of the expression, and `eq` in the number of
+    those not canonicalized by the earlier calls.
+    """
+
+    def __init__(self):
+        # The subterms by keys packing their operator and the identifiers of their operands (or the role) into an int,
+        # which takes less memory than a tuple; they are unique as long as there are fewer than 2^32 subterms and roles.
+        # The atoms are kept separately, by themselves
+        self._ids: dict[int, int] = {}
+        self._atoms: dict[int, int] = {}
+        self._terms: list[CE] = []
+        self._hashes: list[int] = []
+        # The interned tuples by their id(), so that they are looked up without hashing them recursively; they are kept
+        # alive by `_terms`, so the addresses are never reused
+        self._objects: dict[int, int] = {}
+        self._nnf: dict[int, CE] = {}
+        self._forms = CanonicalForms()
+        self._canonical: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        """The number of the distinct subterms interned so far."""
+        return len(self._terms)
+
+    def _atom(self, c: int) -> int:
+        i = self._atoms.get(c)
+        if i is None:
+            i = self._atoms[c] = len(self._terms)
+            self._terms.append(c)
+            self._hashes.append(hash(c))
+        return i
+
+    def id(self, ce: CE) -> int:
+        """The identifier of an interned expression; the atoms are interned on demand."""
+        if type(ce) is not tuple:
+            return self._atom(ce)
+        try:
+            return self._objects[id(ce)]
+        except KeyError:
+            raise ValueError("The expression was not interned by this factory") from None
+
+    def hash(self, ce: CE) -> int:
+        return self._hashes[self.id(ce)]
+
+    def make(self, op: int, a: CE, b: CE | None = None) -> CE:
+        """
+        Interns the expression with the operator `op` and the interned operands, `make(NOT, a)`, `make(AND, a, b)`,
+        or with the role and the interned operand for the quantifiers, `make(ANY, r, a)`.
+        """
+        objects = self._objects
+        hashes = self._hashes
+        try:
+            j = 0 if b is None else objects[id(b)] if type(b) is tuple else self._atom(b)
+            if op in OP_QUANTIFIER:
+                key = (a << 32 | j) << 3 | op
+            else:
+                i = objects[id(a)] if type(a) is tuple else self._atom(a)
+                key = (i << 32 | j) << 3 | op
+        except KeyError:
+            raise ValueError("The operands were not interned by this factory") from None
+        k = self._ids.get(key)
+        if k is not None:
+            return self._terms[k]
+        if b is None:
+            term = (op, a)
+            h = hash((op, hashes[i]))
+        elif op in OP_QUANTIFIER:
+            term = (op, a, b)
+            h = hash((op, a, hashes[j]))
+        else:
+            term = (op, a, b)
+            h = hash((op, hashes[i], hashes[j]))
+        k = self._ids[key] = objects[id(term)] = len(self._terms)
+        self._terms.append(term)
+        hashes.append(h)
+        return term
+
+    def intern(self, ce: CE) -> CE:
+        """The interned expression identical to `ce`."""
+        return trampoline(self._intern(ce, {}))
+
+    def _intern(self, ce: CE, memo: dict[int, CE]) -> Recursion[CE]:
+        if type(ce) is not tuple:
+            self._atom(ce)
+            return ce
+        if id(ce) in self._objects:
+            return ce
+        # The same tuple may occur in the expression many times
+        if id(ce) in memo:
+            return memo[id(ce)]
+        op = ce[0]
+        if op in OP_QUANTIFIER:
+            result = self.make(op, ce[1], (yield self._intern(ce[2], memo)))
+        elif len(ce) == 2:
+            result = self.make(op, (yield self._intern(ce[1], memo)))
+        else:
+            result = self.make(op, (yield self._intern(ce[1], memo)), (yield self._intern(ce[2], memo)))
+        memo[id(ce)] = result
+        return result
+
+    def nnf(self, ce: CE) -> CE:
+        """The interned `syntax.nnf` of the expression."""
+        return trampoline(self._nnf_of(self.intern(ce)))
+
+    def _nnf_of(self, t: CE) -> Recursion[CE]:
+        if type(t) is not tuple or t[0] != NOT:
+            return t
+        i = self._objects[id(t)]
+        if i in self._nnf:
+            return self._nnf[i]
+        x = t[1]
+        result = t
+        if type(x) is tuple:
+            op = x[0]
+            if op == NOT:
+                result = yield self._nnf_of(x[1])
+            elif op == AND or op == OR:
+                result = self.make(OR if op == AND else AND, (yield self._nnf_of(self.make(NOT, x[1]))),
+                                   (yield self._nnf_of(self.make(NOT, x[2]))))
+            elif op == ALL or op == ANY:
+                result = self.make(ANY if op == ALL else ALL, x[1], (yield self._nnf_of(self.make(NOT, x[2]))))
+        elif x == BOT:
+            result = self.intern(TOP)
+        elif x == TOP:
+            result = self.intern(BOT)
+        self._nnf[i] = result
+        return result
+
+    def eq(self, a: CE, b: CE) -> bool:
+        """`syntax.eq`, canonicalizing each of the distinct subterms once."""
+        return self.canonical(a) == self.canonical(b)
+
+    def canonical(self, ce: CE) -> int:
+        """The identifier of the canonical form of the expression, see `syntax.CanonicalForms`."""
+        # The interned subterms are kept alive, so their canonical forms are memoized across the calls
+        return self._forms.id(self.intern(ce), self._canonical)
+
+    def rename(self, ce: CE, mapping: Mapping[int, int]) -> CE:
+        """The interned `syntax.rename` of the expression, renaming each of its distinct subterms once."""
+        return trampoline(self._rename(self.intern(ce), mapping, {}))
+
+    def _rename(self, t: CE, mapping: Mapping[int, int], memo: dict[int, CE]) -> Recursion[CE]:
+        if type(t) is not tuple:
+            c = mapping.get(t, t)
+            self._atom(c)
+            return c
+        if id(t) in memo:
+            return memo[id(t)]
+        op = t[0]
+        if op in OP_QUANTIFIER:
+            result = self.make(op, t[1], (yield self._rename(t[2], mapping, memo)))
+        elif len(t) == 2:
+            result = self.make(op, (yield self._rename(t[1], mapping, memo)))
+        else:
+            result = self.make(op, (yield self._rename(t[1], mapping, memo)),
+                               (yield self._rename(t[2], mapping, memo)))
+        memo[id(t)] = result
+        return result
@@ -0,0 +1,127 @@
+import contextlib
+import json
+import os
+import sys
+import time
+from typing import Any, Iterator, IO
+
+from alcgen import tracing
+from alcgen.node import Node, Mappings
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+# The stages each of the variants goes through, by the names they are reported under. The open and the closed variants
+# are minimized by different mappings, and each variant is serialized on its own, so these are separate stages
+_VARIANT_STAGES = {
+    "open": {"generate": "generate", "negate": "negate", "serialize": "serialize_open"},
+    "open_minimized": {"generate": "generate", "negate": "negate", "minimize": "minimize_open",
+                       "serialize": "serialize_open_minimized"},
+    "closed": {"generate": "generate", "close": "close", "serialize": "serialize_closed"},
+    "closed_minimized": {"generate": "generate", "close": "close", "minimize": "minimize_closed",
+                         "serialize": "serialize_closed_minimized"},
+}
+
+
+def peak_rss() -> int | None:
+    """The peak resident set size of the process so far, in bytes, or None if it cannot be determined."""
+    if resource is None:
+        return None
+    # Reported in kilobytes on Linux and in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def count_symbols(n: Node, mappings: Mappings = ()) -> dict[str, int]:
+    """
+    The numbers of the nodes of the formula and of the distinct concepts and roles in it after applying `mappings`.
+    """
+    nodes = 0
+    concepts = set()
+    roles = set()
+    stack = [n]
+    while stack:
+        node = stack.pop()
+        nodes += 1
+        concepts.update(abs(c) for c in node.mapped_conjuncts(mappings))
+        stack.extend(node.disjuncts)
+        for restrictions in (node.existential, node.universal):
+            roles.update(restrictions)
+            for children in restrictions.values():
+                stack.extend(children)
+    return {"nodes": nodes, "concepts": len(concepts), "roles": len(roles)}
+
+
+class InstanceMetrics:
+    """
+    Collects the metrics of generating a single instance: the durations of its stages, including the lookups in the
+    generation cache, and, if `count` is set, the sizes of the formulas of its variants. The stages are also traced as
+    spans in the current `tracing` session.
+    """
+
+    def __init__(self, depth: int, instance: int, attempt: int, seed: int | list[int] | None, count: bool = False):
+        self.depth = depth
+        self.instance = instance
+        self.attempt = attempt
+        self.seed = seed
+        self.count = count
+        self.seconds: dict[str, float] = {}
+        self.counts: dict[str, dict[str, int]] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            with tracing.span(name):
+                yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def formula(self, variant: str, n: Node, mappings: Mappings = ()) -> None:
+        """Counts the formula of the variant, as it is about to be serialized."""
+        if self.count:
+            self.counts[variant] = count_symbols(n, mappings)
+
+    def record(self, variant: str) -> dict[str, Any]:
+        """The metrics of the serialized variant, to be completed with the path and the size of its file."""
+        return {
+            "depth": self.depth,
+            "instance": self.instance,
+            "variant": variant,
+            "attempt": self.attempt,
+            "seed": self.seed,
+            "seconds": {name: self.seconds[stage] for name, stage in _VARIANT_STAGES[variant].items()
+                        if stage in self.seconds},
+            **self.counts.get(variant, {}),
+            "peak_rss": peak_rss(),
+        }
+
+
+def complete(record: dict[str, Any], path: os.PathLike | str, size: int) -> dict[str, Any]:
+    """The record with the path of the file first, as in the results of the benchmarker, and its size in bytes."""
+    return {"path": str(path), **record, "bytes": size}
+
+
+class MetricsWriter:
+    """
+    Appends the records to a JSON Lines file, one per line, so that the metrics of a resumed run follow those of the
+    earlier ones. The lines are flushed as they are written, to be followed during long runs.
+    """
+
+    def __init__(self, path: os.PathLike | str):
+        self._f: IO = open(path, "at")
+
+    def write(self, record: dict[str, Any]) -> None:
+        self._f.write(json.dumps(record) + "\n")
+        self._f.flush()
+
+    def close(self) -> None:
+        self._f.close()
+
+    def __enter__(self) -> "MetricsWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
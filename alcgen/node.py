@@ -1,12 +1,48 @@
 import itertools
-from collections import defaultdict
+from typing import Callable, Iterator, Sequence
 
-from alcgen.cooccurrences import Cooccurrences
+from alcgen.cooccurrences import Cooccurrences, ArrayCooccurrences
+from alcgen.interning import CEFactory
 from alcgen.leaf import Leafs, Leaf
-from alcgen.syntax import CE, AND, ANY, OR, TOP, to_pretty, ALL, NOT
+from alcgen.syntax import CE, AND, ANY, OR, TOP, to_pretty, ALL, NOT, Namer, write_manchester
+from alcgen.trampoline import trampoline, Recursion
+
+
+# Shared placeholders for the operands a node does not have, as most of the nodes are leafs.
+# A container is replaced with a node's own one before the first operand is added to it, so they are never mutated.
+_NO_NODES = ()
+_NO_ROLES = {}
+
+# Bumped on every mutation of any node; the descriptors cached by the nodes are valid only for the version they were
+# computed at. The graph is built first and then only queried, so a global counter is enough to keep them coherent.
+_version = 0
+
+
+def _mutated() -> None:
+    global _version
+    _version += 1
+
+
+# Hash-consing of the shapes of the nodes: a shape is described by the identifiers of the shapes of its operands, so
+# each distinct shape is stored once and the descriptors are compared in constant time
+_descriptors: dict[tuple, int] = {}
+
+# Mappings of the concept names applied in turn, describing a variant of a formula without modifying its nodes
+Mappings = Sequence[dict[int, int]]
+
+
+def _tuple(*items) -> tuple:
+    return items
+
+
+def _map_conjuncts(conjuncts: set[int], mapping: dict[int, int]) -> set[int]:
+    return {(-1 if c < 0 else 1) * mapping[abs(c)] if abs(c) in mapping else c for c in conjuncts}
 
 
 class Node:
+    # Formulas consist of millions of nodes, so avoid a per-instance __dict__
+    __slots__ = ("conjuncts", "disjuncts", "existential", "universal", "linked", "_depth", "_descriptor")
+
     conjuncts: set[int]
     disjuncts: list["Node"]
     existential: dict[int, list["Node"]]
@@ -15,43 +51,51 @@ class Node:
 
     def __init__(self, *args):
         self.conjuncts = set()
-        self.disjuncts = []
-        self.existential = defaultdict(list)
-        self.universal = defaultdict(list)
-        self.linked = []
-        # TODO Invalidate the descriptor if a new operand is added
+        self.disjuncts = _NO_NODES
+        self.existential = _NO_ROLES
+        self.universal = _NO_ROLES
+        self.linked = _NO_NODES
+        self._depth = 0
+        # The version at which the descriptor was computed, along with the descriptor
         self._descriptor = None
         for arg in args:
             if isinstance(arg, Node):
-                self.disjuncts.append(arg)
+                self.add_disjunct(arg)
             elif isinstance(arg, tuple):
                 assert len(arg) == 2
                 self.add_existential(*arg)
             else:
                 self.add_conjunct(arg)
 
-    def to_ce(self) -> CE:
+    def to_ce(self, mappings: Mappings = (), factory: CEFactory | None = None) -> CE:
+        """
+        Converts to a class expression, as if `apply_mapping` was called with each of `mappings` beforehand.
+        With a `factory`, the expression is interned in it while being built, so its identical subterms are shared.
+        """
+        return trampoline(self._to_ce(mappings, _tuple if factory is None else factory.make))
+
+    def _to_ce(self, mappings: Mappings, make: Callable[..., CE]) -> Recursion[CE]:
         def _add(left, op, right):
             if left is None:
                 return right
             else:
-                return op, left, right
+                return make(op, left, right)
 
         result = None
-        for i in self.conjuncts:
-            result = _add(result, AND, (NOT, -i) if i < 0 else i)
+        for i in self.mapped_conjuncts(mappings):
+            result = _add(result, AND, make(NOT, -i) if i < 0 else i)
         for r, nodes in self.existential.items():
             for n in nodes:
-                result = _add(result, AND, (ANY, r, n.to_ce()))
+                result = _add(result, AND, make(ANY, r, (yield n._to_ce(mappings, make))))
         for r, nodes in self.universal.items():
             for n in nodes:
-                result = _add(result, AND, (ALL, r, n.to_ce()))
+                result = _add(result, AND, make(ALL, r, (yield n._to_ce(mappings, make))))
 
         if len(self.disjuncts) > 0:
             assert len(self.disjuncts) >= 2
             or_ = None
             for n in self.disjuncts:
-                or_ = _add(or_, OR, n.to_ce())
+                or_ = _add(or_, OR, (yield n._to_ce(mappings, make)))
             if or_ is not None:
                 result = _add(result, AND, or_)
         if result is not None:
@@ -59,29 +103,86 @@ class Node:
         else:
             return TOP
 
+    def manchester_tokens(self, c: Namer, r: Namer, mappings: Mappings = ()) -> Iterator[str]:
+        """
+        Yields the same tokens as `manchester_tokens(self.to_ce(mappings), c, r)` without building the class expression.
+        """
+        # The stack holds literal strings, class identifiers, (role, quantifier) pairs and nodes to expand
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                yield item
+            elif isinstance(item, int):
+                yield c(item)
+            elif isinstance(item, tuple):
+                yield f"({r(item[0])} {item[1]} "
+            else:
+                operands = []
+                for i in item.mapped_conjuncts(mappings):
+                    operands.append(["(not ", -i, ")"] if i < 0 else [i])
+                for quantifier, roles in (("some", item.existential), ("only", item.universal)):
+                    for role, nodes in roles.items():
+                        for n in nodes:
+                            operands.append([(role, quantifier), n, ")"])
+                if len(item.disjuncts) > 0:
+                    assert len(item.disjuncts) >= 2
+                    or_ = ["("] * (len(item.disjuncts) - 1) + [item.disjuncts[0]]
+                    for n in item.disjuncts[1:]:
+                        or_ += [" or ", n, ")"]
+                    operands.append(or_)
+                if len(operands) == 0:
+                    stack.append(TOP)
+                    continue
+                # The operands are left-associated, as in `to_ce`, i.e., ((a and b) and c)
+                tokens = ["("] * (len(operands) - 1) + operands[0]
+                for operand in operands[1:]:
+                    tokens.append(" and ")
+                    tokens += operand
+                    tokens.append(")")
+                stack.extend(reversed(tokens))
+
+    def to_manchester(self, prefix: str, f, mappings: Mappings = ()):
+        write_manchester(lambda c, r: self.manchester_tokens(c, r, mappings), prefix, f)
+
     def add_conjunct(self, c: int):
+        _mutated()
         self.conjuncts.add(c)
 
     def add_disjunct(self, c: "Node"):
+        _mutated()
+        if len(self.disjuncts) == 0:
+            self.disjuncts = []
         self.disjuncts.append(c)
 
     def add_universal(self, r: int, n: "Node"):
+        _mutated()
         if r in self.existential:
             for other in self.existential[r]:
                 # other.merge_with(n)
                 other.link(n)
-        self.universal[r].append(n)
+        if len(self.universal) == 0:
+            self.universal = {}
+        self.universal.setdefault(r, []).append(n)
+        self._depth = max(self._depth, n.depth() + 1)
 
     def add_existential(self, r: int, n: "Node"):
+        _mutated()
         if r in self.universal:
             for other in self.universal[r]:
                 n.link(other)
-        self.existential[r].append(n)
+        if len(self.existential) == 0:
+            self.existential = {}
+        self.existential.setdefault(r, []).append(n)
+        self._depth = max(self._depth, n.depth() + 1)
 
     def link(self, other: "Node") -> None:
+        _mutated()
+        if len(self.linked) == 0:
+            self.linked = []
         self.linked.append(other)
         for r, unodes in other.universal.items():
-            for enode in self.existential[r]:
+            for enode in self.existential.get(r, _NO_NODES):
                 for n in unodes:
                     enode.link(n)
 
@@ -89,8 +190,13 @@ class Node:
         return to_pretty(self.to_ce())
 
     def gather_all_conjuncts(self, target: set[int]) -> set[int]:
-        target.update(self.conjuncts)
-        self.gather_linked_conjuncts(target)
+        """
+        Adds the conjuncts of the node and of the nodes linked to it to `target`. Like the other accessors of the linked
+        operands, it walks the links on every call, as nothing is cached in the nodes; the traversals calling them for
+        many nodes, `leafs` and `cooccurrences`, share a `_Closures` instead.
+        """
+        for conjuncts in _Closures().conjuncts(self):
+            target.update(conjuncts)
         return target
 
     def gather_linked_conjuncts(self, target: set[int]) -> set[int]:
@@ -99,87 +205,189 @@ class Node:
         return target
 
     def gather_all_disjuncts(self, target: list["Node"]) -> list["Node"]:
-        target += self.disjuncts
-        for node in self.linked:
-            node.gather_all_disjuncts(target)
+        target += _Closures().disjuncts(self)
         return target
 
     @property
     def all_existential(self) -> dict[int, list["Node"]]:
-        result = defaultdict(list)
-        result.update(self.existential)
-        for node in self.linked:
-            for r, nodes in node.all_existential.items():
-                result[r].extend(nodes)
-        return result
+        """The existential operands of the node and of the nodes linked to it, in fresh lists on every call."""
+        return _Closures().existential(self, True)
 
     @property
     def all_universal(self) -> dict[int, list["Node"]]:
-        result = defaultdict(list)
-        result.update(self.universal)
-        for node in self.linked:
-            for r, nodes in node.all_universal.items():
-                result[r].extend(nodes)
-        return result
+        """The universal operands of the node and of the nodes linked to it, in fresh lists on every call."""
+        return _Closures().universal(self, True)
 
     def leafs(self, shared: set | None = None, linked: set | None = None, depth: int = 0) -> Leafs:
-        disjuncts = self.gather_all_disjuncts([])
+        return trampoline(self._leafs(shared, linked, depth, _Closures()))
+
+    def _leafs(self, shared: set | None, linked: set | None, depth: int, closures: "_Closures") -> Recursion[Leafs]:
+        disjuncts = closures.disjuncts(self)
         if len(disjuncts) > 0:
             assert shared is None
             assert linked is None
             shared = self.conjuncts
-            linked = self.gather_linked_conjuncts(set())
+            linked = closures.linked_conjuncts(self)
             # Don't increase depth in disjunction, because that is not another level of the model
-            leafs = [d.leafs(shared, linked, depth) for d in disjuncts]
+            leafs = []
+            for d in disjuncts:
+                leafs.append((yield d._leafs(shared, linked, depth, closures)))
             return Leafs(OR, leafs, max(leaf.depth for leaf in leafs))
-        existential = self.all_existential.items()
+        existential = closures.existential(self).items()
         if len(existential) > 0:
             leafs = []
             for r, nodes in existential:
                 for n in nodes:
-                    leafs.append(n.leafs(depth=depth + 1))
+                    leafs.append((yield n._leafs(None, None, depth + 1, closures)))
             return Leafs(AND, leafs, max(leaf.depth for leaf in leafs))
-        ac = self.gather_linked_conjuncts(set())
+        ac = closures.linked_conjuncts(self)
         if linked is not None:
             ac |= linked
         return Leafs(None, Leaf(self.conjuncts, shared or set(), ac), depth)
 
+    def mapped_conjuncts(self, mappings: Mappings) -> set[int]:
+        """The conjuncts of the node as they would be after calling `apply_mapping` with each of `mappings` in turn."""
+        conjuncts = self.conjuncts
+        for mapping in mappings:
+            conjuncts = _map_conjuncts(conjuncts, mapping)
+        return conjuncts
+
     def apply_mapping(self, mapping: dict[int, int]) -> None:
-        self.conjuncts = {(-1 if c < 0 else 1) * mapping[abs(c)] if abs(c) in mapping else c for c in self.conjuncts}
-        for n in itertools.chain(self.disjuncts, *self.existential.values(), *self.universal.values()):
-            n.apply_mapping(mapping)
-
-    def _cooccurrences(self, target: Cooccurrences, prefix: set[int] | None):
-        top = {abs(s) for s in self.gather_all_conjuncts(set())}
-        if prefix is not None:
-            top.update(prefix)
-        target.add(top)
-        for e in itertools.chain(*self.existential.values()):
-            e._cooccurrences(target, None)
-        for e in itertools.chain(*self.universal.values()):
-            e._cooccurrences(target, None)
-        for d in self.gather_all_disjuncts([]):
-            d._cooccurrences(target, top)
+        _mutated()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node.conjuncts = _map_conjuncts(node.conjuncts, mapping)
+            stack.extend(itertools.chain(node.disjuncts, *node.existential.values(), *node.universal.values()))
+
+    def _cooccurrences(self, prefix: set[int] | None) -> Iterator[set[int]]:
+        # Pre-order traversal with an explicit stack; the children are pushed in reverse to be visited in order
+        closures = _Closures()
+        stack = [(self, prefix)]
+        while stack:
+            node, prefix = stack.pop()
+            gathered = set()
+            for conjuncts in closures.conjuncts(node):
+                gathered.update(conjuncts)
+            top = {abs(s) for s in gathered}
+            if prefix is not None:
+                top.update(prefix)
+            yield top
+            children = [(e, None) for e in itertools.chain(*node.existential.values(), *node.universal.values())]
+            children.extend((d, top) for d in closures.disjuncts(node))
+            stack.extend(reversed(children))
 
     def cooccurrences(self) -> Cooccurrences:
-        result = Cooccurrences()
-        self._cooccurrences(result, None)
+        result = ArrayCooccurrences()
+        result.union_all(self._cooccurrences(None))
         return result
 
     def depth(self) -> int:
-        d = 0
-        for e in itertools.chain(*self.existential.values()):
-            d = max(d, e.depth() + 1)
-        for e in itertools.chain(*self.universal.values()):
-            d = max(d, e.depth() + 1)
-        return d
+        """
+        The nesting depth of the quantifiers, maintained incrementally by `add_existential` and `add_universal`.
+        It assumes that a node is not extended with further quantifiers after being added as a child of another node.
+        """
+        return self._depth
 
     @property
-    def descriptor(self):
-        if self._descriptor is None:
-            c = len(self.conjuncts)
-            d = sorted([n.descriptor for n in self.disjuncts])
-            e = sorted([(r, n.descriptor) for r, nodes in self.existential.items() for n in nodes])
-            u = sorted([(r, n.descriptor) for r, nodes in self.universal.items() for n in nodes])
-            self._descriptor = (c, d, e, u)
-        return self._descriptor
+    def descriptor(self) -> int:
+        """
+        The identifier of the shape of the formula rooted in the node, i.e., the number of conjuncts and the multisets
+        of the shapes of the disjuncts and of the existential and universal restrictions.
+        Nodes have equal descriptors if and only if they have the same shape.
+        """
+        if self._descriptor is None or self._descriptor[0] != _version:
+            self._descriptor = (_version, trampoline(self._compute_descriptor()))
+        return self._descriptor[1]
+
+    def _compute_descriptor(self) -> Recursion[int]:
+        def descriptor(n: Node) -> Recursion[int]:
+            if n._descriptor is None or n._descriptor[0] != _version:
+                n._descriptor = (_version, (yield n._compute_descriptor()))
+            return n._descriptor[1]
+
+        c = len(self.conjuncts)
+        d = []
+        for n in self.disjuncts:
+            d.append((yield from descriptor(n)))
+        e = []
+        for r, nodes in self.existential.items():
+            for n in nodes:
+                e.append((r, (yield from descriptor(n))))
+        u = []
+        for r, nodes in self.universal.items():
+            for n in nodes:
+                u.append((r, (yield from descriptor(n))))
+        return _descriptors.setdefault((c, tuple(sorted(d)), tuple(sorted(e)), tuple(sorted(u))), len(_descriptors))
+
+
+class _Closures:
+    """
+    The operands of the nodes together with the operands of the nodes linked to them, memoized for a single traversal,
+    as the same linked nodes are reached from many nodes, and dropped with it, so that the nodes do not keep them.
+    The nodes without links are not memoized, as their closures are their own operands.
+    """
+
+    def __init__(self):
+        self._conjuncts: dict[Node, tuple[set[int], ...]] = {}
+        self._disjuncts: dict[Node, list[Node]] = {}
+        self._existential: dict[Node, dict[int, list[Node]]] = {}
+        self._universal: dict[Node, dict[int, list[Node]]] = {}
+
+    def conjuncts(self, node: Node) -> tuple[set[int], ...]:
+        """
+        The conjunct sets of the node and the nodes linked to it, in the order of the traversal, so the sets gathered
+        from them are filled in the same order as by the recursive traversal.
+        """
+        if len(node.linked) == 0:
+            return node.conjuncts,
+        result = self._conjuncts.get(node)
+        if result is None:
+            sets = {id(node.conjuncts): node.conjuncts}
+            for other in node.linked:
+                sets.update((id(c), c) for c in self.conjuncts(other))
+            result = self._conjuncts[node] = tuple(sets.values())
+        return result
+
+    def linked_conjuncts(self, node: Node) -> set[int]:
+        result = set()
+        for other in node.linked:
+            for conjuncts in self.conjuncts(other):
+                result.update(conjuncts)
+        return result
+
+    def disjuncts(self, node: Node) -> Sequence[Node]:
+        """The disjuncts of the node and of the nodes linked to it; the node's own container if it has no links."""
+        if len(node.linked) == 0:
+            return node.disjuncts
+        result = self._disjuncts.get(node)
+        if result is None:
+            result = list(node.disjuncts)
+            for other in node.linked:
+                result += self.disjuncts(other)
+            self._disjuncts[node] = result
+        return result
+
+    def existential(self, node: Node, copy: bool = False) -> dict[int, list[Node]]:
+        """
+        The existential operands of the node and of the nodes linked to it; the node's own container if it has no
+        links, unless `copy` is set.
+        """
+        return self._roles(node, self._existential, lambda n: n.existential, copy)
+
+    def universal(self, node: Node, copy: bool = False) -> dict[int, list[Node]]:
+        return self._roles(node, self._universal, lambda n: n.universal, copy)
+
+    def _roles(self, node: Node, memo: dict[Node, dict[int, list[Node]]],
+               roles: Callable[[Node], dict[int, list[Node]]], copy: bool) -> dict[int, list[Node]]:
+        if len(node.linked) == 0:
+            return {r: list(nodes) for r, nodes in roles(node).items()} if copy else roles(node)
+        result = memo.get(node)
+        if result is None:
+            result = {r: list(nodes) for r, nodes in roles(node).items()}
+            for other in node.linked:
+                for r, nodes in self._roles(other, memo, roles, False).items():
+                    result.setdefault(r, []).extend(nodes)
+            memo[node] = result
+        # A memoized result may be returned again within the traversal, so the caller gets a copy if it asked for one
+        return {r: list(nodes) for r, nodes in result.items()} if copy else result
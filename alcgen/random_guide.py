@@ -31,8 +31,39 @@ existential_policies = {
 }
 
 
+class BufferedRNG:
+    """
+    A drop-in replacement for the subset of `np.random.Generator` used by `RandomGuide`, serving the numbers from
+    a buffer of uniform floats drawn in blocks, as the per-call overhead of NumPy dominates drawing single scalars.
+    The integers are derived from the floats, so the stream of numbers differs from the one produced by the wrapped
+    generator itself, but it is still fully determined by its seed.
+    """
+
+    def __init__(self, rng: np.random.Generator, block_size: int = 4096):
+        self.rng = rng
+        self.block_size = block_size
+        self._buffer = []
+        self._cursor = 0
+
+    def random(self) -> float:
+        if self._cursor >= len(self._buffer):
+            self._buffer = self.rng.random(self.block_size).tolist()
+            self._cursor = 0
+        u = self._buffer[self._cursor]
+        self._cursor += 1
+        return u
+
+    def integers(self, low: int, high: int, size: int | None = None) -> int | np.ndarray:
+        if size is None:
+            return low + int(self.random() * (high - low))
+        return np.array([low + int(self.random() * (high - low)) for _ in range(size)])
+
+    def choice(self, a: list):
+        return a[self.integers(0, len(a))]
+
+
 class RandomGuide(Guide):
-    def __init__(self, rng: np.random.Generator, cfg: RandomGuideConfiguration | None = None,
+    def __init__(self, rng: np.random.Generator | BufferedRNG, cfg: RandomGuideConfiguration | None = None,
                  universal_cfg: RandomGuideConfiguration | None = None):
         self.rng = rng
         self.cfg = cfg or RandomGuideConfiguration()
@@ -1,4 +1,9 @@
-from typing import Mapping
+import contextlib
+import functools
+import gc
+from typing import Mapping, Callable, Iterator, Iterable, NamedTuple, IO
+
+from alcgen.trampoline import trampoline, Recursion
 
 TOP, BOT = -1, -2
 SUB, EQV, DIS, NOT, AND, OR, ALL, ANY = range(8)
@@ -36,18 +41,169 @@ def nnf(t: CE) -> CE:
     return t
 
 
-def eq(a: CE, b: CE) -> bool:
-    def real_eq(a: CE, b: CE) -> bool:
-        if isinstance(a, tuple) and isinstance(b, tuple):
-            if a[0] != b[0] or len(a) != len(b):
-                return False
-            if a[0] == AND or a[0] == OR:
-                return (real_eq(a[1], b[1]) and real_eq(a[2], b[2])) or (real_eq(a[1], b[2]) and real_eq(a[2], b[1]))
-            return all(real_eq(c, d) for c, d in zip(a[1:], b[1:]))
+_DUAL = {AND: OR, OR: AND, ALL: ANY, ANY: ALL}
+
+
+def _chain_operands(ce: CE, op: int) -> list[tuple[CE, int]]:
+    """
+    The operands of a nested chain of `op`, like `operands`, each with its multiplicity. The subchains occurring many
+    times, e.g., in the interned expressions, are visited once, so this is linear in the number of the distinct ones.
+    """
+    result = []
+    visited = set()
+    stack = [ce]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, tuple) and item[0] == op:
+            if id(item) in visited:
+                return _shared_chain_operands(ce, op)
+            visited.add(id(item))
+            stack.append(item[2])
+            stack.append(item[1])
+        else:
+            result.append((item, 1))
+    return result
+
+
+def _shared_chain_operands(ce: CE, op: int) -> list[tuple[CE, int]]:
+    # The subchains in the post-order of a depth-first search, whose reverse lists every subchain before its operands
+    order = []
+    visited = set()
+    stack = [(ce, False)]
+    while stack:
+        item, expanded = stack.pop()
+        if expanded:
+            order.append(item)
+        elif id(item) not in visited:
+            visited.add(id(item))
+            stack.append((item, True))
+            for c in (item[1], item[2]):
+                if isinstance(c, tuple) and c[0] == op:
+                    stack.append((c, False))
+    multiplicities = {id(ce): 1}
+    result = {}
+    for item in reversed(order):
+        n = multiplicities[id(item)]
+        for c in (item[1], item[2]):
+            if isinstance(c, tuple) and c[0] == op:
+                multiplicities[id(c)] = multiplicities.get(id(c), 0) + n
+            elif id(c) in result:
+                result[id(c)][1] += n
+            else:
+                result[id(c)] = [c, n]
+    return [(c, n) for c, n in result.values()]
+
+
+class CanonicalForms:
+    """
+    Assigns identifiers to the canonical forms of class expressions, so that two expressions get the same identifier
+    iff they are equal up to the negation normal form and the associativity and the commutativity of conjunctions and
+    disjunctions. In the canonical form, the nested conjunctions (and the disjunctions) are flattened into a single
+    multiset of the operands, kept as the pairs of their identifiers and multiplicities, sorted by the identifiers.
+
+    Every distinct canonical form is stored once, so the expressions canonicalized by the same instance can be compared
+    or deduplicated by their identifiers, and canonicalizing an expression takes time linear in its size, up to the
+    sorting of the operands.
+    """
+
+    def __init__(self):
+        self._ids: dict[tuple | int, int] = {}
+        self._keys: list[tuple | int] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _id(self, key: tuple | int) -> int:
+        i = self._ids.get(key)
+        if i is None:
+            i = self._ids[key] = len(self._keys)
+            self._keys.append(key)
+        return i
+
+    def _atom(self, c: int, negated: bool) -> int:
+        if not negated:
+            return self._id(c)
+        if c == TOP or c == BOT:
+            return self._id(BOT if c == TOP else TOP)
+        return self._id((NOT, self._id(c)))
+
+    def id(self, ce: CE, memo: dict[int, int] | None = None) -> int:
+        """
+        The identifier of the canonical form of the expression. `memo` holds the identifiers of the subterms by their
+        id() and polarity; it may be shared by the calls only as long as the subterms are kept alive.
+        """
+        if not isinstance(ce, tuple):
+            return self._atom(ce, False)
+        return trampoline(self._canonical(ce, False, {} if memo is None else memo))
+
+    def _canonical(self, ce: tuple, negated: bool, memo: dict[int, int]) -> Recursion[int]:
+        memo_key = id(ce) << 1 | negated
+        if memo_key in memo:
+            return memo[memo_key]
+        op = ce[0]
+        if op == NOT:
+            c = ce[1]
+            result = (yield self._canonical(c, not negated, memo)) if isinstance(c, tuple) else \
+                self._atom(c, not negated)
+        elif op == AND or op == OR:
+            op_ = _DUAL[op] if negated else op
+            counts = {}
+            for c, n in _chain_operands(ce, op):
+                # The atoms and their negations, most of the operands, are canonicalized right away
+                if not isinstance(c, tuple):
+                    i = self._atom(c, negated)
+                elif c[0] == NOT and not isinstance(c[1], tuple):
+                    i = self._atom(c[1], not negated)
+                else:
+                    i = yield self._canonical(c, negated, memo)
+                key = self._keys[i]
+                # A canonical operand with the same operator, e.g., a negated disjunction in a conjunction, is merged
+                if isinstance(key, tuple) and key[0] == op_:
+                    for j, m in key[1:]:
+                        counts[j] = counts.get(j, 0) + n * m
+                else:
+                    counts[i] = counts.get(i, 0) + n
+            result = self._id((op_, *sorted(counts.items())))
+        elif op in OP_QUANTIFIER:
+            c = ce[2]
+            i = (yield self._canonical(c, negated, memo)) if isinstance(c, tuple) else self._atom(c, negated)
+            result = self._id((_DUAL[op] if negated else op, ce[1], i))
         else:
-            return a == b
+            # The axioms are not normalized any further
+            children = []
+            for c in ce[1:]:
+                children.append((yield self._canonical(c, False, memo)) if isinstance(c, tuple) else
+                                self._atom(c, False))
+            key = (op, *children)
+            result = self._id((NOT, self._id(key)) if negated else key)
+        memo[memo_key] = result
+        return result
 
-    return real_eq(nnf(a), nnf(b))
+
+def eq(a: CE, b: CE) -> bool:
+    """
+    Checks if the expressions are equal up to the negation normal form and the associativity and the commutativity of
+    conjunctions and disjunctions, by comparing their canonical forms (see `CanonicalForms`).
+    """
+    if a is b:
+        return True
+    # Not compared as tuples first, as that takes exponential time for the expressions sharing their subterms
+    forms = CanonicalForms()
+    return forms.id(a) == forms.id(b)
+
+
+def operands(ce: CE, op: int) -> list[CE]:
+    """The operands of a nested chain of `op`, e.g., [a, b, c] for ((a op b) op c)."""
+    result = []
+    stack = [ce]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, tuple) and item[0] == op:
+            stack.append(item[2])
+            stack.append(item[1])
+        else:
+            result.append(item)
+    return result
 
 
 def rename(ce: CE, mapping: Mapping[int, int]) -> CE:
@@ -93,40 +249,354 @@ def to_pretty(expr, *, concept_names=None, role_names=None):
     return rec(expr, 0)
 
 
-def to_manchester(expr: CE, prefix: str, f):
-    classes = set()
-    roles = set()
+Namer = Callable[[int], str]
 
-    def r(i: int):
-        n = f"r{i}"
-        roles.add(n)
-        return n
-
-    def c(i: int):
-        n = f"c{i}"
-        classes.add(n)
-        return n
 
-    def serialize(ce: CE) -> str:
-        if isinstance(ce, tuple):
+def manchester_tokens(expr: CE, c: Namer, r: Namer) -> Iterator[str]:
+    """
+    Yields the Manchester syntax of the expression piece by piece, naming the classes with `c` and the roles with `r`.
+    The expression is expanded left to right with an explicit stack, so the nesting is not limited by the recursion
+    limit.
+    """
+    stack = [expr]
+    while stack:
+        ce = stack.pop()
+        if isinstance(ce, str):
+            yield ce
+        elif isinstance(ce, tuple):
             if ce[0] == NOT:
-                return f"(not {serialize(ce[1])})"
+                stack += [")", ce[1], "(not "]
             elif ce[0] == AND:
-                return f"({serialize(ce[1])} and {serialize(ce[2])})"
+                stack += [")", ce[2], " and ", ce[1], "("]
             elif ce[0] == OR:
-                return f"({serialize(ce[1])} or {serialize(ce[2])})"
+                stack += [")", ce[2], " or ", ce[1], "("]
             elif ce[0] == ANY:
-                return f"({r(ce[1])} some {serialize(ce[2])})"
+                stack += [")", ce[2], f"({r(ce[1])} some "]
             elif ce[0] == ALL:
-                return f"({r(ce[1])} only {serialize(ce[2])})"
+                stack += [")", ce[2], f"({r(ce[1])} only "]
         else:
-            return c(ce)
+            yield c(ce)
+
+
+def _write_chunked(tokens: Iterable[str], f, chunk_size: int) -> None:
+    chunk = []
+    size = 0
+    for token in tokens:
+        chunk.append(token)
+        size += len(token)
+        if size >= chunk_size:
+            f.write("".join(chunk))
+            chunk.clear()
+            size = 0
+    f.write("".join(chunk))
+
 
+def _namers() -> tuple[dict[str, None], dict[str, None], Namer, Namer]:
+    # dicts rather than sets, so that the declarations are emitted in a deterministic order
+    classes = {}
+    roles = {}
+
+    def c(i: int):
+        n = f"c{i}"
+        classes[n] = None
+        return n
+
+    def r(i: int):
+        n = f"r{i}"
+        roles[n] = None
+        return n
+
+    return classes, roles, c, r
+
+
+def write_manchester(tokens: Callable[[Namer, Namer], Iterable[str]], prefix: str, f, chunk_size: int = 1 << 16):
+    """
+    Writes an ontology defining the class D as equivalent to the expression given as a stream of tokens.
+    `tokens` is called with the functions naming classes and roles, and the tokens are written to `f` in chunks of
+    roughly `chunk_size` characters, so the whole expression is never materialized as a single string.
+    """
+    classes, roles, c, r = _namers()
     print(f"Prefix: : <{prefix}#>", file=f)
     print(f"Ontology: <{prefix}>", file=f)
     print(f"Class: D", file=f)
-    print(f"EquivalentTo:", serialize(expr), file=f)
+    f.write("EquivalentTo: ")
+    _write_chunked(tokens(c, r), f, chunk_size)
+    f.write("\n")
     for c in classes:
         print("Class:", c, file=f)
     for r in roles:
         print("ObjectProperty:", r, file=f)
+
+
+def to_manchester(expr: CE, prefix: str, f):
+    write_manchester(functools.partial(manchester_tokens, expr), prefix, f)
+
+
+@contextlib.contextmanager
+def _paused_gc():
+    # The expressions are acyclic, so the cyclic garbage collector would only repeatedly scan the tuples being built
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+_KEYWORDS = {"and": AND, "or": OR, "some": ANY, "only": ALL}
+
+
+def from_manchester(text: str) -> CE:
+    """
+    Parses a class expression in the Manchester syntax as written by `manchester_tokens`, i.e., fully parenthesized,
+    with the classes named `c<id>` and the roles `r<id>`, into the same expression.
+    The text is split into the tokens at once and folded with an explicit stack, so any nesting is fine.
+    """
+    with _paused_gc():
+        return _parse_manchester(text)
+
+
+def _parse_manchester(text: str) -> CE:
+    # The operands and the keywords collected inside of the innermost open parenthesis, and those of the enclosing ones
+    frame = []
+    stack = []
+    try:
+        for token in text.replace("(", "( ").replace(")", " )").split():
+            if token == "(":
+                stack.append(frame)
+                frame = []
+            elif token == ")":
+                if len(frame) == 2:
+                    keyword, right = frame
+                    if keyword != "not":
+                        raise ValueError
+                    value = (NOT, right)
+                else:
+                    left, keyword, right = frame
+                    op = _KEYWORDS[keyword]
+                    if op in OP_QUANTIFIER:
+                        if left[0] != "r":
+                            raise ValueError
+                        value = (op, int(left[1:]), right)
+                    elif type(left) is str:
+                        raise ValueError
+                    else:
+                        value = (op, left, right)
+                if type(right) is str:
+                    raise ValueError
+                frame = stack.pop()
+                frame.append(value)
+            elif token[0] == "c":
+                frame.append(int(token[1:]))
+            else:
+                frame.append(token)
+        (result,) = frame
+    except (KeyError, IndexError, TypeError, ValueError):
+        result = None
+    if stack or result is None or type(result) is str:
+        raise ValueError("Not a class expression written by alcgen")
+    return result
+
+
+def read_manchester(f) -> CE:
+    """Reads the class expression defining D from an ontology written by `to_manchester`."""
+    for line in f:
+        if line.startswith("EquivalentTo: "):
+            return from_manchester(line[len("EquivalentTo: "):])
+    raise ValueError("No class expression in the ontology")
+
+
+_OWL_CONSTANTS = {TOP: "owl:Thing", BOT: "owl:Nothing"}
+
+
+def _flat_tokens(expr: CE, c: Namer, r: Namer, nary: Mapping[int, tuple[str, str, str]],
+                 unary: Mapping[int, tuple[str, str]], quantifier: Mapping[int, tuple[str, str]]) -> Iterator[str]:
+    """
+    Yields the tokens of the expression in an OWL syntax with n-ary conjunctions and disjunctions, expanded with an
+    explicit stack. `nary` gives the opening, the separator and the closing of an operator, `unary` and `quantifier`
+    the opening and the closing; the opening of a quantifier is formatted with the name of the role.
+    """
+    stack = [expr]
+    while stack:
+        ce = stack.pop()
+        if isinstance(ce, str):
+            yield ce
+        elif isinstance(ce, tuple):
+            op = ce[0]
+            if op in nary:
+                opening, separator, closing = nary[op]
+                items = operands(ce, op)
+                stack.append(closing)
+                for i in range(len(items) - 1, 0, -1):
+                    stack += [items[i], separator]
+                stack += [items[0], opening]
+            elif op in unary:
+                stack += [unary[op][1], ce[1], unary[op][0]]
+            else:
+                stack += [quantifier[op][1], ce[2], quantifier[op][0].format(r(ce[1]))]
+        else:
+            yield _OWL_CONSTANTS.get(ce) or f":{c(ce)}"
+
+
+def functional_tokens(expr: CE, c: Namer, r: Namer) -> Iterator[str]:
+    """Yields the OWL functional syntax of the expression piece by piece, see `manchester_tokens`."""
+    return _flat_tokens(expr, c, r,
+                        {AND: ("ObjectIntersectionOf(", " ", ")"), OR: ("ObjectUnionOf(", " ", ")")},
+                        {NOT: ("ObjectComplementOf(", ")")},
+                        {ANY: ("ObjectSomeValuesFrom(:{} ", ")"), ALL: ("ObjectAllValuesFrom(:{} ", ")")})
+
+
+def turtle_tokens(expr: CE, c: Namer, r: Namer) -> Iterator[str]:
+    """Yields the Turtle (RDF) syntax of the expression piece by piece, see `manchester_tokens`."""
+    return _flat_tokens(expr, c, r,
+                        {AND: ("[ a owl:Class ; owl:intersectionOf ( ", " ", " ) ]"),
+                         OR: ("[ a owl:Class ; owl:unionOf ( ", " ", " ) ]")},
+                        {NOT: ("[ a owl:Class ; owl:complementOf ", " ]")},
+                        {ANY: ("[ a owl:Restriction ; owl:onProperty :{} ; owl:someValuesFrom ", " ]"),
+                         ALL: ("[ a owl:Restriction ; owl:onProperty :{} ; owl:allValuesFrom ", " ]")})
+
+
+def to_functional(expr: CE, prefix: str, f, chunk_size: int = 1 << 16):
+    """Writes an ontology defining the class D as equivalent to the expression in the OWL functional syntax."""
+    classes, roles, c, r = _namers()
+    print(f"Prefix(:=<{prefix}#>)", file=f)
+    print("Prefix(owl:=<http://www.w3.org/2002/07/owl#>)", file=f)
+    print(f"Ontology(<{prefix}>", file=f)
+    f.write("EquivalentClasses(:D ")
+    _write_chunked(functional_tokens(expr, c, r), f, chunk_size)
+    f.write(")\n")
+    print("Declaration(Class(:D))", file=f)
+    for c in classes:
+        print(f"Declaration(Class(:{c}))", file=f)
+    for r in roles:
+        print(f"Declaration(ObjectProperty(:{r}))", file=f)
+    print(")", file=f)
+
+
+def to_turtle(expr: CE, prefix: str, f, chunk_size: int = 1 << 16):
+    """Writes an ontology defining the class D as equivalent to the expression in Turtle."""
+    classes, roles, c, r = _namers()
+    print(f"@prefix : <{prefix}#> .", file=f)
+    print("@prefix owl: <http://www.w3.org/2002/07/owl#> .", file=f)
+    print(f"<{prefix}> a owl:Ontology .", file=f)
+    f.write(":D a owl:Class ; owl:equivalentClass ")
+    _write_chunked(turtle_tokens(expr, c, r), f, chunk_size)
+    f.write(" .\n")
+    for c in classes:
+        print(f":{c} a owl:Class .", file=f)
+    for r in roles:
+        print(f":{r} a owl:ObjectProperty .", file=f)
+
+
+_BINARY_MAGIC = b"ALCCE\x01"
+# The tags of the binary format are the operators, followed by these
+_CONCEPT, _TOP, _BOT = 8, 9, 10
+
+
+def _varint(value: int, out: bytearray) -> None:
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def to_binary(expr: CE, f) -> None:
+    """
+    Writes the expression to a binary file in a compact encoding: the tree in pre-order, each node as a tag byte, i.e.,
+    the operator, or a concept (followed by its identifier), or TOP, or BOT; the roles of the quantifiers follow their
+    tags. The identifiers are unsigned LEB128 varints. `from_binary` loads it back.
+    """
+    out = bytearray(_BINARY_MAGIC)
+    stack = [expr]
+    while stack:
+        ce = stack.pop()
+        if isinstance(ce, tuple):
+            op = ce[0]
+            out.append(op)
+            if op in OP_QUANTIFIER:
+                _varint(ce[1], out)
+                stack.append(ce[2])
+            else:
+                stack.extend(reversed(ce[1:]))
+        elif ce == TOP:
+            out.append(_TOP)
+        elif ce == BOT:
+            out.append(_BOT)
+        else:
+            out.append(_CONCEPT)
+            _varint(ce, out)
+        if len(out) >= 1 << 16:
+            f.write(out)
+            out.clear()
+    f.write(out)
+
+
+def from_binary(data: bytes) -> CE:
+    """Loads an expression written by `to_binary`."""
+    if not data.startswith(_BINARY_MAGIC):
+        raise ValueError("Not a binary class expression")
+    try:
+        with _paused_gc():
+            return _load_binary(data, len(_BINARY_MAGIC))
+    except IndexError:
+        raise ValueError("Truncated binary class expression") from None
+
+
+def _load_binary(data: bytes, pos: int) -> CE:
+    # Pending operators: the operator with its operands so far, and the number of the missing operands
+    stack = []
+    while True:
+        tag = data[pos]
+        pos += 1
+        if tag == _CONCEPT or tag in OP_QUANTIFIER:
+            value = 0
+            shift = 0
+            while True:
+                byte = data[pos]
+                pos += 1
+                value |= (byte & 0x7f) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            if tag != _CONCEPT:
+                stack.append([(tag, value), 1])
+                continue
+        elif tag == _TOP:
+            value = TOP
+        elif tag == _BOT:
+            value = BOT
+        elif tag in OP_UNARY:
+            stack.append([(tag,), 1])
+            continue
+        elif tag in OP_BINARY:
+            stack.append([(tag,), 2])
+            continue
+        else:
+            raise ValueError(f"Unknown tag {tag} at offset {pos - 1} of the binary class expression")
+        while stack:
+            frame = stack[-1]
+            frame[0] += (value,)
+            frame[1] -= 1
+            if frame[1] > 0:
+                break
+            value = stack.pop()[0]
+        else:
+            if pos != len(data):
+                raise ValueError("Trailing data after the class expression")
+            return value
+
+
+class Serializer(NamedTuple):
+    suffix: str
+    binary: bool
+    write: Callable[[CE, str, IO], None]
+
+
+# The formats of the ontologies written by create_dataset
+SERIALIZERS = {
+    "manchester": Serializer(".owl", False, to_manchester),
+    "functional": Serializer(".ofn", False, to_functional),
+    "turtle": Serializer(".ttl", False, to_turtle),
+    "binary": Serializer(".ce", True, lambda expr, prefix, f: to_binary(expr, f)),
+}
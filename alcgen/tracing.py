@@ -0,0 +1,199 @@
+"""
+Diagnostics of the generation runs without editing the code: the spans of the stages traced into a Chrome trace-event
+file, to be opened in Perfetto or chrome://tracing, and the sampled instances profiled with cProfile.
+
+A session is started with `session` in the main process and replicated in the worker processes with `initializer`.
+The workers write what they collected to the part files next to the outputs, which are merged when the session ends.
+"""
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import pstats
+import time
+from pathlib import Path
+from typing import Any, Callable, Collection, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+class Tracer:
+    """Collects the complete events of the spans, timed with the clock shared by the processes of a machine."""
+
+    def __init__(self, levels: int):
+        # The number of the recursion levels of `Generator.generate` traced, starting from the root of the formula, as
+        # there are millions of nodes in the deepest formulas
+        self.levels = levels
+        self.pid = os.getpid()
+        self.events: list[dict[str, Any]] = []
+
+    def complete(self, name: str, start: int, **args) -> None:
+        """Records the span of `name` started at `start`, as returned by `now`, and ending now."""
+        end = time.perf_counter_ns()
+        self.events.append({"name": name, "ph": "X", "ts": start / 1000, "dur": (end - start) / 1000, "pid": self.pid,
+                            "tid": 0, "args": args})
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args) -> Iterator[None]:
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.complete(name, start, **args)
+
+
+class _Session:
+    def __init__(self, trace: str | None, trace_levels: int, profile: str | None,
+                 profile_instances: Collection[tuple[int, int]] | None, worker: bool):
+        self.settings = (trace, trace_levels, profile, profile_instances)
+        self.trace = trace
+        self.profile = profile
+        self.profile_instances = profile_instances
+        self.worker = worker
+        self.tracer = Tracer(trace_levels) if trace is not None else None
+
+    def sampled(self, depth: int, instance: int) -> bool:
+        if self.profile is None:
+            return False
+        if self.profile_instances is None:
+            # The first instance of every depth
+            return instance == 0
+        return (depth, instance) in self.profile_instances
+
+    def flush(self) -> None:
+        """Appends the events collected by a worker to its part file."""
+        if self.tracer is None or not self.tracer.events:
+            return
+        with open(f"{self.trace}.{self.tracer.pid}.part", "at") as f:
+            for event in self.tracer.events:
+                f.write(json.dumps(event) + "\n")
+        self.tracer.events.clear()
+
+
+_session: _Session | None = None
+
+
+def now() -> int:
+    return time.perf_counter_ns()
+
+
+def tracer() -> Tracer | None:
+    """The tracer of the current session, or None if the spans are not traced."""
+    return _session.tracer if _session is not None else None
+
+
+def span(name: str, **args) -> contextlib.AbstractContextManager:
+    t = tracer()
+    return t.span(name, **args) if t is not None else contextlib.nullcontext()
+
+
+def traced(fn: Callable[..., T]) -> Callable[..., T]:
+    """Traces every call of the function as a span named after it."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs) -> T:
+        t = tracer()
+        if t is None:
+            return fn(*args, **kwargs)
+        with t.span(fn.__qualname__):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def _parts(path: str) -> list[Path]:
+    path = Path(path)
+    return sorted(path.parent.glob(f"{path.name}.*.part"))
+
+
+def _start(trace: str | None, trace_levels: int, profile: str | None,
+           profile_instances: Collection[tuple[int, int]] | None, worker: bool = True) -> None:
+    global _session
+    _session = _Session(trace, trace_levels, profile, profile_instances, worker)
+
+
+def initializer() -> tuple[Callable | None, tuple]:
+    """The initializer of the worker processes, with its arguments, replicating the current session in them."""
+    if _session is None:
+        return None, ()
+    return _start, _session.settings
+
+
+@contextlib.contextmanager
+def instance(depth: int, instance: int) -> Iterator[None]:
+    """Traces the generation of the instance as a span, and profiles it if it is in the sample."""
+    s = _session
+    if s is None:
+        yield
+        return
+    profiler = None
+    if s.sampled(depth, instance):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with span("instance", depth=depth, instance=instance):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(f"{s.profile}.{os.getpid()}-{depth}-{instance}.part")
+        if s.worker:
+            s.flush()
+
+
+def _finish(s: _Session) -> None:
+    if s.trace is not None:
+        events = [{"name": "process_name", "ph": "M", "pid": s.tracer.pid, "args": {"name": "main"}}]
+        events += s.tracer.events
+        for part in _parts(s.trace):
+            with open(part) as f:
+                worker = [json.loads(line) for line in f]
+            if worker:
+                events.append({"name": "process_name", "ph": "M", "pid": worker[0]["pid"], "args": {"name": "worker"}})
+            events += worker
+            part.unlink()
+        with open(s.trace, "wt") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        print(f"Wrote {len(events)} trace events to {s.trace}")
+    if s.profile is not None:
+        parts = _parts(s.profile)
+        if not parts:
+            print("No instance was profiled, as none of the sampled ones was generated")
+            return
+        stats = pstats.Stats(*map(str, parts))
+        for part in parts:
+            part.unlink()
+        stats.dump_stats(s.profile)
+        print(f"Profiled {len(parts)} instances, the aggregated statistics are in {s.profile}")
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(25)
+
+
+@contextlib.contextmanager
+def session(trace: os.PathLike | str | None = None, trace_levels: int = 3, profile: os.PathLike | str | None = None,
+            profile_instances: Collection[tuple[int, int]] | None = None) -> Iterator[None]:
+    """
+    Traces the spans into the trace-event file `trace` and profiles the instances of `profile_instances`, given as pairs
+    of the depth and the instance (by default, the first instance of every depth), aggregating the statistics into
+    `profile`, which can be read with `pstats` or opened with snakeviz.
+    """
+    global _session
+    if trace is None and profile is None:
+        yield
+        return
+    trace = str(trace) if trace is not None else None
+    profile = str(profile) if profile is not None else None
+    if profile_instances is not None:
+        profile_instances = {(int(depth), int(i)) for depth, i in profile_instances}
+    # The part files left by an interrupted run would be merged with this one
+    for path in (trace, profile):
+        if path is not None:
+            for part in _parts(path):
+                part.unlink()
+    _start(trace, trace_levels, profile, profile_instances, worker=False)
+    s = _session
+    try:
+        yield
+    finally:
+        _session = None
+        _finish(s)
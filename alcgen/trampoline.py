@@ -0,0 +1,25 @@
+import typing
+
+T = typing.TypeVar("T")
+
+Recursion = typing.Generator["Recursion", typing.Any, T]
+
+
+def trampoline(root: Recursion[T]) -> T:
+    """
+    Runs a recursive computation written as a generator without growing the Python call stack.
+    Instead of calling itself, the generator yields the generator for the recursive call and receives its result back.
+    The pending calls are kept on an explicit stack, so the depth of the recursion is limited only by the memory.
+    """
+    stack = [root]
+    value = None
+    while stack:
+        try:
+            call = stack[-1].send(value)
+        except StopIteration as e:
+            stack.pop()
+            value = e.value
+        else:
+            stack.append(call)
+            value = None
+    return value
@@ -0,0 +1,333 @@
+"""
+Runs the reasoners over the ontologies of a dataset, as `run.sh` does, but in parallel and resumably.
+
+Every job is a JVM of one reasoner (a `MainBase` command, called with the class IRI, the number of repetitions and the
+files) over a batch of files, so that the startup of the JVM is amortized. The jobs run in `workers` slots, each pinned
+to its own `cpus_per_slot` CPUs and, if `memory` is given, limited to that many bytes of address space. A file for
+which the reasoner does not report within `timeout` seconds is recorded as timed out, its JVM is killed and the rest of
+its batch is run in a new one; a file on which the JVM fails is recorded as failed in the same way. The results are
+appended to `<prefix><reasoner>.jsonl`, in the format of `MainBase`, with the repetitions that did not finish as -1 and
+the cause in `error`; the files already present in them are skipped, so that an interrupted run can be resumed. When
+the run is interrupted, e.g., by Ctrl-C, the running JVMs are killed and their remaining files are left to the next run.
+
+    python3 -m benchmarker.run datasets/baseline --prefix results/baseline-
+    python3 -m benchmarker.run datasets/baseline --prefix results/baseline- --reasoners '[hermit,elk]' --workers 4
+"""
+import itertools
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, IO, Sequence
+
+import fire
+
+HERE = Path(__file__).parent
+
+JAVA = ["java", "-Xmx16G"]
+
+REASONERS: dict[str, list[str]] = {
+    "jfact": JAVA + ["--add-opens=java.base/java.lang=ALL-UNNAMED", "-jar",
+                     str(HERE / "JFactBenchmarker/target/JFactBenchmarker-1.0-SNAPSHOT.jar")],
+    "pellet": JAVA + ["-jar", str(HERE / "PelletBenchmarker/target/PelletBenchmarker-1.0-SNAPSHOT.jar")],
+    "hermit": JAVA + ["-jar", str(HERE / "HermiTBenchmarker/target/HermiTBenchmarker-1.0-SNAPSHOT.jar")],
+    "elk": JAVA + ["-jar", str(HERE / "ELKBenchmarker/target/ELKBenchmarker-1.0-SNAPSHOT.jar")],
+}
+
+
+def find_files(dataset_dir: os.PathLike | str, pattern: str = "*/*/*.owl") -> list[str]:
+    """The ontologies of the dataset, ordered by the depth and the instance, so that the small ones run first."""
+
+    def key(path: Path) -> tuple:
+        parts = path.relative_to(dataset_dir).parts
+        return tuple(int(p) if p.isdigit() else p for p in parts)
+
+    return [str(p) for p in sorted(Path(dataset_dir).glob(pattern), key=key)]
+
+
+def read_done(path: os.PathLike | str) -> set[str]:
+    """The paths of the files already recorded in the results, ignoring a line truncated by an interrupted run."""
+    done = set()
+    try:
+        with open(path) as f:
+            for line in f:
+                if (result := parse_result(line)) is not None:
+                    done.add(result["path"])
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def batches(files: Sequence[str], batch_size: int) -> list[list[str]]:
+    return [list(files[i:i + batch_size]) for i in range(0, len(files), batch_size)]
+
+
+def slot_cpus(workers: int, cpus_per_slot: int | None) -> list[list[int] | None]:
+    """The CPUs each slot is pinned to, taken in order from the CPUs available to the process."""
+    if cpus_per_slot is None or not hasattr(os, "sched_getaffinity"):
+        return [None] * workers
+    available = sorted(os.sched_getaffinity(0))
+    if workers * cpus_per_slot > len(available):
+        raise ValueError(f"{workers} slots of {cpus_per_slot} CPUs need more than the {len(available)} available")
+    return [available[i * cpus_per_slot:(i + 1) * cpus_per_slot] for i in range(workers)]
+
+
+def limited(command: Sequence[str], cpus: list[int] | None, memory: int | None) -> list[str]:
+    """
+    The command run under the limits of the slot, set by `taskset` and `prlimit` before the reasoner is executed. They
+    are not set from Python in the child, as `preexec_fn` is not safe with the threads of the scheduler, nor after it
+    is started, as the affinity would not apply to the threads the JVM starts by then.
+    """
+    command = list(command)
+    if memory is not None:
+        command = ["prlimit", f"--as={memory}", "--", *command]
+    if cpus is not None:
+        command = ["taskset", "--cpu-list", ",".join(map(str, cpus)), *command]
+    return command
+
+
+def _read_lines(f: IO, lines: queue.Queue) -> None:
+    for line in f:
+        lines.put(line)
+    lines.put(None)
+
+
+def _kill(process: subprocess.Popen) -> None:
+    # The reasoner may have started processes of its own, so the whole group is killed
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.wait()
+
+
+class Cancelled(Exception):
+    """Raised by `run_batch` when its JVM was killed by `Processes.cancel`."""
+
+
+class Processes:
+    """
+    The JVMs running in the slots of a run. They are started in their own sessions, so that they do not receive the
+    SIGINT of the terminal, and `cancel` kills all of them at once when the run is interrupted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = set()
+        self.cancelled = False
+
+    def start(self, command: Sequence[str], stderr: IO) -> subprocess.Popen:
+        with self._lock:
+            if self.cancelled:
+                raise Cancelled()
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr, text=True,
+                                       start_new_session=True)
+            self._running.add(process)
+            return process
+
+    def finish(self, process: subprocess.Popen) -> None:
+        """Kills the process unless it has already exited."""
+        with self._lock:
+            self._running.discard(process)
+        if process.poll() is None:
+            _kill(process)
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            running = list(self._running)
+        for process in running:
+            _kill(process)
+
+
+def parse_result(line: str) -> dict | None:
+    """The result in the line printed by the reasoner, or None if it is not a result."""
+    try:
+        result = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return result if isinstance(result, dict) and isinstance(result.get("path"), str) else None
+
+
+def failed(path: str, repetitions: int, error: str) -> dict:
+    return {"path": path, "times": [-1] * repetitions, "error": error}
+
+
+def run_batch(command: Sequence[str], cls: str, repetitions: int, files: Sequence[str], timeout: float | None,
+              record: Callable[[dict], None], cpus: list[int] | None = None, memory: int | None = None,
+              processes: Processes | None = None) -> int:
+    """
+    Runs the reasoner over the files, restarting it after every file it times out or fails on, and passes the result of
+    every file to `record`. Returns the number of the JVMs started. The JVMs are started through `processes` and
+    killed whenever the batch ends early, e.g., on an exception; if they are killed by `Processes.cancel`, `Cancelled`
+    is raised instead of recording the remaining files as failed.
+    """
+    if processes is None:
+        processes = Processes()
+    remaining = list(files)
+    started = 0
+    while remaining:
+        started += 1
+        with tempfile.TemporaryFile("w+t") as stderr:
+            process = processes.start(limited([*command, cls, str(repetitions), *remaining], cpus, memory), stderr)
+            try:
+                lines = queue.Queue()
+                reader = threading.Thread(target=_read_lines, args=(process.stdout, lines), daemon=True)
+                reader.start()
+                error = None
+                # Only the results extend the deadline, not whatever else the reasoner prints in the meantime
+                deadline = time.monotonic() + timeout if timeout is not None else None
+                while remaining:
+                    try:
+                        line = lines.get(timeout=max(0.0, deadline - time.monotonic()) if deadline is not None
+                                         else None)
+                    except queue.Empty:
+                        error = "timeout"
+                        _kill(process)
+                        break
+                    if line is None:
+                        break
+                    result = parse_result(line)
+                    if result is None or result["path"] not in remaining:
+                        # Anything else the reasoner prints, e.g., the logs of the JVM, is passed through
+                        print(line, end="", file=sys.stderr)
+                        continue
+                    remaining.remove(result["path"])
+                    record(result)
+                    if deadline is not None:
+                        deadline = time.monotonic() + timeout
+                if error is None:
+                    code = process.wait()
+                    if remaining and processes.cancelled:
+                        raise Cancelled()
+                    if remaining:
+                        stderr.seek(0)
+                        error = "memory" if "OutOfMemoryError" in stderr.read() else f"exit {code}"
+                reader.join()
+            finally:
+                processes.finish(process)
+                process.stdout.close()
+        if remaining:
+            record(failed(remaining.pop(0), repetitions, error))
+    return started
+
+
+def _drop_partial_line(path: str) -> None:
+    """Truncates the line left unfinished by an interrupted run, so that it is not merged with the next result."""
+    try:
+        with open(path, "r+b") as f:
+            content = f.read()
+            if content and not content.endswith(b"\n"):
+                f.truncate(content.rfind(b"\n") + 1)
+    except FileNotFoundError:
+        pass
+
+
+class Results:
+    """Appends the results of the reasoners to their files, one line per file, from any thread."""
+
+    def __init__(self, prefix: str, reasoners: Sequence[str]):
+        self._lock = threading.Lock()
+        self._files = {}
+        for reasoner in reasoners:
+            path = f"{prefix}{reasoner}.jsonl"
+            _drop_partial_line(path)
+            self._files[reasoner] = open(path, "at")
+
+    def record(self, reasoner: str, result: dict) -> None:
+        with self._lock:
+            f = self._files[reasoner]
+            f.write(json.dumps(result, separators=(",", ":")) + "\n")
+            f.flush()
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+
+
+def schedule(dataset_dir: os.PathLike | str, prefix: str, reasoners: dict[str, Sequence[str]], cls: str,
+             repetitions: int = 10, workers: int = 1, batch_size: int = 50, timeout: float | None = 3600,
+             memory: int | None = None, cpus_per_slot: int | None = None, pattern: str = "*/*/*.owl",
+             progress: Callable[[str, int, int], None] | None = None) -> int:
+    """
+    Runs every reasoner of `reasoners`, mapping their names to the commands, over the files of the dataset not yet in
+    its results, and returns the number of the JVMs started. `progress` is called after every batch with the name of
+    the reasoner and the numbers of the files it has finished and it has to run in this run.
+    """
+    files = find_files(dataset_dir, pattern)
+    per_reasoner = []
+    for reasoner in reasoners:
+        done = read_done(f"{prefix}{reasoner}.jsonl")
+        todo = [f for f in files if f not in done]
+        per_reasoner.append([(reasoner, batch) for batch in batches(todo, batch_size)])
+    # The batches of the reasoners are interleaved, so that a slow reasoner does not delay the results of the others
+    jobs = [job for jobs in itertools.zip_longest(*per_reasoner) for job in jobs if job is not None]
+    totals = {reasoner: sum(len(b) for r, b in jobs if r == reasoner) for reasoner in reasoners}
+    finished = dict.fromkeys(reasoners, 0)
+    slots = queue.Queue()
+    for cpus in slot_cpus(workers, cpus_per_slot):
+        slots.put(cpus)
+    results = Results(prefix, reasoners)
+    processes = Processes()
+    lock = threading.Lock()
+
+    def run(reasoner: str, batch: list[str]) -> int:
+        cpus = slots.get()
+        try:
+            started = run_batch(reasoners[reasoner], cls, repetitions, batch, timeout,
+                                lambda result: results.record(reasoner, result), cpus, memory, processes)
+        finally:
+            slots.put(cpus)
+        with lock:
+            finished[reasoner] += len(batch)
+            if progress is not None:
+                progress(reasoner, finished[reasoner], totals[reasoner])
+        return started
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(run, *job) for job in jobs]
+        return sum(future.result() for future in futures)
+    except BaseException:
+        # E.g., on Ctrl-C: the batches not started yet are dropped and the running JVMs killed, so that the workers
+        # return instead of the shutdown waiting for their batches to finish
+        executor.shutdown(wait=False, cancel_futures=True)
+        processes.cancel()
+        raise
+    finally:
+        executor.shutdown()
+        results.close()
+
+
+def main(dataset_dir: os.PathLike, prefix: str | None = None, reasoners: Sequence[str] = tuple(REASONERS),
+         cls: str = "http://example.com/benchmark#D", repetitions: int = 10, workers: int = 1, batch_size: int = 50,
+         timeout: float | None = 3600, memory: int | None = None, cpus_per_slot: int | None = None,
+         pattern: str = "*/*/*.owl", command: Sequence[str] | None = None):
+    """
+    Runs the `reasoners`, by default all of them, over the dataset; `command` replaces the commands of the reasoners,
+    e.g., to run a stub instead of the JVMs. `memory` is in bytes of address space, which for a JVM must exceed its
+    heap given in `JAVA`.
+    """
+    if prefix is None:
+        prefix = f"{Path(dataset_dir).name}-"
+    if isinstance(reasoners, str):
+        reasoners = [reasoners]
+    commands = {reasoner: list(command) if command is not None else REASONERS[reasoner] for reasoner in reasoners}
+
+    def progress(reasoner: str, finished: int, total: int):
+        print(f"{reasoner}: {finished}/{total}", file=sys.stderr)
+
+    started = schedule(dataset_dir, prefix, commands, cls, repetitions, workers, batch_size, timeout, memory,
+                       cpus_per_slot, pattern, progress)
+    print(f"Started {started} JVMs", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
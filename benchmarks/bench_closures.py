@@ -0,0 +1,55 @@
+"""
+Measures the stages walking the linked closures of the nodes, `Node.leafs` and `Node.cooccurrences`, on a generated
+formula: their times, the peak memory allocated while they run and the memory still held by the formula afterwards,
+i.e., what they leave behind in the nodes.
+
+    python3 -m benchmarks.bench_closures datasets/large_disjuncts.json --depth 5
+"""
+import gc
+import json
+import os
+import time
+import tracemalloc
+
+import fire
+import numpy as np
+
+from alcgen.configuration import DatasetConfiguration
+from alcgen.create_dataset import compute_seed
+from alcgen.generator import Generator
+from alcgen.random_guide import RandomGuide
+
+
+def main(config_file: os.PathLike, depth: int = 5, instance: int = 0):
+    with open(config_file) as f:
+        configuration = DatasetConfiguration(**json.load(f))
+    guide = RandomGuide(np.random.default_rng(compute_seed(configuration, depth, instance)), configuration.guide,
+                        configuration.universal_guide)
+    node = Generator().generate(depth, guide)
+    for name, stage in (("leafs", node.leafs), ("cooccurrences", node.cooccurrences)):
+        gc.collect()
+        start = time.perf_counter()
+        stage()
+        print(f"{name + ' [s]':>20} {time.perf_counter() - start:>8.2f}")
+    # Measured separately, as tracing the allocations slows down the code
+    del node
+    gc.collect()
+    tracemalloc.start()
+    node = Generator().generate(depth, RandomGuide(np.random.default_rng(compute_seed(configuration, depth, instance)),
+                                                   configuration.guide, configuration.universal_guide))
+    formula, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    leafs = node.leafs()
+    cooccurrences = node.cooccurrences()
+    _, peak = tracemalloc.get_traced_memory()
+    del leafs, cooccurrences
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{'formula [MiB]':>20} {formula / 2 ** 20:>8.1f}")
+    print(f"{'peak [MiB]':>20} {peak / 2 ** 20:>8.1f}")
+    print(f"{'retained [MiB]':>20} {retained / 2 ** 20:>8.1f}")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,64 @@
+"""
+Compares `Cooccurrences` against `ArrayCooccurrences` on the symbol families of a generated formula: the time of
+adding all the families, listing the families and iterating over the items, the best of `repeats` runs, and the memory
+taken by the structure.
+
+    python3 -m benchmarks.bench_cooccurrences datasets/large_conjuncts.json --depth 6 --instance 1
+"""
+import json
+import os
+import time
+import tracemalloc
+
+import fire
+import numpy as np
+
+from alcgen.configuration import DatasetConfiguration
+from alcgen.cooccurrences import Cooccurrences, ArrayCooccurrences
+from alcgen.create_dataset import compute_seed
+from alcgen.generator import Generator
+from alcgen.random_guide import RandomGuide
+
+
+def measure(cls: type[Cooccurrences], families: list[set[int]], repeats: int) -> dict[str, float]:
+    result = dict.fromkeys(['union_all [s]', 'to_list [s]', 'items [s]'], float('inf'))
+    for _ in range(repeats):
+        start = time.perf_counter()
+        cooccurrences = cls()
+        cooccurrences.union_all(families)
+        result['union_all [s]'] = min(result['union_all [s]'], time.perf_counter() - start)
+        start = time.perf_counter()
+        cooccurrences.to_list()
+        result['to_list [s]'] = min(result['to_list [s]'], time.perf_counter() - start)
+        start = time.perf_counter()
+        for _ in cooccurrences.items():
+            pass
+        result['items [s]'] = min(result['items [s]'], time.perf_counter() - start)
+    # Measured separately, as tracing the allocations slows down the code
+    del cooccurrences
+    tracemalloc.start()
+    cooccurrences = cls()
+    cooccurrences.union_all(families)
+    result['memory [MiB]'] = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.stop()
+    return result
+
+
+def main(config_file: os.PathLike, depth: int = 6, instance: int = 1, repeats: int = 5):
+    with open(config_file) as f:
+        configuration = DatasetConfiguration(**json.load(f))
+    guide = RandomGuide(np.random.default_rng(compute_seed(configuration, depth, instance)), configuration.guide,
+                        configuration.universal_guide)
+    generator = Generator()
+    node = generator.generate(depth, guide)
+    families = list(node._cooccurrences(None))
+    print(f"{generator._classes} symbols in {len(families)} families")
+    before = measure(Cooccurrences, families, repeats)
+    after = measure(ArrayCooccurrences, families, repeats)
+    print(f"{'':>14} {'dict':>8} {'array':>8}")
+    for k in before.keys():
+        print(f"{k:>14} {before[k]:>8.3f} {after[k]:>8.3f}")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
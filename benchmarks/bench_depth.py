@@ -0,0 +1,100 @@
+"""
+Compares the time of `Generator.generate` with the depth of nodes maintained incrementally against recomputing it by
+walking the subtree, as it was done before. The formulas are chains of existential restrictions with a number of
+universal siblings at every level, so that the walks, quadratic in the depth, dominate the time of the previous version.
+
+    python3 -m benchmarks.bench_depth
+    python3 -m benchmarks.bench_depth --depths '[100,200,400,800]' --universals 16
+"""
+import itertools
+import sys
+import time
+
+import fire
+
+from alcgen.generator import Generator
+from alcgen.guide import Guide
+from alcgen.metrics import count_symbols
+from alcgen.node import Node
+
+
+class ChainGuide(Guide):
+    """A single existential restriction per level, continuing the chain, and `universals` leaf universals beside it."""
+
+    def __init__(self, universals: int):
+        self.universals = universals
+
+    def n_conjuncts(self, depth: int, universal: bool) -> int:
+        return 1
+
+    def n_disjuncts(self, depth: int, universal: bool) -> int:
+        return 0
+
+    def existential_roles(self, depth: int, n_roles: int, universal: bool) -> list[tuple[int, int]]:
+        return [(1, depth - 1)]
+
+    def universal_roles(self, depth: int, roles: dict[int, list[int]], universal: bool) -> list[tuple[int, int]]:
+        return [(1, 0)] * self.universals
+
+
+def walk_depth(node: Node) -> int:
+    d = 0
+    for e in itertools.chain(*node.existential.values()):
+        d = max(d, walk_depth(e) + 1)
+    for e in itertools.chain(*node.universal.values()):
+        d = max(d, walk_depth(e) + 1)
+    return d
+
+
+class LegacyGenerator(Generator):
+    """
+    `Generator` as it was before, recomputing the depths of all existential restrictions by walking their subtrees.
+    """
+
+    def generate(self, depth: int, guide: Guide, universal: bool = False, disjunct: bool = False) -> Node:
+        node = Node()
+        for _ in range(guide.n_conjuncts(depth, universal)):
+            node.add_conjunct(self._new_class())
+        if depth > 0:
+            for r, d in guide.existential_roles(depth, self._roles, universal):
+                while r > self._roles:
+                    self._new_role()
+                child = self.generate(d, guide)
+                node.add_existential(r, child)
+            for r, d in guide.universal_roles(depth,
+                                              {r: [walk_depth(n) for n in nodes] for r, nodes in
+                                               node.existential.items()},
+                                              universal):
+                while r > self._roles:
+                    self._new_role()
+                child = self.generate(d, guide, universal=True)
+                node.add_universal(r, child)
+        if not disjunct:
+            for _ in range(guide.n_disjuncts(depth, universal)):
+                child = self.generate(depth, guide, disjunct=True)
+                node.add_disjunct(child)
+        return node
+
+
+def measure(generator: type[Generator], depth: int, universals: int, repeats: int) -> tuple[int, float]:
+    best = float('inf')
+    n = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        n = generator().generate(depth, ChainGuide(universals))
+        best = min(best, time.perf_counter() - start)
+    return count_symbols(n)["nodes"], best
+
+
+def main(depths: list[int] = (100, 200, 400, 800), universals: int = 8, repeats: int = 3):
+    # The previous version recurses along the chain, both generating it and walking it
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 4 * max(depths) + 1000))
+    print(f"{'depth':>5} {'nodes':>8} {'before [s]':>11} {'after [s]':>11} {'speedup':>8}")
+    for depth in depths:
+        nodes, before = measure(LegacyGenerator, depth, universals, repeats)
+        _, after = measure(Generator, depth, universals, repeats)
+        print(f"{depth:>5} {nodes:>8} {before:>11.4f} {after:>11.4f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,102 @@
+"""
+Compares the memory used by formulas built from `Node` against the node class as it was before: with a per-instance
+`__dict__` and all the containers allocated upfront, even for leafs.
+
+    python3 -m benchmarks.bench_memory datasets/large_disjuncts.json
+"""
+import gc
+import json
+import os
+import tracemalloc
+from collections import defaultdict
+
+import fire
+import numpy as np
+
+import alcgen.generator
+from alcgen.configuration import DatasetConfiguration
+from alcgen.create_dataset import compute_seed
+from alcgen.generator import Generator
+from alcgen.metrics import count_symbols
+from alcgen.node import Node
+from alcgen.random_guide import RandomGuide
+
+
+class LegacyNode:
+    """
+    The part of the former `Node` used during the generation.
+    """
+
+    def __init__(self):
+        self.conjuncts = set()
+        self.disjuncts = []
+        self.existential = defaultdict(list)
+        self.universal = defaultdict(list)
+        self.linked = []
+        self._depth = 0
+        self._descriptor = None
+
+    def add_conjunct(self, c: int):
+        self.conjuncts.add(c)
+
+    def add_disjunct(self, c: "LegacyNode"):
+        self.disjuncts.append(c)
+
+    def add_universal(self, r: int, n: "LegacyNode"):
+        if r in self.existential:
+            for other in self.existential[r]:
+                other.link(n)
+        self.universal[r].append(n)
+        self._depth = max(self._depth, n.depth() + 1)
+
+    def add_existential(self, r: int, n: "LegacyNode"):
+        if r in self.universal:
+            for other in self.universal[r]:
+                n.link(other)
+        self.existential[r].append(n)
+        self._depth = max(self._depth, n.depth() + 1)
+
+    def link(self, other: "LegacyNode") -> None:
+        self.linked.append(other)
+        for r, unodes in other.universal.items():
+            for enode in self.existential[r]:
+                for n in unodes:
+                    enode.link(n)
+
+    def depth(self) -> int:
+        return self._depth
+
+
+def measure(node_class: type, configuration: DatasetConfiguration, depth: int, instance: int) -> tuple[object, int]:
+    """Returns the generated formula and the memory allocated while generating it."""
+    guide = RandomGuide(np.random.default_rng(compute_seed(configuration, depth, instance)), configuration.guide,
+                        configuration.universal_guide)
+    original = alcgen.generator.Node
+    alcgen.generator.Node = node_class
+    gc.collect()
+    tracemalloc.start()
+    try:
+        n = Generator().generate(depth, guide)
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        alcgen.generator.Node = original
+    return n, size
+
+
+def main(config_file: os.PathLike, min_depth: int = 3, max_depth: int = 6, instance: int = 0):
+    with open(config_file) as f:
+        configuration = DatasetConfiguration(**json.load(f))
+    print(f"{'depth':>5} {'nodes':>8} {'before [MiB]':>12} {'after [MiB]':>11} {'before B/node':>13} "
+          f"{'after B/node':>12} {'saved':>6}")
+    for depth in range(min_depth, max_depth + 1):
+        _, before = measure(LegacyNode, configuration, depth, instance)
+        # Both formulas are generated from the same seed, so they have the same nodes
+        n, after = measure(Node, configuration, depth, instance)
+        nodes = count_symbols(n)["nodes"]
+        print(f"{depth:>5} {nodes:>8} {before / 2 ** 20:>12.2f} {after / 2 ** 20:>11.2f} {before / nodes:>13.0f} "
+              f"{after / nodes:>12.0f} {1 - after / before:>6.1%}")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,83 @@
+"""
+Shows how the time of `nonclosing_mapping` scales with the depth of a chain of existential restrictions, against the
+previous version that listed all the families again after every merge. Both are quadratic on a chain, as the sweep still
+rebuilds the set of the growing family on every merge to pick the same symbols, but with a much smaller constant.
+
+    python3 -m benchmarks.bench_nonclosing
+    python3 -m benchmarks.bench_nonclosing --depths '[2500,5000,10000]' --legacy False
+"""
+import copy
+import time
+
+import fire
+
+from alcgen.cooccurrences import Cooccurrences
+from alcgen.generator import Generator, constrained_cooccurrences, nonclosing_mapping
+from alcgen.guide import Guide
+
+
+class ChainGuide(Guide):
+    """A single existential restriction per level, with two conjuncts and neither disjuncts nor universals."""
+
+    def n_conjuncts(self, depth: int, universal: bool) -> int:
+        return 2
+
+    def n_disjuncts(self, depth: int, universal: bool) -> int:
+        return 0
+
+    def existential_roles(self, depth: int, n_roles: int, universal: bool) -> list[tuple[int, int]]:
+        return [(1, depth - 1)]
+
+    def universal_roles(self, depth: int, roles: dict[int, list[int]], universal: bool) -> list[tuple[int, int]]:
+        return []
+
+
+def legacy_nonclosing_mapping(cooccurrences: Cooccurrences) -> dict[int, int]:
+    """`nonclosing_mapping` as it was before, listing all the families again after every merge."""
+    n_symbols = cooccurrences.max_item + 1
+    mapping = [None] * n_symbols
+    used = [False] * n_symbols
+    while True:
+        families = cooccurrences.to_list()
+        if len(families) <= 1:
+            break
+        pair = []
+        for f in families:
+            for s in f:
+                if used[s]:
+                    continue
+                pair.append(s)
+                break
+            if len(pair) == 2:
+                break
+        if len(pair) < 2:
+            break
+        mapping[pair[0]] = -pair[1]
+        used[pair[0]] = True
+        used[pair[1]] = True
+        cooccurrences.union_many(pair)
+    return {k: v for k, v in enumerate(mapping) if v is not None}
+
+
+def measure(fn, cooccurrences: Cooccurrences, repeats: int) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        c = copy.deepcopy(cooccurrences)
+        start = time.perf_counter()
+        fn(c)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(depths: list[int] = (1000, 2000, 4000), repeats: int = 3, legacy: bool = True):
+    print(f"{'depth':>6} {'symbols':>8} {'before [s]':>11} {'after [s]':>10}")
+    for depth in depths:
+        generator = Generator()
+        cooccurrences = constrained_cooccurrences(generator.generate(depth, ChainGuide()))
+        after = measure(nonclosing_mapping, cooccurrences, repeats)
+        before = measure(legacy_nonclosing_mapping, cooccurrences, repeats) if legacy else float('nan')
+        print(f"{depth:>6} {generator._classes:>8} {before:>11.3f} {after:>10.3f}")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
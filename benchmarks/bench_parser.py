@@ -0,0 +1,71 @@
+"""
+Measures the throughput of parsing the ontologies of a dataset back into class expressions, in MB/s of the Manchester
+syntax: `from_manchester` on the texts already in the memory, the whole streaming pass of `DatasetReader.expressions`
+including the reading and the decompression, and `from_binary` on the same expressions for comparison.
+
+    python3 -m benchmarks.bench_parser datasets/large_disjuncts.json
+    python3 -m benchmarks.bench_parser --dataset_dir datasets/large_disjuncts
+"""
+import io
+import json
+import os
+import tempfile
+import time
+
+import fire
+
+from alcgen.archive import DatasetReader
+from alcgen.configuration import DatasetConfiguration
+from alcgen.create_dataset import create_dataset
+from alcgen.syntax import from_manchester, to_binary, from_binary
+
+
+def best_of(repeats: int, fn) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure(dataset_dir: os.PathLike, repeats: int) -> None:
+    with DatasetReader(dataset_dir) as reader:
+        texts = [reader.read(*entry) for entry in reader]
+        expressions = [expr for _, expr in reader.expressions()]
+        size = sum(len(text.encode("utf-8")) for text in texts)
+        # Only the class expression is parsed, so only its line counts as the parsed input
+        lines = [next(line for line in text.splitlines() if line.startswith("EquivalentTo: "))[len("EquivalentTo: "):]
+                 for text in texts]
+        parsed = sum(len(line) for line in lines)
+        binaries = []
+        for expr in expressions:
+            f = io.BytesIO()
+            to_binary(expr, f)
+            binaries.append(f.getvalue())
+        print(f"{len(texts)} ontologies, {size / 2 ** 20:.2f} MiB, of which {parsed / 2 ** 20:.2f} MiB of class "
+              f"expressions; {sum(map(len, binaries)) / 2 ** 20:.2f} MiB in the binary format")
+        print(f"{'':>26} {'time [s]':>9} {'MB/s':>8}")
+        for name, total, fn in [
+            ("from_manchester", parsed, lambda: [from_manchester(line) for line in lines]),
+            ("DatasetReader.expressions", size, lambda: [expr for _, expr in reader.expressions()]),
+            ("from_binary", parsed, lambda: [from_binary(data) for data in binaries]),
+        ]:
+            seconds = best_of(repeats, fn)
+            print(f"{name:>26} {seconds:>9.3f} {total / 1e6 / seconds:>8.1f}")
+
+
+def main(config_file: os.PathLike | None = None, dataset_dir: os.PathLike | None = None, repeats: int = 3):
+    """Parses the dataset in `dataset_dir` or, if not given, generates the one of `config_file` in a temporary one."""
+    if dataset_dir is not None:
+        measure(dataset_dir, repeats)
+        return
+    with open(config_file) as f:
+        configuration = DatasetConfiguration(**json.load(f))
+    with tempfile.TemporaryDirectory() as tmp:
+        create_dataset(configuration, tmp)
+        measure(tmp, repeats)
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
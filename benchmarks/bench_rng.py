@@ -0,0 +1,50 @@
+"""
+Compares the time of `Generator.generate` with `RandomGuide` drawing every number from NumPy against drawing them from
+`BufferedRNG`.
+
+    python3 -m benchmarks.bench_rng datasets/baseline.json
+"""
+import json
+import os
+import time
+
+import fire
+import numpy as np
+
+from alcgen.configuration import DatasetConfiguration
+from alcgen.create_dataset import compute_seed
+from alcgen.generator import Generator
+from alcgen.metrics import count_symbols
+from alcgen.random_guide import RandomGuide, BufferedRNG
+
+
+def measure(configuration: DatasetConfiguration, depth: int, buffered: bool) -> float:
+    """
+    Returns the time per generated node, as the buffered generator yields different formulas than the default one.
+    """
+    total = 0.0
+    nodes = 0
+    for instance in range(configuration.n_instances):
+        rng = np.random.default_rng(compute_seed(configuration, depth, instance))
+        if buffered:
+            rng = BufferedRNG(rng)
+        guide = RandomGuide(rng, configuration.guide, configuration.universal_guide)
+        start = time.perf_counter()
+        n = Generator().generate(depth, guide)
+        total += time.perf_counter() - start
+        nodes += count_symbols(n)["nodes"]
+    return total / nodes
+
+
+def main(config_file: os.PathLike, min_depth: int = 2, max_depth: int = 6):
+    with open(config_file) as f:
+        configuration = DatasetConfiguration(**json.load(f))
+    print(f"{'depth':>5} {'numpy [µs/node]':>16} {'buffered [µs/node]':>19} {'speedup':>8}")
+    for depth in range(min_depth, max_depth + 1):
+        before = measure(configuration, depth, False)
+        after = measure(configuration, depth, True)
+        print(f"{depth:>5} {before * 1e6:>16.1f} {after * 1e6:>19.1f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,211 @@
+"""
+Times each stage of the generation pipeline on fixed seeds, for the configurations in `datasets/` and the depths up to
+`max_depth`: `Generator.generate`, `introduce_negations`, `do_close`, `do_minimize`, `Node.to_ce` and `to_manchester`.
+The open and the closed variants are derived from the same generated formula, as in `create_dataset`.
+
+For every configuration, depth and stage it records the wall time (summed over the instances, the best of `repeats`
+runs of each), the memory allocated by the stage (measured in a separate run, as tracing the allocations slows it down)
+and the sizes of its result: the numbers of nodes, concepts and roles of the formula, of the tuples of the class
+expression and of the characters of the ontology. The run is appended to the JSON history file and compared against
+the baseline, flagging the stages slower or allocating more than `tolerance` times the baseline; the exit code is 1 if
+any is flagged.
+
+    python3 -m benchmarks.bench_stages
+    python3 -m benchmarks.bench_stages --save_baseline
+    python3 -m benchmarks.bench_stages datasets/baseline.json --max_depth 6 --repeats 5
+"""
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Any
+
+import fire
+
+from alcgen.configuration import DatasetConfiguration
+from alcgen.create_dataset import create_guide
+from alcgen.generator import Generator, introduce_negations, do_close, do_minimize
+from alcgen.metrics import count_symbols
+from alcgen.syntax import CE, OP_QUANTIFIER
+
+STAGES = ("generate", "introduce_negations", "do_close", "do_minimize", "to_ce", "to_manchester")
+
+Measure = Callable[[str, Callable[[], Any], Callable[[Any], dict[str, int]]], Any]
+
+
+class CountingWriter:
+    """Counts the characters written, so that the serialization is measured without keeping its output."""
+
+    def __init__(self):
+        self.characters = 0
+
+    def write(self, s: str) -> None:
+        self.characters += len(s)
+
+
+def count_tuples(ce: CE) -> dict[str, int]:
+    tuples = 0
+    stack = [ce]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, tuple):
+            tuples += 1
+            stack.extend(item[2:] if item[0] in OP_QUANTIFIER else item[1:])
+    return {"tuples": tuples}
+
+
+def run_pipeline(configuration: DatasetConfiguration, depth: int, instance: int, measure: Measure) -> None:
+    """
+    Runs the stages on the instance, passing each of them to `measure` along with the function counting its result.
+    """
+    n = measure("generate", lambda: Generator().generate(depth, create_guide(configuration, depth, instance)),
+                count_symbols)
+    measure("introduce_negations", lambda: introduce_negations(n), lambda _: count_symbols(n))
+    # The closing starts from the formula as generated, so it is generated again from the same seed
+    n = Generator().generate(depth, create_guide(configuration, depth, instance))
+    measure("do_close", lambda: do_close(n), lambda _: count_symbols(n))
+    measure("do_minimize", lambda: do_minimize(n), lambda _: count_symbols(n))
+    measure("to_ce", lambda: n.to_ce(), count_tuples)
+    writer = CountingWriter()
+    measure("to_manchester", lambda: n.to_manchester(configuration.prefix, writer),
+            lambda _: {"characters": writer.characters})
+
+
+def measure_instance(configuration: DatasetConfiguration, depth: int, instance: int,
+                     repeats: int) -> dict[str, dict[str, Any]]:
+    results = {stage: {"seconds": float('inf')} for stage in STAGES}
+
+    def timed(stage: str, fn: Callable[[], Any], count: Callable[[Any], dict[str, int]]) -> Any:
+        start = time.perf_counter()
+        result = fn()
+        results[stage]["seconds"] = min(results[stage]["seconds"], time.perf_counter() - start)
+        results[stage]["counts"] = count(result)
+        return result
+
+    def traced(stage: str, fn: Callable[[], Any], count: Callable[[Any], dict[str, int]]) -> Any:
+        tracemalloc.start()
+        try:
+            result = fn()
+            retained, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        results[stage]["peak_bytes"] = peak
+        results[stage]["retained_bytes"] = retained
+        return result
+
+    for _ in range(repeats):
+        run_pipeline(configuration, depth, instance, timed)
+    run_pipeline(configuration, depth, instance, traced)
+    return results
+
+
+def measure_configuration(name: str, configuration: DatasetConfiguration, max_depth: int, instances: int,
+                          repeats: int) -> list[dict[str, Any]]:
+    """The results for every depth and stage, summed over the instances, except for the peak memory, the maximum."""
+    results = []
+    for depth in range(configuration.min_depth, min(configuration.max_depth, max_depth) + 1):
+        per_instance = [measure_instance(configuration, depth, instance, repeats)
+                        for instance in range(min(configuration.n_instances, instances))]
+        for stage in STAGES:
+            counts = {}
+            for r in per_instance:
+                for k, v in r[stage]["counts"].items():
+                    counts[k] = counts.get(k, 0) + v
+            results.append({
+                "dataset": name,
+                "depth": depth,
+                "stage": stage,
+                "seconds": sum(r[stage]["seconds"] for r in per_instance),
+                "peak_bytes": max(r[stage]["peak_bytes"] for r in per_instance),
+                "retained_bytes": sum(r[stage]["retained_bytes"] for r in per_instance),
+                "counts": counts,
+            })
+            print(f"{name:>16} {depth:>5} {stage:>20} {results[-1]['seconds']:>9.4f} "
+                  f"{results[-1]['peak_bytes'] / 2 ** 20:>9.2f} {counts}")
+    return results
+
+
+def current_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def find_regressions(results: list[dict[str, Any]], baseline: list[dict[str, Any]], tolerance: float,
+                     min_seconds: float, min_bytes: int) -> list[str]:
+    """
+    Describes the stages whose results changed in size, i.e., whose output changed, and those slower or with a higher
+    peak memory than `tolerance` times the baseline, ignoring the differences below `min_seconds` and `min_bytes`.
+    """
+    base = {(r["dataset"], r["depth"], r["stage"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        b = base.get((r["dataset"], r["depth"], r["stage"]))
+        if b is None:
+            continue
+        where = f"{r['dataset']} depth {r['depth']} {r['stage']}"
+        if r["counts"] != b["counts"]:
+            regressions.append(f"{where}: the result changed from {b['counts']} to {r['counts']}")
+        if r["seconds"] > b["seconds"] * tolerance and r["seconds"] - b["seconds"] > min_seconds:
+            regressions.append(f"{where}: {r['seconds']:.4f} s against {b['seconds']:.4f} s "
+                               f"({r['seconds'] / b['seconds']:.2f}x)")
+        if r["peak_bytes"] > b["peak_bytes"] * tolerance and r["peak_bytes"] - b["peak_bytes"] > min_bytes:
+            regressions.append(f"{where}: {r['peak_bytes'] / 2 ** 20:.2f} MiB against "
+                               f"{b['peak_bytes'] / 2 ** 20:.2f} MiB ({r['peak_bytes'] / b['peak_bytes']:.2f}x)")
+    return regressions
+
+
+def main(*config_files: os.PathLike, max_depth: int = 4, instances: int = 2, repeats: int = 3,
+         history: os.PathLike = "benchmarks/stages_history.json",
+         baseline: os.PathLike = "benchmarks/stages_baseline.json", save_baseline: bool = False,
+         tolerance: float = 1.25, min_seconds: float = 0.005, min_bytes: int = 1 << 16):
+    if len(config_files) == 0:
+        config_files = sorted(Path("datasets").glob("*.json"))
+    print(f"{'dataset':>16} {'depth':>5} {'stage':>20} {'time [s]':>9} {'peak [MiB]':>9} counts")
+    results = []
+    for config_file in config_files:
+        with open(config_file) as f:
+            configuration = DatasetConfiguration(**json.load(f))
+        results += measure_configuration(Path(config_file).stem, configuration, max_depth, instances, repeats)
+    run = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "max_depth": max_depth,
+        "instances": instances,
+        "repeats": repeats,
+        "results": results,
+    }
+    history = Path(history)
+    runs = json.loads(history.read_text()) if history.exists() else []
+    runs.append(run)
+    history.write_text(json.dumps(runs, indent=1))
+    print(f"Appended the run to {history}, holding {len(runs)} runs")
+    baseline = Path(baseline)
+    if save_baseline:
+        baseline.write_text(json.dumps(run, indent=1))
+        print(f"Saved the run as the baseline in {baseline}")
+        return
+    if not baseline.exists():
+        print(f"No baseline in {baseline}, save one with --save_baseline")
+        return
+    reference = json.loads(baseline.read_text())
+    print(f"Comparing against the baseline of {reference['timestamp']} (commit {reference['commit']})")
+    regressions = find_regressions(results, reference["results"], tolerance, min_seconds, min_bytes)
+    for regression in regressions:
+        print("REGRESSION", regression)
+    if regressions:
+        sys.exit(1)
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,148 @@
+"""
+Loads the results of the benchmarker into a long data frame with a row per repetition, caching every parsed results
+file as columnar NumPy arrays in `cache_dir`, so that only the files changed since the previous run are parsed again.
+
+The depth, the instance and the variant are decoded from the path of the ontology once, while parsing; the dataset,
+the reasoner and the variant are categoricals of the frame.
+"""
+import json
+import os
+from pathlib import Path
+from statistics import NormalDist
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+VARIANTS = {
+    'open': 'sat',
+    'open_minimized': 'sat minimized',
+    'closed': 'unsat',
+    'closed_minimized': 'unsat minimized',
+}
+
+DATASETS = ["baseline", "large_conjuncts", "large_disjuncts", "no_disjuncts", "no_universals"]
+REASONERS = ["hermit", "pellet", "jfact", "elk"]
+
+# Bumped whenever the layout of the cached arrays changes, to discard the caches written by the older versions
+CACHE_VERSION = 2
+
+_VARIANT_CODES = {variant: code for code, variant in enumerate(VARIANTS)}
+
+
+def parse(path: os.PathLike | str) -> dict[str, np.ndarray]:
+    """
+    Parses a results file into the columns of its repetitions: `depth`, `instance`, `variant` (the index in `VARIANTS`),
+    `repetition`, `time` in nanoseconds, -1 if the repetition did not finish, and `failed`, whether the reasoner timed
+    out or failed on the file, as recorded by the `error` of `benchmarker.run`.
+    """
+    depths = []
+    instances = []
+    variants = []
+    failed = []
+    counts = []
+    times = []
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            # .../<depth>/<instance>/<variant>.owl, possibly followed by the suffix of a compression
+            depth, instance, name = record["path"].rsplit("/", 3)[-3:]
+            depths.append(int(depth))
+            instances.append(int(instance))
+            variants.append(_VARIANT_CODES[name.split(".", 1)[0]])
+            failed.append("error" in record)
+            counts.append(len(record["times"]))
+            times.extend(record["times"])
+    counts = np.array(counts, dtype=np.int64)
+    # The repetitions of every file numbered from 0, without a loop over the files
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    return {
+        "depth": np.repeat(np.array(depths, dtype=np.int16), counts),
+        "instance": np.repeat(np.array(instances, dtype=np.int32), counts),
+        "variant": np.repeat(np.array(variants, dtype=np.int8), counts),
+        "repetition": (np.arange(len(times)) - starts).astype(np.int16),
+        "time": np.array(times, dtype=np.int64),
+        "failed": np.repeat(np.array(failed, dtype=bool), counts),
+    }
+
+
+def load(path: os.PathLike | str, cache_dir: os.PathLike | str) -> dict[str, np.ndarray]:
+    """The columns of the results file, from the cache if the file has not changed since it was cached."""
+    path = Path(path)
+    stat = path.stat()
+    key = np.array([CACHE_VERSION, stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+    cache = Path(cache_dir) / f"{path.name}.npz"
+    try:
+        with np.load(cache) as cached:
+            if np.array_equal(cached["key"], key):
+                return {name: cached[name] for name in cached.files if name != "key"}
+    except (FileNotFoundError, KeyError, ValueError):
+        pass
+    columns = parse(path)
+    cache.parent.mkdir(parents=True, exist_ok=True)
+    # Written under another name first, so that an interrupted run does not leave a truncated cache
+    tmp = cache.with_name(f"{cache.name}.tmp.npz")
+    np.savez(tmp, key=key, **columns)
+    os.replace(tmp, cache)
+    return columns
+
+
+def load_results(directory: os.PathLike | str = ".", datasets: Sequence[str] = DATASETS,
+                 reasoners: Sequence[str] = REASONERS, cache_dir: os.PathLike | str | None = None) -> pd.DataFrame:
+    """
+    Loads `<dataset>-<reasoner>.jsonl` from `directory` for every dataset and reasoner into a frame with the columns
+    `dataset`, `reasoner`, `depth`, `instance`, `variant`, `repetition`, `time` and `failed`. The cache is kept in
+    `directory/.cache` by default.
+    """
+    directory = Path(directory)
+    if cache_dir is None:
+        cache_dir = directory / ".cache"
+    parts = []
+    dataset_codes = []
+    reasoner_codes = []
+    for i, dataset in enumerate(datasets):
+        for j, reasoner in enumerate(reasoners):
+            columns = load(directory / f"{dataset}-{reasoner}.jsonl", cache_dir)
+            parts.append(columns)
+            n = len(columns["time"])
+            dataset_codes.append(np.full(n, i, dtype=np.int8))
+            reasoner_codes.append(np.full(n, j, dtype=np.int8))
+    df = pd.DataFrame({name: np.concatenate([p[name] for p in parts]) for name in parts[0]})
+    df.insert(0, "dataset", pd.Categorical.from_codes(np.concatenate(dataset_codes), categories=list(datasets)))
+    df.insert(1, "reasoner", pd.Categorical.from_codes(np.concatenate(reasoner_codes), categories=list(reasoners)))
+    df["variant"] = pd.Categorical.from_codes(df["variant"], categories=list(VARIANTS.values()))
+    return df
+
+
+def drop_incomplete(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Drops the groups of dataset, depth, reasoner and variant with fewer instances than the most common number, e.g.,
+    the depths on which a reasoner was not run to the end, and the groups with an instance the reasoner timed out or
+    failed on, as their times would be biased towards the fast instances.
+    """
+    keys = ["dataset", "depth", "reasoner", "variant"]
+    grouped = df.groupby(keys, observed=True)
+    instances = grouped["instance"].nunique()
+    failed = grouped["failed"].any()
+    complete = instances[(instances >= instances.mode()[0]) & ~failed].index
+    return df[pd.MultiIndex.from_frame(df[keys]).isin(complete)]
+
+
+def aggregate(df: pd.DataFrame, confidence: float = 0.95) -> pd.DataFrame:
+    """
+    The median, the mean and the normal-approximation confidence interval of the mean of the finished repetitions,
+    for every dataset, depth, reasoner and variant, along with the share of the instances the reasoner timed out or
+    failed on, which are not included in the times.
+    """
+    keys = ["dataset", "depth", "reasoner", "variant"]
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    files = df.drop_duplicates(keys + ["instance"])
+    failed = files.groupby(keys, observed=True)["failed"].mean()
+    grouped = df[(df["time"] > 0) & ~df["failed"]].groupby(keys, observed=True)["time"]
+    result = grouped.agg(["count", "median", "mean", "std"]).reindex(failed.index)
+    result["count"] = result["count"].fillna(0).astype(int)
+    margin = z * result["std"] / np.sqrt(result["count"])
+    result["ci_low"] = result["mean"] - margin
+    result["ci_high"] = result["mean"] + margin
+    result["failed"] = failed
+    return result.drop(columns="std")
@@ -1,35 +1,11 @@
-import pandas as pd
 import seaborn as sns
 
-variants = {
-    'open': 'sat',
-    'open_minimized': 'sat minimized',
-    'closed': 'unsat',
-    'closed_minimized': 'unsat minimized',
-}
+from load import load_results, drop_incomplete
 
-def main():
-    dfs = []
-    for prefix in ["baseline", "large_conjuncts", "large_disjuncts", "no_disjuncts", "no_universals"]:
-        for reasoner in ["hermit", "pellet", "jfact", "elk"]:
-            fn = f"{prefix}-{reasoner}.jsonl"
-            df = pd.read_json(fn, lines=True)
-            df['reasoner'] = reasoner
-            df['dataset'] = prefix
-            dfs.append(df)
-
-    df = pd.concat(dfs)
-    path = df['path'].str.split('/', regex=True, expand=True)
-    df['variant'] = path[path.columns[-1]].str.replace('.owl', '').apply(lambda x: variants[x])
-    df['depth'] = path[path.columns[-3]]
-    df['instance'] = path[path.columns[-2]]
-    tmp = df.groupby(['dataset', 'depth', 'reasoner', 'variant']).count()['times']
-    for item in tmp[tmp < tmp.mode()[0]].index:
-        df = df[~((df['dataset'] == item[0]) & (df['depth'] == item[1]) & (df['reasoner'] == item[2]) & (
-                df['variant'] == item[3]))]
-    df = df.explode("times")
 
-    df = df[df['times'] > 0]
+def main():
+    df = drop_incomplete(load_results())
+    df = df[df['time'] > 0].rename(columns={'time': 'times'})
 
     #sns.set_context("paper")
     sns.set_theme("paper", "ticks", font_scale=.8)
@@ -0,0 +1,141 @@
+import io
+import subprocess
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from alcgen.archive import DatasetReader, ArchiveWriter, VARIANTS, repair_shard
+from alcgen.configuration import DatasetConfiguration
+from alcgen.create_dataset import create_dataset
+from alcgen.syntax import from_binary, to_manchester
+
+
+def read_dataset(root: Path) -> dict[tuple[int, int, str], str]:
+    with DatasetReader(root) as reader:
+        return {entry: reader.read(*entry) for entry in reader}
+
+
+def test_zip(tmp_path: Path):
+    cfg = DatasetConfiguration(min_depth=0, max_depth=3, n_instances=3)
+    create_dataset(cfg, tmp_path / "directory")
+    create_dataset(cfg.model_copy(update={"output": "zip"}), tmp_path / "serial")
+    create_dataset(cfg.model_copy(update={"output": "zip", "workers": 2}), tmp_path / "parallel")
+    assert sorted(p.name for p in (tmp_path / "serial").iterdir()) == ["0.zip", "1.zip", "2.zip", "3.zip"]
+    expected = read_dataset(tmp_path / "directory")
+    assert list(expected) == [(d, i, v) for d in range(4) for i in range(3) for v in VARIANTS]
+    assert read_dataset(tmp_path / "serial") == expected
+    assert list(read_dataset(tmp_path / "parallel").items()) == list(expected.items())
+
+
+def test_zip_skip_existing(tmp_path: Path):
+    cfg = DatasetConfiguration(min_depth=1, max_depth=1, n_instances=2, save_closed=False, output="zip")
+    with ArchiveWriter(tmp_path) as archive:
+        archive.write(1, 0, "open", b"marker")
+    create_dataset(cfg, tmp_path)
+    create_dataset(cfg.model_copy(update={"save_closed": True}), tmp_path)
+    with DatasetReader(tmp_path) as reader:
+        assert reader.read(1, 0, "open") == "marker"
+        assert len(list(reader)) == 2 * 4
+
+
+def test_binary_format(tmp_path: Path):
+    cfg = DatasetConfiguration(min_depth=0, max_depth=3, n_instances=2)
+    create_dataset(cfg, tmp_path / "manchester")
+    create_dataset(cfg.model_copy(update={"format": "binary", "compression": "gzip"}), tmp_path / "directory")
+    create_dataset(cfg.model_copy(update={"format": "binary", "output": "zip", "workers": 2}), tmp_path / "zip")
+    expected = read_dataset(tmp_path / "manchester")
+    for root in (tmp_path / "directory", tmp_path / "zip"):
+        with DatasetReader(root) as reader:
+            assert list(reader) == list(expected)
+            for entry in reader:
+                f = io.StringIO()
+                to_manchester(from_binary(reader.read_bytes(*entry)), cfg.prefix, f)
+                assert f.getvalue() == expected[entry]
+
+
+@pytest.mark.parametrize("fmt,header", [("functional", "Prefix(:="), ("turtle", "@prefix : ")])
+def test_text_formats(tmp_path: Path, fmt: str, header: str):
+    cfg = DatasetConfiguration(min_depth=1, max_depth=2, n_instances=2, format=fmt)
+    create_dataset(cfg, tmp_path / "directory")
+    create_dataset(cfg.model_copy(update={"output": "zip"}), tmp_path / "zip")
+    dataset = read_dataset(tmp_path / "directory")
+    assert len(dataset) == 2 * 2 * 4
+    assert all(text.startswith(header) for text in dataset.values())
+    assert read_dataset(tmp_path / "zip") == dataset
+
+
+def test_load(tmp_path: Path):
+    cfg = DatasetConfiguration(min_depth=0, max_depth=2, n_instances=2)
+    create_dataset(cfg, tmp_path / "manchester")
+    create_dataset(cfg.model_copy(update={"format": "binary", "output": "zip"}), tmp_path / "binary")
+    with DatasetReader(tmp_path / "manchester") as manchester, DatasetReader(tmp_path / "binary") as binary:
+        expressions = list(manchester.expressions())
+        assert [entry for entry, _ in expressions] == list(manchester)
+        assert list(binary.expressions()) == expressions
+        for entry, expr in expressions:
+            f = io.StringIO()
+            to_manchester(expr, cfg.prefix, f)
+            assert f.getvalue() == manchester.read(*entry)
+
+
+# Creates the dataset, but exits without any cleanup in the middle of writing the entry number `limit`, after flushing
+# what was written so far, as if the process was killed
+KILLED_RUN = """
+import os, sys
+from alcgen.archive import ArchiveWriter
+from alcgen.configuration import DatasetConfiguration
+from alcgen.create_dataset import create_dataset
+
+target_dir, limit, configuration = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+opened = 0
+original = ArchiveWriter.open
+
+def open_then_die(self, depth, instance, variant):
+    global opened
+    opened += 1
+    f = original(self, depth, instance, variant)
+    if opened == limit:
+        f.write("Prefix: : <http://exa")
+        f.flush()
+        self._shard(depth).fp.flush()
+        os._exit(1)
+    return f
+
+ArchiveWriter.open = open_then_die
+create_dataset(DatasetConfiguration.model_validate_json(configuration), target_dir)
+"""
+
+
+def test_zip_resume_after_kill(tmp_path: Path):
+    cfg = DatasetConfiguration(min_depth=1, max_depth=2, n_instances=4, output="zip")
+    create_dataset(cfg, tmp_path / "expected")
+    # The first run completes two instances, the second one appends to the existing archives and is killed
+    create_dataset(cfg.model_copy(update={"n_instances": 2}), tmp_path / "resumed")
+    process = subprocess.run([sys.executable, "-c", KILLED_RUN, str(tmp_path / "resumed"), "7", cfg.model_dump_json()])
+    assert process.returncode == 1
+    with pytest.raises(zipfile.BadZipFile):
+        zipfile.ZipFile(tmp_path / "resumed" / "1.zip")
+    create_dataset(cfg, tmp_path / "resumed")
+    assert list(read_dataset(tmp_path / "resumed").items()) == list(read_dataset(tmp_path / "expected").items())
+
+
+def test_repair_shard(tmp_path: Path):
+    path = tmp_path / "0.zip"
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as shard:
+        for i in range(3):
+            with shard.open(f"{i}/open.owl", "w") as f:
+                f.write(b"x" * 1000 * i)
+        complete = path.stat().st_size
+        with shard.open("3/open.owl", "w") as f:
+            f.write(b"y" * 100000)
+            shard.fp.flush()
+            # The central directory was not written and the last entry is incomplete
+            contents = path.read_bytes()
+    path.write_bytes(contents)
+    assert repair_shard(path) == 3
+    with zipfile.ZipFile(path) as shard:
+        assert shard.namelist() == [f"{i}/open.owl" for i in range(3)]
+        assert shard.read("2/open.owl") == b"x" * 2000
+    assert path.stat().st_size > complete
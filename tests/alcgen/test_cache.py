@@ -0,0 +1,83 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from alcgen.cache import encode_node, decode_node, encode_mapping, decode_mapping, GenerationCache
+from alcgen.configuration import DatasetConfiguration, RandomGuideConfiguration
+from alcgen.create_dataset import create_dataset
+from alcgen.generator import Generator
+from alcgen.random_guide import RandomGuide
+from tests.alcgen.test_create_dataset import read_tree
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_node_roundtrip(seed: int):
+    n = Generator().generate(4, RandomGuide(np.random.default_rng(seed), RandomGuideConfiguration(n_roles=2)))
+    m = decode_node(encode_node(n))
+    assert m.to_ce() == n.to_ce()
+    assert m.leafs() == n.leafs()
+    assert m.cooccurrences().to_list() == n.cooccurrences().to_list()
+
+
+def test_mapping_roundtrip():
+    mapping = {5: -3, 1: 2, 7: 7}
+    assert list(decode_mapping(encode_mapping(mapping)).items()) == list(mapping.items())
+
+
+def test_evict(tmp_path: Path):
+    # Written by a run with a larger limit
+    cache = GenerationCache(tmp_path, 1000)
+    for i, key in enumerate(["aa1", "bb2", "cc3", "dd4"]):
+        cache.put(key, bytes(100))
+        os.utime(cache._path(key), ns=(i * 10 ** 9, i * 10 ** 9))
+    cache = GenerationCache(tmp_path, 250)
+    assert cache.get("aa1") is not None
+    assert cache.evict() == 2
+    assert cache.get("bb2") is None
+    assert cache.get("cc3") is None
+    assert cache.get("aa1") is not None
+    assert cache.get("dd4") is not None
+    assert cache.size() == 200
+
+
+def test_evict_on_put(tmp_path: Path):
+    cache = GenerationCache(tmp_path, 250)
+    cache.put("aa1", bytes(100))
+    cache.put("bb2", bytes(100))
+    assert cache.get("aa1") is not None
+    cache.put("cc3", bytes(100))
+    assert cache.size() == 200
+    assert cache.get("bb2") is None
+    cache.put("cc3", bytes(200))
+    assert cache.size() == 200
+    assert cache.get("aa1") is None
+    # The entries of the earlier runs are ordered by their last use when the directory is opened again
+    cache.put("aa1", bytes(50))
+    os.utime(cache._path("cc3"), ns=(0, 0))
+    cache = GenerationCache(tmp_path, 250)
+    cache.put("dd4", bytes(100))
+    assert cache.get("cc3") is None
+    assert cache.get("aa1") is not None
+    assert cache.size() == 150
+
+
+def test_create_dataset(tmp_path: Path):
+    cfg = DatasetConfiguration(min_depth=0, max_depth=3, n_instances=2, save_closed=False)
+    create_dataset(cfg, tmp_path / "plain")
+    cached = cfg.model_copy(update={"cache_dir": str(tmp_path / "cache")})
+    create_dataset(cached, tmp_path / "cold")
+    entries = sorted((tmp_path / "cache").glob("??/*"))
+    # The node and the four mappings: the closing one is needed for the closed minimized variant, too
+    assert len(entries) == 4 * 2 * 5
+    create_dataset(cached, tmp_path / "warm")
+    assert sorted((tmp_path / "cache").glob("??/*")) == entries
+    assert read_tree(tmp_path / "plain") == read_tree(tmp_path / "cold") == read_tree(tmp_path / "warm")
+
+    create_dataset(cached.model_copy(update={"prefix": "http://example.com/bar", "save_closed": True}),
+                   tmp_path / "prefix")
+    assert sorted((tmp_path / "cache").glob("??/*")) == entries
+    create_dataset(cfg.model_copy(update={"prefix": "http://example.com/bar", "save_closed": True}),
+                   tmp_path / "prefix_plain")
+    assert read_tree(tmp_path / "prefix") == read_tree(tmp_path / "prefix_plain")
@@ -0,0 +1,52 @@
+import time
+from pathlib import Path
+
+import pytest
+
+from alcgen import compressed
+from alcgen.compressed import open_compressed, detect, resolve, SUFFIXES
+from alcgen.configuration import DatasetConfiguration
+from alcgen.create_dataset import create_dataset
+from tests.alcgen.test_archive import read_dataset
+
+
+@pytest.mark.parametrize("compression", ["gzip", "xz"])
+def test_roundtrip(tmp_path: Path, compression: str):
+    path = tmp_path / f"a.owl{SUFFIXES[compression]}"
+    with open_compressed(path, "wt", compression, 1) as f:
+        f.write("(r1 some c1)\n" * 1000)
+    assert detect(path) == compression
+    assert path.stat().st_size < 1000
+    with open_compressed(path, "rt", compression) as f:
+        assert f.read() == "(r1 some c1)\n" * 1000
+
+
+def test_zstd_fallback(monkeypatch):
+    monkeypatch.setattr(compressed, "_zstd", None)
+    with pytest.warns(UserWarning):
+        assert resolve("zstd") == "gzip"
+    assert resolve("xz") == "xz"
+
+
+@pytest.mark.filterwarnings("ignore:zstd is not available")
+@pytest.mark.parametrize("output", ["directory", "zip"])
+@pytest.mark.parametrize("compression", ["gzip", "xz", "zstd"])
+def test_create_dataset(tmp_path: Path, output: str, compression: str):
+    cfg = DatasetConfiguration(min_depth=0, max_depth=2, n_instances=2)
+    create_dataset(cfg, tmp_path / "plain")
+    create_dataset(cfg.model_copy(update={"compression": compression, "output": output}), tmp_path / "compressed")
+    assert read_dataset(tmp_path / "compressed") == read_dataset(tmp_path / "plain")
+
+
+@pytest.mark.parametrize("output", ["directory", "zip"])
+def test_reproducible(tmp_path: Path, output: str):
+    cfg = DatasetConfiguration(min_depth=0, max_depth=1, n_instances=2, compression="gzip", output=output)
+    create_dataset(cfg, tmp_path / "first")
+    # The gzip headers store the time in seconds and the zip entries in two-second units
+    time.sleep(2)
+    create_dataset(cfg, tmp_path / "second")
+    first = sorted(p.relative_to(tmp_path / "first") for p in (tmp_path / "first").rglob("*") if p.is_file())
+    second = sorted(p.relative_to(tmp_path / "second") for p in (tmp_path / "second").rglob("*") if p.is_file())
+    assert first == second
+    for path in first:
+        assert (tmp_path / "first" / path).read_bytes() == (tmp_path / "second" / path).read_bytes()
@@ -1,4 +1,7 @@
-from alcgen.cooccurrences import Cooccurrences
+import numpy as np
+import pytest
+
+from alcgen.cooccurrences import Cooccurrences, ArrayCooccurrences
 
 
 def test_cooccurrences1():
@@ -52,3 +55,41 @@ def test_dsu_union_many():
     assert d.has_nonempty_intersection({3}, {2, 4})
     assert not d.has_nonempty_intersection({3}, {4})
     assert not d.has_nonempty_intersection({17}, {3, 4})
+
+
+@pytest.mark.parametrize("vectorize_from", [0, ArrayCooccurrences.vectorize_from])
+@pytest.mark.parametrize("seed", range(50))
+def test_array_cooccurrences(seed: int, vectorize_from: int):
+    rng = np.random.default_rng(seed)
+    families = [set(rng.integers(0, 300, rng.integers(0, 8)).tolist()) for _ in range(rng.integers(1, 60))]
+    expected = Cooccurrences()
+    for f in families:
+        expected.union_many(f)
+    actual = ArrayCooccurrences()
+    actual.vectorize_from = vectorize_from
+    actual.union_all(families[:len(families) // 2])
+    for f in families[len(families) // 2:]:
+        actual.union_many(f)
+    for x in rng.integers(0, 320, 5).tolist():
+        expected.union(x, x + 3)
+        actual.union(x, x + 3)
+    assert [list(f) for f in actual.to_list()] == [list(f) for f in expected.to_list()]
+    assert [x for x, _ in actual.items()] == [x for x, _ in expected.items()]
+    assert actual.max_item == expected.max_item
+    for _ in range(10):
+        xs = set(rng.integers(0, 330, 3).tolist())
+        ys = set(rng.integers(0, 330, 3).tolist())
+        assert actual.has_nonempty_intersection(xs, ys) == expected.has_nonempty_intersection(xs, ys)
+
+
+@pytest.mark.parametrize("vectorize_from", [0, ArrayCooccurrences.vectorize_from])
+def test_array_union_all(vectorize_from: int):
+    d = ArrayCooccurrences()
+    d.vectorize_from = vectorize_from
+    d.union_all([{1, 2, 3}, set(), {4, 5}, {3, 6}, {7}])
+    assert d.to_list() == [{1, 2, 3, 6}, {4, 5}, {7}]
+    d.union_all([{5, 8}, {9}])
+    assert d.to_list() == [{1, 2, 3, 6}, {4, 5, 8}, {7}, {9}]
+    assert d.has_nonempty_intersection({3}, {2, 4})
+    assert not d.has_nonempty_intersection({3}, {4})
+    assert not d.has_nonempty_intersection({17}, {3, 4})
@@ -0,0 +1,112 @@
+import json
+import zipfile
+from pathlib import Path
+
+from alcgen.configuration import DatasetConfiguration, RandomGuideConfiguration
+from alcgen.create_dataset import create_dataset, create_guide, FINGERPRINTS_FILE, DEDUPLICATION_CACHE
+from alcgen.fingerprint import fingerprint
+from alcgen.generator import Generator
+
+
+def read_tree(root: Path) -> dict[str, bytes]:
+    return {p.relative_to(root).as_posix(): p.read_bytes() for p in sorted(root.rglob("*.owl"))}
+
+
+def test_parallel_identical_to_serial(tmp_path: Path):
+    cfg = DatasetConfiguration(min_depth=0, max_depth=3, n_instances=3)
+    create_dataset(cfg, tmp_path / "serial")
+    create_dataset(cfg.model_copy(update={"workers": 2}), tmp_path / "parallel")
+    serial = read_tree(tmp_path / "serial")
+    assert len(serial) == 4 * 3 * 4
+    assert serial == read_tree(tmp_path / "parallel")
+
+
+def test_skip_existing(tmp_path: Path):
+    cfg = DatasetConfiguration(min_depth=1, max_depth=1, n_instances=2, workers=2)
+    create_dataset(cfg, tmp_path)
+    fn = tmp_path / "1" / "0" / "open.owl"
+    fn.write_text("marker")
+    create_dataset(cfg, tmp_path)
+    assert fn.read_text() == "marker"
+
+
+def test_deduplicate(tmp_path: Path):
+    guide = RandomGuideConfiguration(conjuncts_low=1, conjuncts_high=2, disjuncts_p=0.0, existential_low=0,
+                                     existential_high=2, universal_threshold_low=None, universal_threshold_high=None)
+    cfg = DatasetConfiguration(min_depth=1, max_depth=2, n_instances=6, save_open_minimized=False,
+                               save_closed=False, save_closed_minimized=False, guide=guide)
+    assert len({fingerprint(Generator().generate(depth, create_guide(cfg, depth, instance)))
+                for depth in [1, 2] for instance in range(6)}) < 12
+
+    cfg = cfg.model_copy(update={"deduplicate": True})
+    stats = create_dataset(cfg, tmp_path / "serial")
+    assert stats.fingerprinted == 12
+    assert stats.reseeded > 0
+    assert stats.duplicates == 0
+    assert stats.unique == 12
+    fingerprints = (tmp_path / "serial" / FINGERPRINTS_FILE).read_text().splitlines()
+    assert len({line.split()[3] for line in fingerprints}) == 12
+    create_dataset(cfg.model_copy(update={"workers": 2}), tmp_path / "parallel")
+    assert read_tree(tmp_path / "serial") == read_tree(tmp_path / "parallel")
+    assert (tmp_path / "parallel" / FINGERPRINTS_FILE).read_text().splitlines() == fingerprints
+
+    stats = create_dataset(cfg, tmp_path / "serial")
+    assert stats.fingerprinted == 0
+    assert stats.unique == 12
+
+
+def test_deduplicate_generates_once(tmp_path: Path, monkeypatch):
+    guide = RandomGuideConfiguration(conjuncts_low=1, conjuncts_high=2, disjuncts_p=0.0, existential_low=0,
+                                     existential_high=2, universal_threshold_low=None, universal_threshold_high=None)
+    cfg = DatasetConfiguration(min_depth=1, max_depth=2, n_instances=6, save_open_minimized=False,
+                               save_closed=False, save_closed_minimized=False, guide=guide, deduplicate=True)
+    calls = []
+    original = Generator.generate
+
+    def generate(self, depth, *args, **kwargs):
+        calls.append(depth)
+        return original(self, depth, *args, **kwargs)
+
+    monkeypatch.setattr(Generator, "generate", generate)
+    stats = create_dataset(cfg, tmp_path)
+    # Only the fingerprinted attempts are generated, the chosen ones are taken from the cache when written
+    assert len(calls) == stats.fingerprinted + stats.reseeds
+    assert not (tmp_path / DEDUPLICATION_CACHE).exists()
+
+
+def read_metrics(path: Path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_metrics(tmp_path: Path):
+    cfg = DatasetConfiguration(min_depth=1, max_depth=2, n_instances=2)
+    create_dataset(cfg, tmp_path / "serial", tmp_path / "serial.jsonl")
+    records = read_metrics(tmp_path / "serial.jsonl")
+    assert len(records) == 2 * 2 * 4
+    for r in records:
+        assert list(r)[0] == "path"
+        assert Path(r["path"]).stat().st_size == r["bytes"]
+        assert Path(r["path"]).as_posix().endswith(f"{r['depth']}/{r['instance']}/{r['variant']}.owl")
+        assert r["nodes"] > 0 and r["concepts"] > 0 and r["roles"] == 1
+    stages = {r["variant"]: set(r["seconds"]) for r in records}
+    assert stages == {"open": {"generate", "negate", "serialize"},
+                      "open_minimized": {"generate", "negate", "minimize", "serialize"},
+                      "closed": {"generate", "close", "serialize"},
+                      "closed_minimized": {"generate", "close", "minimize", "serialize"}}
+    by_path = {(r["depth"], r["instance"], r["variant"]): r for r in records}
+    assert by_path[1, 0, "open_minimized"]["concepts"] <= by_path[1, 0, "open"]["concepts"]
+
+    # Only the files written by the run are recorded
+    create_dataset(cfg, tmp_path / "serial", tmp_path / "serial.jsonl")
+    assert len(read_metrics(tmp_path / "serial.jsonl")) == len(records)
+
+    create_dataset(cfg.model_copy(update={"workers": 2, "output": "zip"}), tmp_path / "zip", tmp_path / "zip.jsonl")
+    archived = read_metrics(tmp_path / "zip.jsonl")
+    assert len(archived) == len(records)
+    for r in archived:
+        shard, entry = r["path"].split(".zip/")
+        with zipfile.ZipFile(shard + ".zip") as z:
+            assert z.getinfo(entry).compress_size == r["bytes"]
+    key = lambda r: (r["depth"], r["instance"], r["variant"])
+    for a, b in zip(sorted(records, key=key), sorted(archived, key=key)):
+        assert (a["seed"], a["nodes"], a["concepts"]) == (b["seed"], b["nodes"], b["concepts"])
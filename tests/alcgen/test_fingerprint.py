@@ -0,0 +1,57 @@
+import sys
+
+import numpy as np
+import pytest
+
+from alcgen.configuration import RandomGuideConfiguration
+from alcgen.fingerprint import fingerprint
+from alcgen.generator import Generator
+from alcgen.node import Node
+from alcgen.random_guide import RandomGuide
+from alcgen.syntax import NOT, AND, OR, ALL, ANY, TOP
+
+
+def test_renaming():
+    a = (AND, (AND, 1, (NOT, 2)), (ANY, 1, (OR, 3, (ALL, 2, 1))))
+    b = (AND, (ANY, 5, (OR, (ALL, 4, 7), 8)), (AND, (NOT, 9), 7))
+    assert fingerprint(a) == fingerprint(b)
+
+
+def test_nesting():
+    assert fingerprint((AND, (AND, 1, 2), 3)) == fingerprint((AND, 1, (AND, 2, 3)))
+
+
+def test_different():
+    assert fingerprint((AND, 1, 2)) != fingerprint((OR, 1, 2))
+    assert fingerprint((AND, 1, 2)) != fingerprint((AND, 1, 1))
+    assert fingerprint((AND, 1, (NOT, 2))) != fingerprint((AND, 1, (NOT, 1)))
+    assert fingerprint((ANY, 1, (ANY, 1, 2))) != fingerprint((ANY, 1, (ANY, 2, 2)))
+    assert fingerprint((ANY, 1, TOP)) != fingerprint((ANY, 1, 2))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_generated(seed: int):
+    def shuffled(n: Node) -> Node:
+        result = Node(*(int(c) + 1000 for c in rng.permutation(list(n.conjuncts))))
+        for r, nodes in n.existential.items():
+            for child in rng.permutation(len(nodes)):
+                result.add_existential(r + 10, shuffled(nodes[child]))
+        for child in rng.permutation(len(n.disjuncts)):
+            result.add_disjunct(shuffled(n.disjuncts[child]))
+        return result
+
+    rng = np.random.default_rng(seed)
+    cfg = RandomGuideConfiguration(universal_threshold_low=None, universal_threshold_high=None)
+    n = Generator().generate(4, RandomGuide(rng, cfg))
+    assert fingerprint(n) == fingerprint(shuffled(n))
+    assert fingerprint(n) == fingerprint(n.to_ce())
+
+
+def test_deep():
+    n = Node(1)
+    for i in range(5 * sys.getrecursionlimit()):
+        n = Node(i + 2, (1, n))
+    m = Node(1)
+    for i in range(5 * sys.getrecursionlimit()):
+        m = Node(i + 2, (2, m))
+    assert fingerprint(n) == fingerprint(m)
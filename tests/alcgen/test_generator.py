@@ -1,5 +1,7 @@
 import copy
+import io
 import json
+import sys
 
 import numpy as np
 import pytest
@@ -7,10 +9,11 @@ import pytest
 from alcgen.configuration import DatasetConfiguration
 from alcgen.cooccurrences import Cooccurrences
 from alcgen.generator import generate, compute_constraints, merge_constraint_into_symbols, closing_mapping, \
-    Generator, minimizing_mapping, introduce_negations
+    Generator, minimizing_mapping, introduce_negations, nonclosing_mapping, nonequivalence_constraints
 from alcgen.guide import Guide
 from alcgen.node import Node
 from alcgen.random_guide import RandomGuide
+from alcgen.syntax import to_manchester
 
 
 class BaselineGuide(Guide):
@@ -201,3 +204,79 @@ def test_introduce_negations():
     n = Node(Node(1), Node(2))
     introduce_negations(n)
     assert n.to_ce() in {Node(Node(-2), Node(2)).to_ce(), Node(Node(2), Node(-2)).to_ce()}
+
+
+@pytest.mark.parametrize("close", [False, True])
+def test_deep_chain(close: bool):
+    class MyGuide(BaselineGuide):
+        def n_disjuncts(self, depth: int, universal: bool) -> int:
+            return 0
+
+        def existential_roles(self, depth: int, n_roles: int, universal: bool) -> list[tuple[int, int]]:
+            return [(1, depth - 1)]
+
+        def universal_roles(self, depth: int, roles: dict[int, list[int]], universal: bool) -> list[tuple[int, int]]:
+            return []
+
+    depth = 5 * sys.getrecursionlimit()
+    ce = generate(depth, MyGuide(), close, True)
+    with io.StringIO() as f:
+        to_manchester(ce, "http://example.com/foo", f)
+        assert f.getvalue().count(" some ") == depth
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_nonclosing_mapping_sweep(seed: int):
+    def reference(cooccurrences: Cooccurrences) -> dict[int, int]:
+        mapping = {}
+        used = set()
+        while True:
+            families = cooccurrences.to_list()
+            if len(families) <= 1:
+                break
+            pair = []
+            for f in families:
+                for s in f:
+                    if s not in used:
+                        pair.append(s)
+                        break
+                if len(pair) == 2:
+                    break
+            if len(pair) < 2:
+                break
+            mapping[pair[0]] = -pair[1]
+            used.update(pair)
+            cooccurrences.union_many(pair)
+        return mapping
+
+    rng = np.random.default_rng(seed)
+    expected = Cooccurrences()
+    for _ in range(rng.integers(1, 40)):
+        expected.add(set(rng.integers(1, 200, rng.integers(1, 6)).tolist()))
+    actual = copy.deepcopy(expected)
+    assert nonclosing_mapping(actual) == reference(expected)
+    assert actual.to_list() == expected.to_list()
+
+
+@pytest.mark.parametrize("lazy", [True, False])
+@pytest.mark.parametrize("seed", range(10))
+def test_compute_constraints_buckets(seed: int, lazy: bool):
+    def reference(n: Node):
+        for nodes in [*n.existential.values(), *n.universal.values()]:
+            for i, x in enumerate(nodes):
+                for y in nodes[i + 1:]:
+                    yield from nonequivalence_constraints(x, y, lazy)
+                yield from reference(x)
+
+    def random_node(depth: int) -> Node:
+        n = Node(*(int(c) for c in rng.choice([-3, -2, -1, 1, 2, 3], rng.integers(0, 3), replace=False)))
+        if depth > 0:
+            for _ in range(rng.integers(0, 12)):
+                n.add_existential(int(rng.integers(1, 3)), random_node(depth - 1))
+            for _ in range(rng.integers(0, 3)):
+                n.add_universal(int(rng.integers(1, 3)), random_node(depth - 1))
+        return n
+
+    rng = np.random.default_rng(seed)
+    n = random_node(3)
+    assert list(compute_constraints(n, lazy)) == list(reference(n))
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from alcgen.generator import Generator, closing_mapping, minimizing_mapping, constrained_cooccurrences
+from alcgen.interning import CEFactory
+from alcgen.random_guide import RandomGuide
+from alcgen.syntax import nnf, eq, rename, NOT, AND, OR, ALL, ANY, TOP, BOT
+
+
+def test_intern_shares():
+    f = CEFactory()
+    expr = f.intern((AND, (ANY, 1, (NOT, 2)), (OR, (ANY, 1, (NOT, 2)), 3)))
+    assert expr == (AND, (ANY, 1, (NOT, 2)), (OR, (ANY, 1, (NOT, 2)), 3))
+    assert expr[1] is expr[2][1]
+    assert f.intern((ANY, 1, (NOT, 2))) is expr[1]
+    assert f.make(ANY, 1, f.make(NOT, 2)) is expr[1]
+    # 2, 3, (NOT, 2), (ANY, 1, ...), (OR, ...), (AND, ...); the role is not a subterm
+    assert len(f) == 6
+    assert f.id(f.intern((NOT, 2))) == f.id(expr[1][2])
+    assert f.make(ALL, 1, f.make(NOT, 2)) != expr[1]
+
+
+def test_hash():
+    f, g = CEFactory(), CEFactory()
+    g.intern((OR, 5, 6))
+    a = f.intern((AND, (ALL, 1, 2), (NOT, 3)))
+    b = g.intern((AND, (ALL, 1, 2), (NOT, 3)))
+    assert f.id(a) != g.id(b)
+    assert f.hash(a) == g.hash(b)
+    assert f.hash(a) != f.hash(f.intern((AND, (ANY, 1, 2), (NOT, 3))))
+    assert f.hash(a) != f.hash(f.intern((AND, (ALL, 2, 2), (NOT, 3))))
+
+
+def test_not_interned():
+    f = CEFactory()
+    with pytest.raises(ValueError):
+        f.id((NOT, 1))
+    with pytest.raises(ValueError):
+        f.make(AND, (NOT, 1), 2)
+
+
+def test_like_syntax():
+    f = CEFactory()
+    cases = [(NOT, (AND, 1, 2)), (NOT, (NOT, (NOT, 1))), (NOT, (ALL, 1, (OR, 2, (NOT, 3)))), (NOT, TOP), (NOT, BOT),
+             (AND, (NOT, (NOT, 1)), 2)]
+    for ce in cases:
+        assert f.nnf(ce) == nnf(ce)
+    for a in cases:
+        for b in cases:
+            assert f.eq(a, b) == eq(a, b)
+    assert f.eq((NOT, (AND, 1, 2)), (OR, (NOT, 2), (NOT, 1)))
+    assert not f.eq((NOT, (AND, 1, 2)), (AND, (NOT, 2), (NOT, 1)))
+    assert f.rename((ANY, 1, (AND, 1, 2)), {1: 3}) == (ANY, 1, (AND, 3, 2))
+
+
+def test_to_ce():
+    for seed in range(5):
+        n = Generator().generate(4, RandomGuide(np.random.default_rng(seed)))
+        n.apply_mapping(closing_mapping(n.leafs()))
+        n.apply_mapping(minimizing_mapping(constrained_cooccurrences(n)))
+        f = CEFactory()
+        expr = n.to_ce(factory=f)
+        assert expr == n.to_ce()
+        assert f.intern(expr) is expr
+        negated = (NOT, expr)
+        assert f.nnf(negated) == nnf(negated)
+        assert f.eq(negated, (NOT, (NOT, negated)))
+        mapping = {c: c + 1 for c in range(100)}
+        assert f.rename(expr, mapping) == rename(expr, mapping)
+
+
+def test_memoized():
+    # A balanced tree of 2^100 leafs, which is not even possible to build without sharing
+    f = CEFactory()
+    a, b = f.intern(1), f.intern(2)
+    for _ in range(100):
+        a, b = f.make(AND, a, a), f.make(AND, b, b)
+    assert len(f) == 202
+    assert not f.eq(a, b)
+    assert f.eq(a, f.rename(b, {2: 1}))
+    assert f.nnf(f.make(NOT, a))[0] == OR
+
+
+def test_deep():
+    f = CEFactory()
+    expr = 1
+    for i in range(100000):
+        expr = (ANY, i, expr) if i % 2 else (NOT, expr)
+    interned = f.intern(expr)
+    assert f.eq(interned, f.rename(interned, {}))
+    assert f.id(f.nnf((NOT, interned))) > 0
@@ -1,6 +1,14 @@
+import io
+
+import numpy as np
+import pytest
+
+from alcgen.configuration import RandomGuideConfiguration
+from alcgen.generator import generate
 from alcgen.leaf import Leafs, Leaf
 from alcgen.node import Node
-from alcgen.syntax import AND, ANY, OR
+from alcgen.random_guide import RandomGuide
+from alcgen.syntax import AND, ANY, OR, to_manchester
 
 
 def test_to_ce():
@@ -79,6 +87,18 @@ def test_apply_mapping():
     assert c.to_ce() == (4, (7, 1, (4, 12, (7, 1, (4, 6, (7, 1, 2))))), (6, 1, (4, 4, (6, 1, (4, 3, (6, 1, 6))))))
 
 
+@pytest.mark.parametrize("seed", range(10))
+def test_mappings(seed: int):
+    rng = np.random.default_rng(seed)
+    n = generate(3, RandomGuide(rng, RandomGuideConfiguration()), False, False, False)
+    mappings = [{c: int(rng.integers(1, 10)) * (1 if rng.random() < .5 else -1) for c in range(1, 20)}
+                for _ in range(2)]
+    ce = n.to_ce(mappings)
+    n.apply_mapping(mappings[0])
+    n.apply_mapping(mappings[1])
+    assert ce == n.to_ce()
+
+
 def test_symbols():
     a = Node()
     a.add_disjunct(Node(1))
@@ -104,3 +124,75 @@ def test_leafs2():
     n = Node(1, (1, Node(2)))
     n.add_universal(1, Node(3))
     assert n.leafs() == Leafs(AND, [Leafs(None, Leaf(atoms={2}, shared=set(), linked={3}), 1)], 1)
+
+
+def test_empty_operands_not_shared():
+    a = Node(1)
+    b = Node(2)
+    a.add_existential(1, Node(3))
+    a.add_universal(1, Node(4))
+    a.add_disjunct(Node(5))
+    assert len(b.existential) == 0
+    assert len(b.universal) == 0
+    assert len(b.disjuncts) == 0
+    assert len(b.linked) == 0
+    assert a.existential[1][0].gather_all_conjuncts(set()) == {3, 4}
+
+
+def test_cache_invalidation():
+    e = Node(1)
+    n = Node((1, e))
+    assert e.gather_all_conjuncts(set()) == {1}
+    assert n.descriptor == Node((1, Node(7))).descriptor
+    n.add_universal(1, Node(2))
+    assert e.gather_all_conjuncts(set()) == {1, 2}
+    assert e.all_existential == {}
+    e.linked[0].add_existential(1, Node(3))
+    assert e.all_existential[1][0].conjuncts == {3}
+    expected = Node((1, Node(7)))
+    expected.add_universal(1, Node(8, (1, Node(9))))
+    assert n.descriptor == expected.descriptor
+    n.apply_mapping({1: 4, 2: 5})
+    assert e.gather_all_conjuncts(set()) == {4, 5}
+    e.add_conjunct(6)
+    assert n.descriptor != expected.descriptor
+    expected = Node((1, Node(7, 10)))
+    expected.add_universal(1, Node(8, (1, Node(9))))
+    assert n.descriptor == expected.descriptor
+
+
+def test_descriptor():
+    a = Node(1, (1, Node(2)), (2, Node(3, 4)), Node(5), Node(6, (1, Node(7))))
+    b = Node(8, Node((1, Node(9)), 10), Node(11), (2, Node(12, 13)), (1, Node(14)))
+    c = Node(8, Node((1, Node(9)), 10), Node(11), (1, Node(12, 13)), (2, Node(14)))
+    assert isinstance(a.descriptor, int)
+    assert a.descriptor == b.descriptor
+    assert a.descriptor != c.descriptor
+
+
+def test_leafs_does_not_modify():
+    u = Node(2, (1, Node(3)))
+    n = Node((1, Node(1, (1, Node(4)))))
+    n.add_universal(1, u)
+    ce = n.to_ce()
+    n.leafs()
+    n.leafs()
+    assert n.to_ce() == ce
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_to_manchester(seed: int):
+    cfg = RandomGuideConfiguration(disjuncts_p=0.5, n_roles=2)
+    n = generate(3, RandomGuide(np.random.default_rng(seed), cfg), seed % 2 == 0, seed % 3 == 0, ce=False)
+    with io.StringIO() as expected, io.StringIO() as actual:
+        to_manchester(n.to_ce(), "http://example.com/foo", expected)
+        n.to_manchester("http://example.com/foo", actual)
+        assert actual.getvalue() == expected.getvalue()
+
+
+def test_to_manchester_top():
+    n = Node((1, Node()))
+    with io.StringIO() as expected, io.StringIO() as actual:
+        to_manchester(n.to_ce(), "http://example.com/foo", expected)
+        n.to_manchester("http://example.com/foo", actual)
+        assert actual.getvalue() == expected.getvalue()
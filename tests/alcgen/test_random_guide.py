@@ -1,4 +1,8 @@
-from alcgen.random_guide import policy_ascending
+import numpy as np
+
+from alcgen.configuration import RandomGuideConfiguration
+from alcgen.generator import generate
+from alcgen.random_guide import policy_ascending, BufferedRNG, RandomGuide
 
 
 def test_policy_ascending1():
@@ -7,3 +11,23 @@ def test_policy_ascending1():
 
 def test_policy_ascending2():
     assert policy_ascending(None, 3, 5) == [2, 3, 4]
+
+
+def test_buffered_rng_reproducible():
+    a = BufferedRNG(np.random.default_rng(42), block_size=7)
+    b = BufferedRNG(np.random.default_rng(42), block_size=7)
+    xs = [(a.integers(2, 5), a.random(), list(a.integers(0, 3, 4)), a.choice([7, 8])) for _ in range(20)]
+    ys = [(b.integers(2, 5), b.random(), list(b.integers(0, 3, 4)), b.choice([7, 8])) for _ in range(20)]
+    assert xs == ys
+    for i, u, v, c in xs:
+        assert 2 <= i < 5
+        assert 0 <= u < 1
+        assert all(0 <= x < 3 for x in v)
+        assert c in {7, 8}
+
+
+def test_buffered_rng_guide():
+    cfg = RandomGuideConfiguration(conjuncts_low=2, disjuncts_p=0.5, existential_depth='uniform',
+                                   universal_depth='uniform')
+    ces = [generate(4, RandomGuide(BufferedRNG(np.random.default_rng(3)), cfg), True, True) for _ in range(2)]
+    assert ces[0] == ces[1]
@@ -1,4 +1,12 @@
-from alcgen.syntax import nnf, NOT, AND, OR, ALL, ANY, BOT, TOP, eq, rename
+import io
+
+import numpy as np
+import pytest
+
+from alcgen.generator import Generator
+from alcgen.random_guide import RandomGuide
+from alcgen.syntax import nnf, NOT, AND, OR, ALL, ANY, BOT, TOP, eq, rename, CanonicalForms, to_functional, to_turtle, \
+    to_binary, from_binary, to_manchester, from_manchester, read_manchester
 
 
 def test_nnf_straight():
@@ -47,7 +55,163 @@ def test_eq_commutative_demorgan():
     assert not eq((NOT, (AND, 1, 2)), (OR, 2, (NOT, 1)))
 
 
+def test_eq_associative():
+    assert eq((AND, (AND, 1, 2), 3), (AND, 1, (AND, 3, 2)))
+    assert eq((OR, (OR, 1, (AND, 2, 3)), 4), (OR, (AND, 3, 2), (OR, 4, 1)))
+    assert not eq((AND, (OR, 1, 2), 3), (OR, 1, (AND, 2, 3)))
+
+
+def test_eq_deep_negations():
+    assert eq((AND, (NOT, (OR, 1, 2)), 3), (AND, (AND, (NOT, 2), 3), (NOT, 1)))
+    assert eq((NOT, (ANY, 1, (AND, 2, (NOT, TOP)))), (ALL, 1, (OR, TOP, (NOT, 2))))
+    assert eq((ANY, 1, (NOT, (NOT, 2))), (ANY, 1, 2))
+    assert not eq((ANY, 1, 2), (ALL, 1, 2))
+    assert not eq((ANY, 1, 2), (ANY, 2, 2))
+
+
+def test_eq_multisets():
+    assert not eq((AND, 1, 1), 1)
+    assert not eq((AND, 1, (AND, 1, 2)), (AND, 1, 2))
+    assert eq((AND, 1, (AND, 2, 1)), (AND, (AND, 1, 1), 2))
+
+
+def test_eq_shared():
+    # Shared subterms describe a tree of 2^100 leafs, which only the canonical forms can compare
+    a, b, c = 1, 1, 2
+    for _ in range(100):
+        a, b, c = (AND, a, a), (AND, b, b), (AND, c, c)
+    assert eq(a, b)
+    assert not eq(a, (AND, 1, b[1]))
+    assert not eq(a, c)
+    assert eq((AND, c, a), (AND, a, c))
+
+
+def test_eq_long():
+    a = b = 1
+    for i in range(2, 100000):
+        a = (AND, a, i)
+        b = (AND, 100001 - i, b)
+    assert eq(a, b)
+
+
+def test_canonical_forms():
+    forms = CanonicalForms()
+    expressions = [(AND, 1, 2), (AND, 2, 1), (OR, 1, 2), (NOT, (OR, (NOT, 1), (NOT, 2))), (ANY, 1, (AND, 1, 2))]
+    ids = [forms.id(expr) for expr in expressions]
+    assert ids[0] == ids[1] == ids[3]
+    assert len({ids[0], ids[2], ids[4]}) == 3
+    assert forms.id((ANY, 1, (AND, 2, 1))) == ids[4]
+
+
 def test_rename():
     assert rename((AND, 1, 2), {1: 3}) == (AND, 3, 2)
     assert rename((ANY, 1, 1), {1: 2}) == (ANY, 1, 2)
     assert rename(1, {1: 2}) == 2
+
+
+def test_functional():
+    f = io.StringIO()
+    to_functional((AND, (ANY, 3, (NOT, 1)), (OR, TOP, (AND, 2, 1))), "http://x", f)
+    assert f.getvalue().splitlines() == [
+        "Prefix(:=<http://x#>)",
+        "Prefix(owl:=<http://www.w3.org/2002/07/owl#>)",
+        "Ontology(<http://x>",
+        "EquivalentClasses(:D ObjectIntersectionOf(ObjectSomeValuesFrom(:r3 ObjectComplementOf(:c1)) "
+        "ObjectUnionOf(owl:Thing ObjectIntersectionOf(:c2 :c1))))",
+        "Declaration(Class(:D))",
+        "Declaration(Class(:c1))",
+        "Declaration(Class(:c2))",
+        "Declaration(ObjectProperty(:r3))",
+        ")",
+    ]
+
+
+def test_turtle():
+    f = io.StringIO()
+    to_turtle((OR, (ALL, 1, BOT), (AND, 1, (AND, 2, 3))), "http://x", f)
+    assert f.getvalue().splitlines()[3:] == [
+        ":D a owl:Class ; owl:equivalentClass [ a owl:Class ; owl:unionOf ( "
+        "[ a owl:Restriction ; owl:onProperty :r1 ; owl:allValuesFrom owl:Nothing ] "
+        "[ a owl:Class ; owl:intersectionOf ( :c1 :c2 :c3 ) ] ) ] .",
+        ":c1 a owl:Class .",
+        ":c2 a owl:Class .",
+        ":c3 a owl:Class .",
+        ":r1 a owl:ObjectProperty .",
+    ]
+
+
+def binary_round_trip(expr):
+    f = io.BytesIO()
+    to_binary(expr, f)
+    return from_binary(f.getvalue())
+
+
+def test_binary():
+    assert binary_round_trip(TOP) == TOP
+    assert binary_round_trip((AND, (ANY, 300, (NOT, 1)), (OR, BOT, (ALL, 2, 1 << 40)))) == \
+           (AND, (ANY, 300, (NOT, 1)), (OR, BOT, (ALL, 2, 1 << 40)))
+    for seed in range(5):
+        expr = Generator().generate(4, RandomGuide(np.random.default_rng(seed))).to_ce()
+        assert binary_round_trip(expr) == expr
+
+
+def test_binary_deep():
+    expr = 1
+    for i in range(100000):
+        expr = (ANY, i, expr) if i % 2 else (NOT, expr)
+    # The comparison of the tuples themselves would overflow the stack, so the encodings are compared instead
+    f = io.BytesIO()
+    to_binary(expr, f)
+    g = io.BytesIO()
+    to_binary(from_binary(f.getvalue()), g)
+    assert g.getvalue() == f.getvalue()
+
+
+def test_binary_invalid():
+    with pytest.raises(ValueError):
+        from_binary(b"Prefix: : <http://example.com/foo#>")
+    f = io.BytesIO()
+    to_binary((AND, 1, 2), f)
+    with pytest.raises(ValueError):
+        from_binary(f.getvalue()[:-1])
+    with pytest.raises(ValueError):
+        from_binary(f.getvalue() + b"\x08\x01")
+    magic = f.getvalue()[:6]
+    for tag in [11, 42, 255]:
+        with pytest.raises(ValueError):
+            from_binary(magic + bytes([tag, 8, 1, 8, 2]))
+
+
+def manchester_round_trip(expr):
+    f = io.StringIO()
+    to_manchester(expr, "http://x", f)
+    f.seek(0)
+    return read_manchester(f)
+
+
+def test_manchester():
+    assert manchester_round_trip(TOP) == TOP
+    assert manchester_round_trip((AND, (ANY, 300, (NOT, 1)), (OR, BOT, (ALL, 2, 12)))) == \
+           (AND, (ANY, 300, (NOT, 1)), (OR, BOT, (ALL, 2, 12)))
+    for seed in range(5):
+        n = Generator().generate(4, RandomGuide(np.random.default_rng(seed)))
+        f = io.StringIO()
+        n.to_manchester("http://x", f)
+        f.seek(0)
+        assert read_manchester(f) == n.to_ce()
+
+
+def test_manchester_deep():
+    text = "(not " * 100000 + "c1" + ")" * 100000
+    expr = from_manchester(text)
+    for _ in range(100000):
+        assert expr[0] == NOT
+        expr = expr[1]
+    assert expr == 1
+
+
+@pytest.mark.parametrize("text", ["", "c1 c2", "(c1 and c2", "(c1 and c2))", "(c1 xor c2)", "(not c1 c2)", "(not r1)",
+                                  "(r1 and c2)", "(c1 and r2)", "(c1 some c2)", "(x1 some c2)", "(r1 some r2)", "r1"])
+def test_manchester_invalid(text: str):
+    with pytest.raises(ValueError):
+        from_manchester(text)
@@ -0,0 +1,57 @@
+import json
+import os
+import pstats
+from pathlib import Path
+
+import pytest
+
+from alcgen import tracing
+from alcgen.configuration import DatasetConfiguration
+from alcgen.create_dataset import create_dataset
+
+
+def read_events(path: Path) -> list[dict]:
+    return [e for e in json.loads(path.read_text())["traceEvents"] if e["ph"] == "X"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_trace(tmp_path: Path, workers: int):
+    cfg = DatasetConfiguration(min_depth=2, max_depth=3, n_instances=2, workers=workers)
+    with tracing.session(tmp_path / "trace.json", trace_levels=2):
+        create_dataset(cfg, tmp_path / "dataset")
+    assert tracing.tracer() is None
+    assert list(tmp_path.glob("*.part")) == []
+    events = read_events(tmp_path / "trace.json")
+    names = {e["name"] for e in events}
+    assert {"instance", "generate", "Generator.generate", "negate", "compute_constraints", "nonclosing_mapping",
+            "close", "closing_mapping", "minimize_closed", "minimizing_mapping", "serialize_open"} <= names
+    instances = [e for e in events if e["name"] == "instance"]
+    assert sorted((e["args"]["depth"], e["args"]["instance"]) for e in instances) == [(2, 0), (2, 1), (3, 0), (3, 1)]
+    # Only the root of the formula and the level below it are traced
+    assert {e["args"]["depth"] for e in events if e["name"] == "Generator.generate"} == {1, 2, 3}
+    # Every span is nested in the span of its instance
+    for e in events:
+        assert any(i["pid"] == e["pid"] and i["ts"] <= e["ts"] and e["ts"] + e["dur"] <= i["ts"] + i["dur"] + 1
+                   for i in instances)
+    if workers > 1:
+        # Merged from the part files of the workers
+        assert os.getpid() not in {e["pid"] for e in instances}
+
+
+def test_profile(tmp_path: Path):
+    cfg = DatasetConfiguration(min_depth=1, max_depth=3, n_instances=3, workers=2)
+    with tracing.session(profile=tmp_path / "stats.prof", profile_instances=[[2, 1], [3, 0]]):
+        create_dataset(cfg, tmp_path / "dataset")
+    assert list(tmp_path.glob("*.part")) == []
+    stats = pstats.Stats(str(tmp_path / "stats.prof"))
+    calls = {f[2]: v[1] for f, v in stats.stats.items()}
+    # The two sampled instances, each generated once
+    assert calls["generate"] == 2
+    assert "closing_mapping" in calls
+
+
+def test_disabled():
+    assert tracing.tracer() is None
+    assert tracing.initializer() == (None, ())
+    with tracing.session():
+        assert tracing.tracer() is None
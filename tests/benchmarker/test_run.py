@@ -0,0 +1,134 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarker.run import find_files, read_done, run_batch, schedule, slot_cpus
+
+# Behaves as `MainBase`, printing log lines among the results, sleeping on the files containing "slow" and failing on
+# the ones containing "crash", and appends a line to the log for every started JVM and its PID to `<log>.pids`
+STUB = """
+import json, os, sys, time
+log, cls, reps, files = sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4:]
+with open(log, "a") as f:
+    f.write(" ".join(files) + "\\n")
+with open(log + ".pids", "a") as f:
+    f.write(str(os.getpid()) + "\\n")
+for path in files:
+    content = open(path).read()
+    print("[main] INFO Loading " + path, flush=True)
+    print(json.dumps({"level": "INFO"}), flush=True)
+    if "slow" in content:
+        for _ in range(30):
+            print("[main] INFO Still reasoning", flush=True)
+            time.sleep(1)
+    if "crash" in content:
+        sys.exit(3)
+    print(json.dumps({"path": path, "times": list(range(1, reps + 1))}), flush=True)
+"""
+
+
+def make_dataset(root: Path, depths: int = 2, instances: int = 2, contents: dict[str, str] | None = None) -> list[str]:
+    for depth in range(depths):
+        for instance in range(instances):
+            for variant in ["open", "closed"]:
+                path = root / str(depth) / str(instance) / f"{variant}.owl"
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text((contents or {}).get(f"{depth}/{instance}/{variant}", ""))
+    return find_files(root)
+
+
+def stub(tmp_path: Path) -> list[str]:
+    script = tmp_path / "stub.py"
+    script.write_text(STUB)
+    return [sys.executable, str(script), str(tmp_path / "log.txt")]
+
+
+def read_results(path: Path) -> dict[str, dict]:
+    return {r["path"]: r for r in map(json.loads, path.read_text().splitlines())}
+
+
+def test_find_files(tmp_path: Path):
+    files = make_dataset(tmp_path / "dataset", depths=11, instances=1)
+    assert [Path(f).relative_to(tmp_path / "dataset").parts[0] for f in files[::2]] == [str(d) for d in range(11)]
+
+
+def test_schedule(tmp_path: Path):
+    files = make_dataset(tmp_path / "dataset", depths=3)
+    command = stub(tmp_path)
+    prefix = str(tmp_path / "results-")
+    started = schedule(tmp_path / "dataset", prefix, {"a": command, "b": command}, "C", repetitions=3, workers=2,
+                       batch_size=5)
+    # 12 files per reasoner in batches of 5
+    assert started == 6
+    for reasoner in ["a", "b"]:
+        results = read_results(tmp_path / f"results-{reasoner}.jsonl")
+        assert sorted(results) == sorted(files)
+        assert all(r["times"] == [1, 2, 3] for r in results.values())
+
+
+def test_resume(tmp_path: Path):
+    files = make_dataset(tmp_path / "dataset")
+    command = stub(tmp_path)
+    results = tmp_path / "results-a.jsonl"
+    results.write_text("".join(json.dumps({"path": f, "times": [1]}) + "\n" for f in files[:3]) + '{"path": "trunc')
+    assert read_done(results) == set(files[:3])
+    schedule(tmp_path / "dataset", str(tmp_path / "results-"), {"a": command}, "C", repetitions=1)
+    assert (tmp_path / "log.txt").read_text().split() == files[3:]
+    assert read_done(results) == set(files)
+    assert schedule(tmp_path / "dataset", str(tmp_path / "results-"), {"a": command}, "C", repetitions=1) == 0
+
+
+def test_timeout_and_failure(tmp_path: Path):
+    files = make_dataset(tmp_path / "dataset", contents={"0/1/closed": "slow", "1/0/open": "crash"})
+    recorded = []
+    started = run_batch(stub(tmp_path), "C", 2, files, 2.0, recorded.append)
+    # Restarted after the timeout and after the crash
+    assert started == 3
+    by_path = {r["path"]: r for r in recorded}
+    assert sorted(by_path) == sorted(files)
+    assert by_path[files[2]] == {"path": files[2], "times": [-1, -1], "error": "timeout"}
+    assert by_path[files[5]] == {"path": files[5], "times": [-1, -1], "error": "exit 3"}
+    assert all("error" not in r for p, r in by_path.items() if p not in (files[2], files[5]))
+    log = (tmp_path / "log.txt").read_text().splitlines()
+    assert [line.split()[0] for line in log] == [files[0], files[3], files[6]]
+
+
+def test_limits(tmp_path: Path):
+    files = make_dataset(tmp_path / "dataset", depths=1, instances=1)
+    cpus = sorted(os.sched_getaffinity(0))[:1]
+    assert slot_cpus(1, 1) == [cpus]
+    recorded = []
+    command = [sys.executable, "-c", "import json, os, resource, sys; "
+               "print(json.dumps({'path': sys.argv[3], 'times': sorted(os.sched_getaffinity(0)), "
+               "'memory': resource.getrlimit(resource.RLIMIT_AS)[0]}))"]
+    run_batch(command, "C", 1, files[:1], None, recorded.append, cpus=cpus, memory=2 ** 32)
+    assert recorded == [{"path": files[0], "times": cpus, "memory": 2 ** 32}]
+
+
+def test_interrupt(tmp_path: Path):
+    make_dataset(tmp_path / "dataset", contents={f"{d}/{i}/{v}": "slow" for d in range(2) for i in range(2)
+                                                 for v in ["open", "closed"]})
+    script = (f"from benchmarker.run import schedule; schedule({str(tmp_path / 'dataset')!r}, "
+              f"{str(tmp_path / 'results-')!r}, {{'a': {stub(tmp_path)!r}}}, 'C', workers=2, batch_size=2)")
+    scheduler = subprocess.Popen([sys.executable, "-c", script], cwd=Path(__file__).parents[2])
+    pids = tmp_path / "log.txt.pids"
+    deadline = time.monotonic() + 30
+    while not (pids.exists() and len(pids.read_text().split()) == 2):
+        assert time.monotonic() < deadline
+        time.sleep(0.1)
+    scheduler.send_signal(signal.SIGINT)
+    # Without killing the JVMs, the scheduler would wait for the 30 s of their first files
+    assert scheduler.wait(timeout=10) != 0
+    for pid in map(int, pids.read_text().split()):
+        try:
+            os.kill(pid, 0)
+            assert False, f"{pid} still running"
+        except ProcessLookupError:
+            pass
+    # The interrupted files are not recorded as failed, but left to the next run
+    assert (tmp_path / "results-a.jsonl").read_text() == ""
+    assert len(pids.read_text().split()) == 2
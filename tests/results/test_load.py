@@ -0,0 +1,74 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from results.load import load, load_results, drop_incomplete, aggregate
+
+
+def write_results(path: Path, depths: int, instances: int, times: list[int]) -> None:
+    with open(path, "w") as f:
+        for depth in range(depths):
+            for instance in range(instances):
+                for variant in ["closed", "open"]:
+                    record = {"path": f"../datasets/x/{depth}/{instance}/{variant}.owl", "times": times}
+                    f.write(json.dumps(record) + "\n")
+
+
+def test_load_results(tmp_path: Path):
+    write_results(tmp_path / "d-a.jsonl", 2, 3, [5, 7, -1])
+    write_results(tmp_path / "d-b.jsonl", 1, 3, [4, 6, 8])
+    df = load_results(tmp_path, ["d"], ["a", "b"])
+    assert len(df) == 2 * 3 * 2 * 3 + 3 * 2 * 3
+    assert list(df.columns) == ["dataset", "reasoner", "depth", "instance", "variant", "repetition", "time",
+                                "failed"]
+    assert df["reasoner"].dtype == "category"
+    assert set(df["variant"]) == {"sat", "unsat"}
+    assert df[df["reasoner"] == "a"]["repetition"].tolist()[:6] == [0, 1, 2, 0, 1, 2]
+    result = aggregate(df)
+    assert result.loc[("d", 1, "a", "sat"), "count"] == 6
+    assert result.loc[("d", 0, "a", "sat"), "median"] == 6
+    assert result.loc[("d", 0, "b", "unsat"), "mean"] == 6
+    low, high = result.loc[("d", 0, "b", "unsat"), ["ci_low", "ci_high"]]
+    assert low < 6 < high
+
+
+def test_drop_incomplete(tmp_path: Path):
+    write_results(tmp_path / "d-a.jsonl", 2, 3, [1])
+    with open(tmp_path / "d-a.jsonl", "a") as f:
+        f.write(json.dumps({"path": "x/2/0/open.owl", "times": [1]}) + "\n")
+    df = drop_incomplete(load_results(tmp_path, ["d"], ["a"]))
+    assert set(df["depth"]) == {0, 1}
+
+
+def test_cache(tmp_path: Path):
+    path = tmp_path / "d-a.jsonl"
+    write_results(path, 1, 1, [1, 2])
+    assert load(path, tmp_path / "cache")["time"].tolist() == [1, 2, 1, 2]
+    # The cache is used while the file is unchanged
+    stat = path.stat()
+    path.write_text(path.read_text().replace("[1, 2]", "[3, 4]"))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load(path, tmp_path / "cache")["time"].tolist() == [1, 2, 1, 2]
+    write_results(path, 1, 1, [5])
+    assert load(path, tmp_path / "cache")["time"].tolist() == [5, 5]
+
+
+def test_failed(tmp_path: Path):
+    write_results(tmp_path / "d-a.jsonl", 2, 4, [5, 7])
+    with open(tmp_path / "d-a.jsonl", "a") as f:
+        # Timed out on an instance of the depth 1, as recorded by benchmarker.run
+        f.write(json.dumps({"path": "x/1/4/open.owl", "times": [-1, -1], "error": "timeout"}) + "\n")
+        f.write(json.dumps({"path": "x/1/4/closed.owl", "times": [9, 9]}) + "\n")
+    df = load_results(tmp_path, ["d"], ["a"])
+    assert df["failed"].sum() == 2
+    result = aggregate(df)
+    assert result.loc[("d", 1, "a", "sat"), "failed"] == 0.2
+    assert result.loc[("d", 1, "a", "sat"), "count"] == 8
+    assert result.loc[("d", 1, "a", "unsat"), "failed"] == 0
+    # The group with the timeout is dropped as a whole
+    kept = drop_incomplete(df)
+    assert set(zip(kept["depth"], kept["variant"])) == {(0, "sat"), (0, "unsat"), (1, "unsat")}